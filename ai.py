@@ -1,37 +1,708 @@
 # ai_monitor.py
-# pip install google-generativeai
+# pip install google-generativeai numpy
 
-import google.generativeai as genai
 from datetime import datetime, timedelta
 import statistics
 import os
+import re
+import json
+import queue
+import sqlite3
+import threading
+import time
+import heapq
+from bisect import bisect_left, insort
+from collections import deque, OrderedDict
 from dotenv import load_dotenv
+from psycopg2 import DataError, IntegrityError, InterfaceError, OperationalError, ProgrammingError
+from psycopg2.extras import execute_values
+import db
+from metricas import metricas
 
 load_dotenv()
 # Configuração da API do Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    IA_DISPONIVEL = True
-except:
-    IA_DISPONIVEL = False
-    print("⚠ API do Gemini não configurada.")
+# numpy e detectores só entram na análise em lote e nos estimadores que não são a mediana;
+# a medição avulsa com a mediana usa a janela em memória (JanelaMedicoes) sem numpy
 
+# O SDK do Gemini é pesado: só é importado e configurado quando a IA é usada pela primeira vez
+genai = None
+IA_DISPONIVEL = None
+_genai_lock = threading.Lock()
 
-class AIGreenhouseMonitor:
-    def __init__(self, connection):
-        self.connection = connection
-        if IA_DISPONIVEL:
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
+
+def carregar_gemini():
+    """Importa e configura o SDK do Gemini uma única vez; retorna o módulo ou None"""
+    global genai, IA_DISPONIVEL
+    with _genai_lock:
+        if IA_DISPONIVEL is None:
+            try:
+                import google.generativeai as sdk
+                sdk.configure(api_key=GEMINI_API_KEY)
+                genai = sdk
+                IA_DISPONIVEL = True
+            except Exception:
+                IA_DISPONIVEL = False
+                print("⚠ API do Gemini não configurada.")
+    return genai
+
+
+def _fora_da_faixa(valor, minimo, maximo):
+    """detectores.fora_da_faixa para um valor só: negativa abaixo do mínimo, positiva acima do máximo"""
+    if minimo is not None and valor < minimo:
+        return float(valor - minimo)
+    if maximo is not None and valor > maximo:
+        return float(valor - maximo)
+    return 0.0
+
+
+class JanelaMedicoes:
+    """
+    Buffer circular com as últimas N medições de um (estufa, tipo_sensor).
+    Mantém também os valores ordenados, então a mediana sai sem reordenar a janela
+    """
+    def __init__(self, tamanho=5):
+        self.tamanho = tamanho
+        self.valores = deque()
+        self.ordenados = []
+        self.ultimo_id = 0
+    
+    def adicionar(self, valor, id_medicao=None):
+        """Adiciona um valor; ignora medições já vistas (id menor ou igual ao último)"""
+        if id_medicao is not None:
+            if id_medicao <= self.ultimo_id:
+                return False
+            self.ultimo_id = id_medicao
+        
+        if len(self.valores) == self.tamanho:
+            antigo = self.valores.popleft()
+            del self.ordenados[bisect_left(self.ordenados, antigo)]
+        
+        self.valores.append(valor)
+        insort(self.ordenados, valor)
+        return True
+    
+    def mediana(self):
+        n = len(self.ordenados)
+        if n == 0:
+            return None
+        meio = n // 2
+        if n % 2:
+            return self.ordenados[meio]
+        return (self.ordenados[meio - 1] + self.ordenados[meio]) / 2
+    
+    def ultimas(self):
+        """Valores da mais recente para a mais antiga (mesma ordem da consulta no banco)"""
+        return list(reversed(self.valores))
+    
+    def __len__(self):
+        return len(self.valores)
+
+
+class CacheTarefasIA:
+    """
+    Cache das descrições geradas pelo Gemini, chaveado pelo contexto normalizado do alerta.
+    Despejo LRU (max_itens) + TTL (segundos); opcionalmente persiste em um arquivo SQLite
+    """
+    def __init__(self, max_itens=1000, ttl=6 * 3600, caminho_sqlite=None,
+                 passo_valor=1.0, limiar_tendencia=0.5):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.passo_valor = passo_valor
+        self.limiar_tendencia = limiar_tendencia
+        self.itens = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        
+        self.db = None
+        if caminho_sqlite:
+            self.db = sqlite3.connect(caminho_sqlite, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS cache_ia ("
+                "chave TEXT PRIMARY KEY, descricao TEXT, criado_em REAL)"
+            )
+            self._limpar_sqlite()
+            self.db.commit()
+    
+    def chave(self, alerta_info, atuadores, cultura_info, historico_medicoes):
+        """Contexto normalizado: valor em faixas, tendência resumida e motivo sem números"""
+        tendencia = "estável"
+        if len(historico_medicoes) >= 2:
+            # histórico vem do mais recente para o mais antigo
+            variacao = historico_medicoes[0] - historico_medicoes[-1]
+            if variacao > self.limiar_tendencia:
+                tendencia = "subindo"
+            elif variacao < -self.limiar_tendencia:
+                tendencia = "descendo"
+        
+        contexto = [
+            alerta_info['id_estufa'],
+            alerta_info['tipo_sensor'],
+            alerta_info['severidade'],
+            re.sub(r"\(.*\)", "", alerta_info['mensagem']).strip(),
+            round(alerta_info['valor_atual'] / self.passo_valor),
+            tendencia,
+            sorted(a['tipo'] for a in atuadores),
+            cultura_info['nome_popular'] if cultura_info else None,
+        ]
+        return json.dumps(contexto, ensure_ascii=False)
+    
+    def get(self, chave):
+        agora = time.time()
+        with self.lock:
+            item = self.itens.get(chave)
+            if item is None and self.db is not None:
+                row = self.db.execute(
+                    "SELECT descricao, criado_em FROM cache_ia WHERE chave = ?", (chave,)
+                ).fetchone()
+                if row:
+                    item = row
+                    self.itens[chave] = item
+            
+            if item is None or agora - item[1] > self.ttl:
+                if item is not None:
+                    self._remover(chave)
+                self.misses += 1
+                return None
+            
+            self.itens.move_to_end(chave)
+            self._despejar()
+            self.hits += 1
+            return item[0]
+    
+    def set(self, chave, descricao):
+        item = (descricao, time.time())
+        with self.lock:
+            self.itens[chave] = item
+            self.itens.move_to_end(chave)
+            self._despejar()
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO cache_ia (chave, descricao, criado_em) VALUES (?, ?, ?)",
+                    (chave, item[0], item[1])
+                )
+                self._limpar_sqlite()
+                self.db.commit()
+    
+    def _remover(self, chave):
+        self.itens.pop(chave, None)
+        if self.db is not None:
+            self.db.execute("DELETE FROM cache_ia WHERE chave = ?", (chave,))
+            self.db.commit()
+    
+    def _despejar(self):
+        # O que sai da memória por LRU sai também do SQLite
+        despejadas = []
+        while len(self.itens) > self.max_itens:
+            despejadas.append((self.itens.popitem(last=False)[0],))
+        if despejadas and self.db is not None:
+            self.db.executemany("DELETE FROM cache_ia WHERE chave = ?", despejadas)
+            self.db.commit()
+    
+    def _limpar_sqlite(self):
+        """Apaga do arquivo as entradas vencidas e, acima de max_itens, as mais antigas"""
+        self.db.execute("DELETE FROM cache_ia WHERE criado_em < ?", (time.time() - self.ttl,))
+        self.db.execute(
+            "DELETE FROM cache_ia WHERE chave NOT IN "
+            "(SELECT chave FROM cache_ia ORDER BY criado_em DESC LIMIT ?)", (self.max_itens,)
+        )
+
+
+_cache_ia = None
+_cache_ia_lock = threading.Lock()
+
+
+def cache_ia_pela_config():
+    """
+    CacheTarefasIA do processo conforme CACHE_IA=1 (só memória) ou CACHE_IA_ARQUIVO (SQLite),
+    com CACHE_IA_ITENS / CACHE_IA_TTL; None se nenhum dos dois estiver definido
+    """
+    global _cache_ia
+    with _cache_ia_lock:
+        arquivo = os.getenv('CACHE_IA_ARQUIVO')
+        if _cache_ia is None and (arquivo or os.getenv('CACHE_IA', '0') == '1'):
+            _cache_ia = CacheTarefasIA(max_itens=int(os.getenv('CACHE_IA_ITENS', '1000')),
+                                       ttl=float(os.getenv('CACHE_IA_TTL', str(6 * 3600))),
+                                       caminho_sqlite=arquivo or None)
+    return _cache_ia
+
+
+class CacheReferencia:
+    """
+    Dados de referência por estufa (cultura ativa com faixas ideais, atuadores, cadastro)
+    e o mapa sensor → (estufa, tipo, unidade). Carregado em bloco, recarregado quando
+    passa o TTL ou depois de invalidar() (chamado pelas funções de CRUD).
+    """
+    def __init__(self, ttl=300, recarga_minima=5):
+        self.ttl = ttl
+        # Chave desconhecida só força recarga se o cache tiver mais que isso (segundos)
+        self.recarga_minima = recarga_minima
+        self.lock = threading.RLock()
+        self.estufas = {}
+        self.sensores = {}
+        self.carregado_em = None
+        self.hits = 0
+        self.misses = 0
+        self.carregamentos = 0
+    
+    def carregar(self, connection):
+        cursor = connection.cursor()
+        
+        cursor.execute("SELECT id_estufa, nome, localizacao, tamanho, status FROM estufa")
+        estufas = {
+            r[0]: {
+                'id_estufa': r[0],
+                'nome': r[1],
+                'localizacao': r[2],
+                'tamanho': float(r[3]) if r[3] is not None else None,
+                'status': r[4],
+                'cultura': None,
+                'atuadores': []
+            }
+            for r in cursor.fetchall()
+        }
+        
+        # Cultura ativa: o lote mais recente ainda não colhido (mesmo critério de get_cultura_info)
+        cursor.execute("""
+        SELECT DISTINCT ON (lp.id_estufa)
+            lp.id_estufa,
+            c.nome_popular,
+            c.nome_cientifico,
+            ci.temp_min, ci.temp_max, ci.umid_min, ci.umid_max
+        FROM lote_plantio lp
+        JOIN cultura c ON lp.id_cultura = c.id_cultura
+        JOIN condicao_ideal ci ON c.id_cultura = ci.id_cultura
+        WHERE lp.data_previsao_colheita >= CURRENT_DATE
+        ORDER BY lp.id_estufa, lp.data_plantio DESC
+        """)
+        for r in cursor.fetchall():
+            if r[0] in estufas:
+                estufas[r[0]]['cultura'] = {
+                    'nome_popular': r[1],
+                    'nome_cientifico': r[2],
+                    'temp_min': float(r[3]) if r[3] is not None else None,
+                    'temp_max': float(r[4]) if r[4] is not None else None,
+                    'umid_min': float(r[5]) if r[5] is not None else None,
+                    'umid_max': float(r[6]) if r[6] is not None else None
+                }
+        
+        cursor.execute("SELECT id_atuador, tipo_atuador, capacidade, id_estufa FROM atuador ORDER BY id_atuador")
+        for r in cursor.fetchall():
+            if r[3] in estufas:
+                estufas[r[3]]['atuadores'].append({'id_atuador': r[0], 'tipo': r[1], 'capacidade': r[2]})
+        
+        cursor.execute("SELECT id_sensor, id_estufa, tipo_sensor, unidade_medida FROM sensor")
+        sensores = {r[0]: (r[1], r[2], r[3]) for r in cursor.fetchall()}
+        cursor.close()
+        
+        with self.lock:
+            self.estufas = estufas
+            self.sensores = sensores
+            self.carregado_em = time.time()
+            self.carregamentos += 1
+    
+    def invalidar(self):
+        with self.lock:
+            self.carregado_em = None
+    
+    def _buscar(self, connection, mapa, chave):
+        with self.lock:
+            idade = time.time() - self.carregado_em if self.carregado_em is not None else None
+            valido = idade is not None and idade <= self.ttl
+            if valido and chave in getattr(self, mapa):
+                self.hits += 1
+                return getattr(self, mapa)[chave]
+            
+            # Expirado, invalidado ou chave nova (cadastrada por outro processo): recarrega
+            self.misses += 1
+            if not valido or idade >= self.recarga_minima:
+                self.carregar(connection)
+            return getattr(self, mapa).get(chave)
+    
+    def estufa(self, connection, id_estufa):
+        """Cadastro da estufa com 'cultura' (ou None) e 'atuadores'"""
+        return self._buscar(connection, 'estufas', id_estufa)
+    
+    def sensor(self, connection, id_sensor):
+        """(id_estufa, tipo_sensor, unidade_medida) do sensor"""
+        return self._buscar(connection, 'sensores', id_sensor)
+    
+    def estatisticas(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'carregamentos': self.carregamentos}
+
+
+# Cache de referência compartilhado pelo processo (monitores, workers e CRUD do menu)
+dados_referencia = CacheReferencia(ttl=int(os.getenv('REFERENCIA_TTL', '300')))
+
+
+class BalanceadorTarefas:
+    """
+    Carga de tarefas pendentes por funcionário, em memória, para distribuir tarefas novas.
+    Cada estufa tem um min-heap (pendentes, id_funcionario) dos funcionários ativos nela;
+    a chave None agrupa todos os funcionários (fallback de estufa sem equipe).
+    Entradas antigas ficam no heap e são descartadas na hora de escolher (remoção preguiçosa).
+    Escolher e incrementar acontecem sob o mesmo lock, então workers concorrentes nunca
+    recebem a mesma "vaga". Recarregado do banco quando passa o TTL ou depois de invalidar().
+    Reservas ainda não gravadas (nem confirmadas nem liberadas) continuam somadas à contagem
+    do banco depois de uma recarga, então liberar() desconta só o que foi de fato reservado.
+    """
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.pendentes = {}
+        self.nomes = {}
+        self.equipes = {}
+        self.estufas_funcionario = {}
+        self.heaps = {}
+        # Reservas em andamento por funcionário: tarefa escolhida mas ainda não gravada no banco
+        self.reservas = {}
+        self.carregado_em = None
+        self.carregamentos = 0
+    
+    def carregar(self, connection):
+        cursor = connection.cursor()
+        cursor.execute("""
+        SELECT f.id_funcionario, f.nome, COUNT(t.id_tarefa) AS tarefas_pendentes
+        FROM funcionario f
+        LEFT JOIN tarefa t ON f.id_funcionario = t.id_funcionario
+            AND t.data_conclusao IS NULL
+        GROUP BY f.id_funcionario, f.nome
+        """)
+        funcionarios = cursor.fetchall()
+        cursor.execute("SELECT DISTINCT id_estufa, id_funcionario FROM estufa_funcionario WHERE data_fim IS NULL")
+        alocacoes = cursor.fetchall()
+        cursor.close()
+        
+        equipes = {None: {r[0] for r in funcionarios}}
+        estufas_funcionario = {r[0]: {None} for r in funcionarios}
+        for id_estufa, id_funcionario in alocacoes:
+            if id_funcionario in estufas_funcionario:
+                equipes.setdefault(id_estufa, set()).add(id_funcionario)
+                estufas_funcionario[id_funcionario].add(id_estufa)
+        
+        with self.lock:
+            # O banco ainda não tem as tarefas das reservas em andamento
+            pendentes = {r[0]: r[2] + self.reservas.get(r[0], 0) for r in funcionarios}
+            heaps = {}
+            for id_estufa, equipe in equipes.items():
+                heaps[id_estufa] = [(pendentes[f], f) for f in equipe]
+                heapq.heapify(heaps[id_estufa])
+            self.pendentes = pendentes
+            self.nomes = {r[0]: r[1] for r in funcionarios}
+            self.equipes = equipes
+            self.estufas_funcionario = estufas_funcionario
+            self.heaps = heaps
+            self.carregado_em = time.time()
+            self.carregamentos += 1
+    
+    def invalidar(self):
+        with self.lock:
+            self.carregado_em = None
+    
+    def _garantir_carregado(self, connection):
+        with self.lock:
+            valido = self.carregado_em is not None and time.time() - self.carregado_em <= self.ttl
+        if not valido:
+            self.carregar(connection)
+    
+    def _ajustar(self, id_funcionario, delta):
+        """Atualiza a contagem e empurra a nova entrada nos heaps das estufas do funcionário (com o lock)"""
+        if id_funcionario not in self.pendentes:
+            return
+        self.pendentes[id_funcionario] = max(0, self.pendentes[id_funcionario] + delta)
+        for id_estufa in self.estufas_funcionario[id_funcionario]:
+            heap = self.heaps[id_estufa]
+            heapq.heappush(heap, (self.pendentes[id_funcionario], id_funcionario))
+            # Muitas entradas antigas acumuladas: reconstrói só com as atuais
+            if len(heap) > 4 * len(self.equipes[id_estufa]) + 16:
+                self.heaps[id_estufa] = [(self.pendentes[f], f) for f in self.equipes[id_estufa]]
+                heapq.heapify(self.heaps[id_estufa])
+    
+    def reservar(self, connection, id_estufa):
+        """
+        Escolhe o funcionário da estufa com menos tarefas pendentes (ou de todos, se a estufa
+        não tem equipe ativa) e já conta a tarefa nova para ele. Retorna {'id_funcionario', 'nome', 'tarefas_pendentes'}
+        com a contagem de antes da reserva, ou None se não houver funcionários.
+        """
+        self._garantir_carregado(connection)
+        with self.lock:
+            chave = id_estufa if self.equipes.get(id_estufa) else None
+            heap = self.heaps.get(chave, [])
+            while heap:
+                pendentes, id_funcionario = heap[0]
+                if self.pendentes.get(id_funcionario) == pendentes:
+                    break
+                heapq.heappop(heap)
+            if not heap:
+                return None
+            heapq.heappop(heap)
+            self._ajustar(id_funcionario, +1)
+            self.reservas[id_funcionario] = self.reservas.get(id_funcionario, 0) + 1
+            return {
+                'id_funcionario': id_funcionario,
+                'nome': self.nomes[id_funcionario],
+                'tarefas_pendentes': pendentes
+            }
+    
+    def _encerrar_reserva(self, id_funcionario):
+        """Tira uma reserva em andamento do funcionário (com o lock); False se não havia nenhuma"""
+        restantes = self.reservas.get(id_funcionario, 0)
+        if not restantes:
+            return False
+        if restantes == 1:
+            del self.reservas[id_funcionario]
         else:
-            self.model = None
+            self.reservas[id_funcionario] = restantes - 1
+        return True
     
-    def get_ultimas_medicoes_sensor(self, id_sensor, tipo_sensor, id_estufa, limit=5):
-        """Obtém as últimas N medições do mesmo tipo de sensor na mesma estufa"""
-        cursor = self.connection.cursor()
+    def confirmar(self, id_funcionario):
+        """A tarefa da reserva foi gravada: a partir daqui a contagem do banco já a inclui"""
+        with self.lock:
+            self._encerrar_reserva(id_funcionario)
+    
+    def liberar(self, id_funcionario):
+        """Desfaz uma reserva cuja tarefa não chegou a ser gravada"""
+        with self.lock:
+            if self._encerrar_reserva(id_funcionario):
+                self._ajustar(id_funcionario, -1)
+    
+    def concluir(self, id_funcionario):
+        """Uma tarefa do funcionário foi concluída"""
+        with self.lock:
+            self._ajustar(id_funcionario, -1)
+    
+    def estatisticas(self):
+        with self.lock:
+            return {
+                'funcionarios': len(self.pendentes),
+                'tarefas_pendentes': sum(self.pendentes.values()),
+                'reservas': sum(self.reservas.values()),
+                'carregamentos': self.carregamentos
+            }
+
+
+# Balanceador compartilhado pelo processo: todos os workers distribuem tarefas pelo mesmo heap
+balanceador_tarefas = BalanceadorTarefas(ttl=int(os.getenv('BALANCEADOR_TTL', '60')))
+
+
+# Ordem das severidades: um episódio só volta para a IA quando sobe de nível
+NIVEIS_SEVERIDADE = {"Baixa": 1, "Média": 2, "Alta": 3}
+
+
+class EpisodioAlerta:
+    """Uma excursão contínua de (estufa, tipo_sensor) para fora da faixa, numa direção (+1 acima, -1 abaixo)"""
+    def __init__(self, id_estufa, tipo_sensor, direcao, severidade, motivo, nivel, id_medicao,
+                 id_alerta=None, ocorrencias=1, inicio=None, ultima_ocorrencia=None):
+        self.id_estufa = id_estufa
+        self.tipo_sensor = tipo_sensor
+        self.direcao = direcao
+        self.severidade = severidade
+        self.motivo = motivo
+        self.pico = nivel
+        self.id_medicao_inicial = id_medicao
+        self.id_ultima_medicao = id_medicao
+        self.id_alerta = id_alerta
+        self.ocorrencias = ocorrencias
+        self.inicio = inicio or datetime.now()
+        self.ultima_ocorrencia = ultima_ocorrencia or self.inicio
+        self.fim = None
+        self.gravado_em = time.time()
+    
+    def registrar(self, nivel, id_medicao):
+        self.ocorrencias += 1
+        self.id_ultima_medicao = id_medicao
+        self.ultima_ocorrencia = datetime.now()
+        self.pico = max(self.pico, nivel) if self.direcao > 0 else min(self.pico, nivel)
+    
+    def absorver(self, outro):
+        """Junta a este episódio as leituras de outro da mesma chave (aberto em paralelo)"""
+        self.ocorrencias += outro.ocorrencias
+        self.id_ultima_medicao = outro.id_ultima_medicao
+        self.ultima_ocorrencia = max(self.ultima_ocorrencia, outro.ultima_ocorrencia)
+        self.pico = max(self.pico, outro.pico) if self.direcao > 0 else min(self.pico, outro.pico)
+        self.fim = outro.fim
+
+
+class SupressorAlertas:
+    """
+    Agrupa as anomalias seguidas de cada (estufa, tipo_sensor, direção) num único alerta aberto
+    (tabela episodio_alerta). Uma excursão que dura uma hora gera um alerta, uma chamada à IA e
+    uma tarefa; as leituras seguintes só atualizam pico/última ocorrência, gravados no máximo a
+    cada `intervalo_gravacao` segundos. A severidade subindo reabre o alerta para a IA; o episódio
+    fecha depois de `recuperacao` leituras seguidas dentro da faixa.
+    """
+    CONSULTA_ABERTOS = """
+            SELECT e.id_alerta, e.id_estufa, e.tipo_sensor, e.direcao, e.seriedade, a.mensagem,
+                   e.pico, e.id_ultima_medicao, e.ocorrencias, e.data_hora_inicio, e.ultima_ocorrencia
+            FROM episodio_alerta e
+            JOIN alerta a ON a.id_alerta = e.id_alerta
+            WHERE e.data_hora_fim IS NULL
+            """
+    
+    def __init__(self, recuperacao=2, intervalo_gravacao=30, ativo=True):
+        self.recuperacao = recuperacao
+        self.intervalo_gravacao = intervalo_gravacao
+        # `ativo` é a configuração (ALERTAS_AGRUPAR); `sem_tabela` é o banco ainda sem
+        # episodio_alerta, e some no próximo carregar depois de invalidar()
+        self.ativo = ativo
+        self.sem_tabela = False
+        self.lock = threading.Lock()
+        self.abertos = {}
+        self.normais = {}
+        self.carregado = False
+    
+    @staticmethod
+    def _episodio(row):
+        (id_alerta, id_estufa, tipo_sensor, direcao, severidade, motivo,
+         pico, id_medicao, ocorrencias, inicio, ultima) = row
+        return EpisodioAlerta(id_estufa, tipo_sensor, direcao, severidade, motivo, float(pico), id_medicao,
+                              id_alerta=id_alerta, ocorrencias=ocorrencias, inicio=inicio, ultima_ocorrencia=ultima)
+    
+    def carregar(self, connection):
+        """Episódios abertos no banco (de uma execução anterior ou de outro processo)"""
+        cursor = connection.cursor()
+        try:
+            cursor.execute(self.CONSULTA_ABERTOS)
+            rows = cursor.fetchall()
+        except ProgrammingError as e:
+            # Banco criado antes da tabela de episódios: segue sem agrupar até a migração
+            connection.rollback()
+            print(f"⚠ Alertas sem agrupamento por episódio (rode a migração do menu): {e}")
+            self.sem_tabela = True
+            self.carregado = True
+            return
+        finally:
+            cursor.close()
         
-        query = """
+        abertos = {}
+        for row in rows:
+            episodio = self._episodio(row)
+            abertos[(episodio.id_estufa, episodio.tipo_sensor, episodio.direcao)] = episodio
+        self.abertos = abertos
+        self.normais = {}
+        self.sem_tabela = False
+        self.carregado = True
+    
+    def invalidar(self):
+        with self.lock:
+            self.carregado = False
+            self.sem_tabela = False
+    
+    def adotar(self, cursor, perdidos):
+        """
+        Episódios novos cujo INSERT caiu no ON CONFLICT: outro processo abriu antes o episódio da
+        mesma chave. Lê esse episódio do banco, junta nele as leituras do perdido e o põe no lugar
+        em memória. Retorna [(episódio do banco, severidade subiu)]; quem chama grava a atualização.
+        """
+        adotados = []
+        with self.lock:
+            for perdido in perdidos:
+                chave = (perdido.id_estufa, perdido.tipo_sensor, perdido.direcao)
+                cursor.execute(self.CONSULTA_ABERTOS + " AND e.id_estufa = %s AND e.tipo_sensor = %s "
+                               "AND e.direcao = %s FOR UPDATE OF e", chave)
+                row = cursor.fetchone()
+                if row is None:
+                    # Fechou entre o INSERT e a leitura: o próximo carregar resolve
+                    self.carregado = False
+                    continue
+                existente = self._episodio(row)
+                existente.absorver(perdido)
+                escalou = NIVEIS_SEVERIDADE.get(perdido.severidade, 0) > NIVEIS_SEVERIDADE.get(existente.severidade, 0)
+                if escalou:
+                    existente.severidade = perdido.severidade
+                    existente.motivo = perdido.motivo
+                if self.abertos.get(chave) is perdido:
+                    if existente.fim is None:
+                        self.abertos[chave] = existente
+                    else:
+                        del self.abertos[chave]
+                adotados.append((existente, escalou))
+        return adotados
+    
+    def avaliar(self, connection, id_estufa, tipo_sensor, nivel, diferenca, anomalia, id_medicao):
+        """
+        Decide o que fazer com uma medição analisada. Retorna uma lista de (ação, episódio) com
+        ação em 'abrir' (alerta novo), 'escalar' (severidade subiu), 'atualizar' (gravar pico e
+        contagem), 'suprimir' (nada a gravar) ou 'fechar' (recuperou); None se o agrupamento
+        estiver desligado.
+        """
+        with self.lock:
+            if not self.carregado:
+                self.carregar(connection)
+            if not self.ativo or self.sem_tabela:
+                return None
+            acoes = []
+            par = (id_estufa, tipo_sensor)
+            
+            if not anomalia:
+                self.normais[par] = self.normais.get(par, 0) + 1
+                if self.normais[par] >= self.recuperacao:
+                    for direcao in (1, -1):
+                        episodio = self.abertos.pop((id_estufa, tipo_sensor, direcao), None)
+                        if episodio is not None:
+                            episodio.fim = datetime.now()
+                            acoes.append(('fechar', episodio))
+                return acoes
+            
+            self.normais[par] = 0
+            motivo, severidade = anomalia
+            direcao = 1 if diferenca > 0 else -1
+            
+            # Passou direto de um lado da faixa para o outro: o episódio anterior acabou
+            oposto = self.abertos.pop((id_estufa, tipo_sensor, -direcao), None)
+            if oposto is not None:
+                oposto.fim = datetime.now()
+                acoes.append(('fechar', oposto))
+            
+            chave = (id_estufa, tipo_sensor, direcao)
+            episodio = self.abertos.get(chave)
+            if episodio is None:
+                episodio = self.abertos[chave] = EpisodioAlerta(
+                    id_estufa, tipo_sensor, direcao, severidade, motivo, nivel, id_medicao)
+                acoes.append(('abrir', episodio))
+                return acoes
+            
+            episodio.registrar(nivel, id_medicao)
+            if NIVEIS_SEVERIDADE.get(severidade, 0) > NIVEIS_SEVERIDADE.get(episodio.severidade, 0):
+                episodio.severidade = severidade
+                episodio.motivo = motivo
+                acoes.append(('escalar', episodio))
+            elif time.time() - episodio.gravado_em >= self.intervalo_gravacao:
+                acoes.append(('atualizar', episodio))
+            else:
+                acoes.append(('suprimir', episodio))
+            return acoes
+    
+    def estatisticas(self):
+        with self.lock:
+            return {'abertos': len(self.abertos)}
+
+
+# Supressor compartilhado pelo processo (ALERTAS_AGRUPAR=0 volta a um alerta por medição anômala)
+supressor_alertas = SupressorAlertas(
+    recuperacao=int(os.getenv('ALERTAS_RECUPERACAO', '2')),
+    intervalo_gravacao=float(os.getenv('ALERTAS_GRAVAR_A_CADA', '30')),
+    ativo=os.getenv('ALERTAS_AGRUPAR', '1') == '1'
+)
+
+
+def invalidar_caches():
+    """Depois de mudar cadastros, tarefas ou alertas: referência, balanceador e supressor recarregam do banco"""
+    dados_referencia.invalidar()
+    balanceador_tarefas.invalidar()
+    supressor_alertas.invalidar()
+
+
+# Comandos do caminho quente do monitor: preparados uma vez por conexão (db.comandos)
+db.comandos.registrar("medicao_por_id", """
+        SELECT valor_medido, id_sensor
+        FROM medicao
+        WHERE id_medicao = %s
+        """)
+db.comandos.registrar("ultimas_medicoes", """
         SELECT 
             m.valor_medido,
             m.data_hora_registro
@@ -42,9 +713,218 @@ class AIGreenhouseMonitor:
         AND m.valor_medido IS NOT NULL
         ORDER BY m.data_hora_registro DESC
         LIMIT %s
+        """)
+db.comandos.registrar("medicoes_lote", """
+        SELECT m.id_medicao, m.valor_medido, s.tipo_sensor, s.id_estufa
+        FROM medicao m
+        JOIN sensor s ON m.id_sensor = s.id_sensor
+        WHERE m.id_medicao = ANY(%s)
+        AND m.valor_medido IS NOT NULL
+        ORDER BY m.id_medicao
+        """)
+db.comandos.registrar("janelas_lote", """
+        WITH alvo AS (
+            SELECT m.id_medicao, m.valor_medido, m.data_hora_registro,
+                   s.tipo_sensor, s.id_estufa
+            FROM medicao m
+            JOIN sensor s ON m.id_sensor = s.id_sensor
+            WHERE m.id_medicao = ANY(%(ids)s)
+            AND m.valor_medido IS NOT NULL
+        )
+        SELECT
+            a.id_medicao,
+            a.valor_medido,
+            a.tipo_sensor,
+            a.id_estufa,
+            ARRAY(
+                SELECT u.valor_medido
+                FROM (
+                    SELECT r.valor_medido, r.data_hora_registro, r.id_medicao
+                    FROM sensor s
+                    CROSS JOIN LATERAL (
+                        SELECT m.valor_medido, m.data_hora_registro, m.id_medicao
+                        FROM medicao m
+                        WHERE m.id_sensor = s.id_sensor
+                        AND m.valor_medido IS NOT NULL
+                        AND m.data_hora_registro <= a.data_hora_registro
+                        AND (m.data_hora_registro < a.data_hora_registro OR m.id_medicao <= a.id_medicao)
+                        ORDER BY m.data_hora_registro DESC, m.id_medicao DESC
+                        LIMIT %(janela)s
+                    ) r
+                    WHERE s.tipo_sensor = a.tipo_sensor
+                    AND s.id_estufa = a.id_estufa
+                    ORDER BY r.data_hora_registro DESC, r.id_medicao DESC
+                    LIMIT %(janela)s
+                ) u
+                ORDER BY u.data_hora_registro, u.id_medicao
+            ) AS ultimos
+        FROM alvo a
+        ORDER BY a.id_medicao
+        """)
+db.comandos.registrar("inserir_medicao", """
+        INSERT INTO medicao (data_hora_registro, valor_medido, id_sensor)
+        VALUES (NOW(), %s, %s)
+        RETURNING id_medicao
+        """)
+db.comandos.registrar("inserir_alerta", """
+        INSERT INTO alerta (seriedade, mensagem, data_hora_alerta, id_medicao)
+        VALUES (%s, %s, NOW(), %s)
+        RETURNING id_alerta
+        """)
+db.comandos.registrar("inserir_tarefa", """
+        INSERT INTO tarefa (descricao, data_conclusao, data_agendada, id_funcionario)
+        VALUES (%s, NULL, %s, %s) RETURNING id_tarefa
+        """)
+db.comandos.registrar("contexto_alertas", """
+        SELECT 
+            a.id_alerta,
+            json_build_object(
+                'id_alerta', a.id_alerta,
+                'severidade', a.seriedade,
+                'mensagem', a.mensagem,
+                'data_hora_alerta', a.data_hora_alerta,
+                'id_medicao', m.id_medicao,
+                'valor_atual', m.valor_medido,
+                'id_sensor', s.id_sensor,
+                'tipo_sensor', s.tipo_sensor,
+                'unidade_medida', s.unidade_medida,
+                'id_estufa', s.id_estufa,
+                'nome_estufa', e.nome,
+                'localizacao', e.localizacao,
+                'tamanho', e.tamanho
+            ) AS alerta,
+            (
+                SELECT COALESCE(json_agg(h.valor_medido ORDER BY h.data_hora_registro DESC), '[]')
+                FROM (
+                    SELECT m2.valor_medido, m2.data_hora_registro
+                    FROM medicao m2
+                    JOIN sensor s2 ON m2.id_sensor = s2.id_sensor
+                    WHERE s2.tipo_sensor = s.tipo_sensor
+                    AND s2.id_estufa = s.id_estufa
+                    AND m2.valor_medido IS NOT NULL
+                    ORDER BY m2.data_hora_registro DESC
+                    LIMIT %(limite_historico)s
+                ) h
+            ) AS historico
+        FROM alerta a
+        JOIN medicao m ON a.id_medicao = m.id_medicao
+        JOIN sensor s ON m.id_sensor = s.id_sensor
+        JOIN estufa e ON s.id_estufa = e.id_estufa
+        WHERE a.id_alerta = ANY(%(ids)s)
+        """)
+
+
+class AIGreenhouseMonitor:
+    def __init__(self, connection, tamanho_janela=5, aquecer_janelas=False,
+                 processador=None, timeout_ia=None, tentativas_ia=1, backoff_ia=1.0,
+                 cache_ia=None, referencia=None, balanceador=None, estimador="mediana", supressor=None):
+        self.connection = connection
+        self.referencia = referencia or dados_referencia
+        self.balanceador = balanceador or balanceador_tarefas
+        self.supressor = supressor or supressor_alertas
+        # Modelo do Gemini criado sob demanda (ver a propriedade `model`)
+        self._model = None
+        
+        # Chamadas ao Gemini: timeout por chamada (segundos) e novas tentativas com backoff
+        self.timeout_ia = timeout_ia
+        self.tentativas_ia = tentativas_ia
+        self.backoff_ia = backoff_ia
+        
+        # Cache (CacheTarefasIA) para alertas de contexto equivalente; sem um explícito, o da configuração
+        self.cache_ia = cache_ia if cache_ia is not None else cache_ia_pela_config()
+        
+        # Se houver um ProcessadorAlertas, os alertas vão para a fila em segundo plano
+        self.processador = processador
+        
+        # Janelas em memória das últimas medições por (id_estufa, tipo_sensor)
+        self.tamanho_janela = tamanho_janela
+        self.janelas = {}
+        # Estimador de nível de detectores.ESTIMADORES comparado com a faixa ideal
+        self.estimador = estimador
+        if aquecer_janelas:
+            self.sincronizar_janelas()
+    
+    @property
+    def model(self):
+        if self._model is None and carregar_gemini():
+            self._model = genai.GenerativeModel('gemini-2.5-flash')
+        return self._model
+    
+    @model.setter
+    def model(self, model):
+        self._model = model
+    
+    def sincronizar_janelas(self, id_estufa=None, tipo_sensor=None):
+        """
+        Recarrega do banco as janelas de medições recentes.
+        Sem argumentos recarrega todas; com id_estufa/tipo_sensor só as correspondentes
         """
+        cursor = self.connection.cursor()
+        
+        # Por (estufa, tipo): as últimas N de cada sensor pelo índice (id_sensor, data_hora_registro)
+        # e dessas as N mais recentes, sem varrer o histórico de medicao
+        query = """
+        SELECT k.id_estufa, k.tipo_sensor, r.id_medicao, r.valor_medido
+        FROM (
+            SELECT DISTINCT id_estufa, tipo_sensor
+            FROM sensor
+            WHERE (%(id_estufa)s IS NULL OR id_estufa = %(id_estufa)s)
+            AND (%(tipo_sensor)s IS NULL OR tipo_sensor = %(tipo_sensor)s)
+        ) k
+        CROSS JOIN LATERAL (
+            SELECT u.id_medicao, u.valor_medido, u.data_hora_registro
+            FROM sensor s
+            CROSS JOIN LATERAL (
+                SELECT m.id_medicao, m.valor_medido, m.data_hora_registro
+                FROM medicao m
+                WHERE m.id_sensor = s.id_sensor
+                AND m.valor_medido IS NOT NULL
+                ORDER BY m.data_hora_registro DESC, m.id_medicao DESC
+                LIMIT %(tamanho)s
+            ) u
+            WHERE s.id_estufa = k.id_estufa
+            AND s.tipo_sensor = k.tipo_sensor
+            ORDER BY u.data_hora_registro DESC, u.id_medicao DESC
+            LIMIT %(tamanho)s
+        ) r
+        ORDER BY k.id_estufa, k.tipo_sensor, r.data_hora_registro, r.id_medicao
+        """
+        
+        cursor.execute(query, {
+            'id_estufa': id_estufa,
+            'tipo_sensor': tipo_sensor,
+            'tamanho': self.tamanho_janela
+        })
+        results = cursor.fetchall()
+        cursor.close()
+        
+        if id_estufa is None and tipo_sensor is None:
+            self.janelas = {}
+        else:
+            for chave in list(self.janelas):
+                if id_estufa in (None, chave[0]) and tipo_sensor in (None, chave[1]):
+                    del self.janelas[chave]
+            if id_estufa is not None and tipo_sensor is not None:
+                self.janelas[(id_estufa, tipo_sensor)] = JanelaMedicoes(self.tamanho_janela)
+        
+        for r_estufa, r_tipo, r_id_medicao, valor in results:
+            janela = self.janelas.setdefault((r_estufa, r_tipo), JanelaMedicoes(self.tamanho_janela))
+            janela.adicionar(float(valor))
+            janela.ultimo_id = max(janela.ultimo_id, r_id_medicao)
         
-        cursor.execute(query, (tipo_sensor, id_estufa, limit))
+        return len(results)
+    
+    def get_janela(self, id_estufa, tipo_sensor):
+        """Janela em memória do (estufa, tipo_sensor), carregada do banco na primeira vez"""
+        chave = (id_estufa, tipo_sensor)
+        if chave not in self.janelas:
+            self.sincronizar_janelas(id_estufa, tipo_sensor)
+        return self.janelas[chave]
+    
+    def get_ultimas_medicoes_sensor(self, id_sensor, tipo_sensor, id_estufa, limit=5):
+        """Obtém as últimas N medições do mesmo tipo de sensor na mesma estufa"""
+        cursor = self.connection.cursor()
+        db.comandos.executar(cursor, "ultimas_medicoes", (tipo_sensor, id_estufa, limit))
         results = cursor.fetchall()
         cursor.close()
         
@@ -57,6 +937,173 @@ class AIGreenhouseMonitor:
             return None
         return statistics.median(valores)
     
+    def classificar_anomalia(self, tipo_sensor, valor, temp_min, temp_max, umid_min, umid_max):
+        """
+        Compara o valor analisado com a condição ideal da cultura.
+        Retorna (motivo, severidade) ou None se estiver dentro do padrão
+        """
+        # Faixa com um dos limites nulo no cadastro: só o outro lado é verificado
+        if tipo_sensor == 'Temperatura':
+            if temp_min is not None and valor < float(temp_min):
+                temp_min = float(temp_min)
+                diferenca = temp_min - valor
+                motivo = f"Temperatura abaixo do ideal (mediana: {valor:.2f}°C < mínimo: {temp_min}°C)"
+                return motivo, "Alta" if diferenca > 5 else "Média" if diferenca > 2 else "Baixa"
+            elif temp_max is not None and valor > float(temp_max):
+                temp_max = float(temp_max)
+                diferenca = valor - temp_max
+                motivo = f"Temperatura acima do ideal (mediana: {valor:.2f}°C > máximo: {temp_max}°C)"
+                return motivo, "Alta" if diferenca > 5 else "Média" if diferenca > 2 else "Baixa"
+        
+        elif tipo_sensor == 'Umidade':
+            if umid_min is not None and valor < float(umid_min):
+                umid_min = float(umid_min)
+                diferenca = umid_min - valor
+                motivo = f"Umidade abaixo do ideal (mediana: {valor:.2f}% < mínimo: {umid_min}%)"
+                return motivo, "Alta" if diferenca > 15 else "Média" if diferenca > 5 else "Baixa"
+            elif umid_max is not None and valor > float(umid_max):
+                umid_max = float(umid_max)
+                diferenca = valor - umid_max
+                motivo = f"Umidade acima do ideal (mediana: {valor:.2f}% > máximo: {umid_max}%)"
+                return motivo, "Alta" if diferenca > 15 else "Média" if diferenca > 5 else "Baixa"
+        
+        return None
+    
+    def faixas_ideais(self, cultura):
+        """(temp_min, temp_max, umid_min, umid_max) da cultura, ou Nones sem cultura ativa"""
+        if not cultura:
+            return None, None, None, None
+        return cultura['temp_min'], cultura['temp_max'], cultura['umid_min'], cultura['umid_max']
+    
+    def faixa_ideal(self, tipo_sensor, cultura):
+        """(mínimo, máximo) da cultura para o tipo de sensor, ou (None, None) sem faixa"""
+        temp_min, temp_max, umid_min, umid_max = self.faixas_ideais(cultura)
+        if tipo_sensor == 'Temperatura':
+            return temp_min, temp_max
+        if tipo_sensor == 'Umidade':
+            return umid_min, umid_max
+        return None, None
+    
+    def registrar_alertas(self, cursor, analisadas):
+        """
+        Grava os alertas das medições analisadas, cada uma como
+        (id_estufa, tipo_sensor, nível, diferença até a faixa, (motivo, severidade) ou None, id_medicao).
+        Com o supressor ativo, anomalias de um episódio já aberto não criam alerta novo e medições
+        normais contam para fechar o episódio. Retorna os IDs dos alertas que devem ir para a IA
+        (novos e escalados), na ordem em que aconteceram.
+        """
+        novos, escalados, gravar = [], {}, {}
+        suprimidas = 0
+        agrupar = False
+        for id_estufa, tipo_sensor, nivel, diferenca, anomalia, id_medicao in analisadas:
+            acoes = None
+            if self.supressor.ativo:
+                acoes = self.supressor.avaliar(self.connection, id_estufa, tipo_sensor, nivel,
+                                               diferenca, anomalia, id_medicao)
+            if acoes is None:
+                # Sem agrupamento: um alerta por medição anômala
+                if anomalia:
+                    motivo, severidade = anomalia
+                    novos.append(EpisodioAlerta(id_estufa, tipo_sensor, 1 if diferenca > 0 else -1,
+                                                severidade, motivo, nivel, id_medicao))
+                continue
+            agrupar = True
+            for acao, episodio in acoes:
+                metricas.incrementar("episodios_alerta_total", acao=acao)
+                if acao == 'abrir':
+                    novos.append(episodio)
+                elif acao == 'suprimir':
+                    suprimidas += 1
+                elif episodio.id_alerta is not None:
+                    # Episódio aberto neste mesmo lote ainda não tem ID: entra no INSERT já atualizado
+                    gravar[episodio] = True
+                    if acao == 'escalar':
+                        escalados[episodio] = True
+        
+        if suprimidas:
+            print(f"🔕 {suprimidas} medições anômalas agrupadas em alertas já abertos")
+        if not (novos or gravar):
+            return []
+        
+        try:
+            if len(novos) == 1:
+                # Caminho de uma medição por vez: comando preparado
+                db.comandos.executar(cursor, "inserir_alerta",
+                                     (novos[0].severidade, novos[0].motivo, novos[0].id_medicao_inicial))
+                novos[0].id_alerta = cursor.fetchone()[0]
+            elif novos:
+                rows = execute_values(cursor, """
+                    INSERT INTO alerta (seriedade, mensagem, data_hora_alerta, id_medicao)
+                    VALUES %s
+                    RETURNING id_alerta
+                    """, [(e.severidade, e.motivo, e.id_medicao_inicial) for e in novos],
+                    template="(%s, %s, NOW(), %s)", page_size=len(novos), fetch=True)
+                for episodio, row in zip(novos, rows):
+                    episodio.id_alerta = row[0]
+            if novos and agrupar:
+                rows = execute_values(cursor, """
+                    INSERT INTO episodio_alerta (id_alerta, id_estufa, tipo_sensor, direcao, seriedade, pico,
+                                                 ocorrencias, id_ultima_medicao, data_hora_inicio,
+                                                 ultima_ocorrencia, data_hora_fim)
+                    VALUES %s
+                    ON CONFLICT (id_estufa, tipo_sensor, direcao) WHERE data_hora_fim IS NULL DO NOTHING
+                    RETURNING id_alerta
+                    """, [(e.id_alerta, e.id_estufa, e.tipo_sensor, e.direcao, e.severidade, e.pico,
+                           e.ocorrencias, e.id_ultima_medicao, e.inicio, e.ultima_ocorrencia, e.fim)
+                          for e in novos],
+                    page_size=len(novos), fetch=True)
+                inseridos = {row[0] for row in rows}
+                perdidos = [e for e in novos if e.id_alerta not in inseridos]
+                if perdidos:
+                    # Outro processo abriu o episódio antes: o alerta recém-criado sai (sem IA nem
+                    # tarefa) e as leituras entram no episódio que já estava aberto
+                    cursor.execute("DELETE FROM alerta WHERE id_alerta = ANY(%s)",
+                                   ([e.id_alerta for e in perdidos],))
+                    novos = [e for e in novos if e.id_alerta in inseridos]
+                    for episodio, escalou in self.supressor.adotar(cursor, perdidos):
+                        gravar[episodio] = True
+                        if escalou:
+                            escalados[episodio] = True
+            if escalados:
+                execute_values(cursor, """
+                    UPDATE alerta a SET seriedade = v.seriedade, mensagem = v.mensagem
+                    FROM (VALUES %s) AS v(id_alerta, seriedade, mensagem)
+                    WHERE a.id_alerta = v.id_alerta
+                    """, [(e.id_alerta, e.severidade, e.motivo) for e in escalados],
+                    template="(%s::bigint, %s, %s)", page_size=len(escalados))
+            if gravar:
+                execute_values(cursor, """
+                    UPDATE episodio_alerta e
+                    SET seriedade = v.seriedade, pico = v.pico, ocorrencias = v.ocorrencias,
+                        id_ultima_medicao = v.id_medicao, ultima_ocorrencia = v.ultima,
+                        data_hora_fim = v.fim
+                    FROM (VALUES %s) AS v(id_alerta, seriedade, pico, ocorrencias, id_medicao, ultima, fim)
+                    WHERE e.id_alerta = v.id_alerta
+                    """, [(e.id_alerta, e.severidade, e.pico, e.ocorrencias, e.id_ultima_medicao,
+                           e.ultima_ocorrencia, e.fim) for e in gravar],
+                    template="(%s::bigint, %s, %s::numeric, %s::int, %s::bigint, %s::timestamp, %s::timestamp)",
+                    page_size=len(gravar))
+            self.connection.commit()
+        except Exception:
+            # O estado em memória já avançou: volta a ler os episódios do banco
+            self.connection.rollback()
+            self.supressor.invalidar()
+            raise
+        
+        agora = time.time()
+        for episodio in list(novos) + list(gravar):
+            episodio.gravado_em = agora
+        for episodio in novos:
+            metricas.incrementar("alertas_total", severidade=episodio.severidade)
+            print(f"🔔 ALERTA #{episodio.id_alerta} criado no banco de dados!")
+        for episodio in escalados:
+            print(f"⏫ ALERTA #{episodio.id_alerta} escalado para {episodio.severidade}: {episodio.motivo}")
+        for episodio in list(novos) + list(gravar):
+            if episodio.fim is not None:
+                print(f"✅ ALERTA #{episodio.id_alerta} encerrado: {episodio.ocorrencias} ocorrências, "
+                      f"pico {episodio.pico:.2f}")
+        return [e.id_alerta for e in novos] + [e.id_alerta for e in escalados]
+    
     def verificar_anomalia_e_criar_alerta(self, id_medicao):
         """
         SISTEMA TRADICIONAL: Verifica anomalia usando mediana e CRIA ALERTA no banco
@@ -64,110 +1111,161 @@ class AIGreenhouseMonitor:
         """
         cursor = self.connection.cursor()
         
-        query = """
-        SELECT 
-            m.id_medicao,
-            m.valor_medido,
-            m.data_hora_registro,
-            s.id_sensor,
-            s.tipo_sensor,
-            s.unidade_medida,
-            s.id_estufa,
-            ci.temp_min,
-            ci.temp_max,
-            ci.umid_min,
-            ci.umid_max
-        FROM medicao m
-        JOIN sensor s ON m.id_sensor = s.id_sensor
-        JOIN estufa e ON s.id_estufa = e.id_estufa
-        LEFT JOIN lote_plantio lp ON e.id_estufa = lp.id_estufa 
-            AND lp.data_previsao_colheita >= CURRENT_DATE
-        LEFT JOIN condicao_ideal ci ON lp.id_cultura = ci.id_cultura
-        WHERE m.id_medicao = %s
-        """
+        with metricas.medir("etapa_segundos", etapa="consultar_medicao"):
+            db.comandos.executar(cursor, "medicao_por_id", (id_medicao,))
+            result = cursor.fetchone()
         
-        cursor.execute(query, (id_medicao,))
-        result = cursor.fetchone()
+        if not result or result[0] is None:
+            cursor.close()
+            return None
+        
+        metricas.incrementar("medicoes_total")
+        valor_atual = float(result[0])
+        id_sensor = result[1]
         
-        if not result:
+        # Sensor, estufa e faixas ideais vêm do cache de referência
+        sensor = self.referencia.sensor(self.connection, id_sensor)
+        if not sensor:
             cursor.close()
             return None
+        id_estufa, tipo_sensor, unidade_medida = sensor
+        estufa = self.referencia.estufa(self.connection, id_estufa)
+        cultura = estufa['cultura'] if estufa else None
         
-        valor_atual = float(result[1])
-        id_sensor = result[3]
-        tipo_sensor = result[4]
-        unidade_medida = result[5]
-        id_estufa = result[6]
+        # Últimas medições do mesmo tipo na mesma estufa, vindas da janela em memória
+        janela = self.get_janela(id_estufa, tipo_sensor)
+        janela.adicionar(valor_atual, id_medicao)
+        ultimas_medicoes = janela.ultimas()
         
-        # Pega as últimas 5 medições do mesmo tipo na mesma estufa
-        ultimas_medicoes = self.get_ultimas_medicoes_sensor(id_sensor, tipo_sensor, id_estufa, 5)
+        with metricas.medir("etapa_segundos", etapa="analisar"):
+            if len(janela) < 3:
+                valor_para_analise = valor_atual
+            elif self.estimador == "mediana":
+                # A janela mantém os valores ordenados: mediana sem numpy nem reordenar
+                valor_para_analise = janela.mediana()
+            else:
+                import detectores
+                matriz = detectores.montar_matriz([list(janela.valores)], self.tamanho_janela)
+                valor_para_analise = float(detectores.nivel(matriz, self.estimador, self.tamanho_janela)[0])
         
         if len(ultimas_medicoes) < 3:
             print(f"⚠ Poucas medições históricas ({len(ultimas_medicoes)}). Usando valor atual diretamente.")
-            valor_para_analise = valor_atual
         else:
-            mediana = self.calcular_mediana(ultimas_medicoes)
             print(f"📊 Últimas {len(ultimas_medicoes)} medições: {[f'{v:.2f}' for v in ultimas_medicoes]}")
-            print(f"📊 Mediana calculada: {mediana:.2f} {unidade_medida}")
+            print(f"📊 {self.estimador.capitalize()} calculada: {valor_para_analise:.2f} {unidade_medida}")
             print(f"📊 Valor atual: {valor_atual:.2f} {unidade_medida}")
-            valor_para_analise = mediana
         
         # Verifica se está fora do padrão
-        fora_padrao = False
-        motivo = ""
-        severidade = ""
+        anomalia = self.classificar_anomalia(tipo_sensor, valor_para_analise, *self.faixas_ideais(cultura))
+        diferenca = _fora_da_faixa(valor_para_analise, *self.faixa_ideal(tipo_sensor, cultura))
         
-        if tipo_sensor == 'Temperatura' and result[7] is not None:
-            temp_min = float(result[7])
-            temp_max = float(result[8])
-            
-            if valor_para_analise < temp_min:
-                fora_padrao = True
-                diferenca = temp_min - valor_para_analise
-                motivo = f"Temperatura abaixo do ideal (mediana: {valor_para_analise:.2f}°C < mínimo: {temp_min}°C)"
-                severidade = "Alta" if diferenca > 5 else "Média" if diferenca > 2 else "Baixa"
-            elif valor_para_analise > temp_max:
-                fora_padrao = True
-                diferenca = valor_para_analise - temp_max
-                motivo = f"Temperatura acima do ideal (mediana: {valor_para_analise:.2f}°C > máximo: {temp_max}°C)"
-                severidade = "Alta" if diferenca > 5 else "Média" if diferenca > 2 else "Baixa"
-        
-        elif tipo_sensor == 'Umidade' and result[9] is not None:
-            umid_min = float(result[9])
-            umid_max = float(result[10])
-            
-            if valor_para_analise < umid_min:
-                fora_padrao = True
-                diferenca = umid_min - valor_para_analise
-                motivo = f"Umidade abaixo do ideal (mediana: {valor_para_analise:.2f}% < mínimo: {umid_min}%)"
-                severidade = "Alta" if diferenca > 15 else "Média" if diferenca > 5 else "Baixa"
-            elif valor_para_analise > umid_max:
-                fora_padrao = True
-                diferenca = valor_para_analise - umid_max
-                motivo = f"Umidade acima do ideal (mediana: {valor_para_analise:.2f}% > máximo: {umid_max}%)"
-                severidade = "Alta" if diferenca > 15 else "Média" if diferenca > 5 else "Baixa"
-        
-        if not fora_padrao:
-            cursor.close()
-            return None
+        if anomalia:
+            motivo, severidade = anomalia
+            print(f"\n⚠️  ANOMALIA DETECTADA [{severidade}]: {motivo}")
         
-        # ===== CRIA O ALERTA NO BANCO DE DADOS =====
-        print(f"\n⚠️  ANOMALIA DETECTADA [{severidade}]: {motivo}")
+        # ===== CRIA (OU AGRUPA NO EPISÓDIO ABERTO) O ALERTA NO BANCO DE DADOS =====
+        with metricas.medir("etapa_segundos", etapa="inserir_alerta"):
+            ids_alerta = self.registrar_alertas(
+                cursor, [(id_estufa, tipo_sensor, valor_para_analise, diferenca, anomalia, id_medicao)])
         
-        query_insert_alerta = """
-        INSERT INTO alerta (seriedade, mensagem, data_hora_alerta, id_medicao)
-        VALUES (%s, %s, NOW(), %s)
-        RETURNING id_alerta
+        cursor.close()
+        return ids_alerta[0] if ids_alerta else None
+    
+    def janelas_do_lote(self, cursor, results, janela):
+        """
+        Últimas `janela` medições (da mais antiga para a mais recente, terminando na própria)
+        de cada medição do lote, com results em (id_medicao, valor, tipo_sensor, id_estufa)
+        ordenado por id. Chaves com janela em memória só avançam a janela; as frias (sem
+        janela, lote com medições já vistas ou `janela` diferente do tamanho das janelas)
+        vêm da consulta janelas_lote, e as que não tinham janela passam a ter
         """
+        grupos = {}
+        for i, (_, _, tipo_sensor, id_estufa) in enumerate(results):
+            grupos.setdefault((id_estufa, tipo_sensor), []).append(i)
         
-        cursor.execute(query_insert_alerta, (severidade, motivo, id_medicao))
-        id_alerta = cursor.fetchone()[0]
-        self.connection.commit()
+        ultimos = [None] * len(results)
+        frios = {}
+        for chave, indices in grupos.items():
+            janela_memoria = self.janelas.get(chave) if janela == self.tamanho_janela else None
+            if janela_memoria is None or results[indices[0]][0] <= janela_memoria.ultimo_id:
+                frios[chave] = indices
+                continue
+            for i in indices:
+                janela_memoria.adicionar(float(results[i][1]), results[i][0])
+                ultimos[i] = list(janela_memoria.valores)
+        metricas.incrementar("janelas_lote_total", len(grupos) - len(frios), origem="memoria")
+        if not frios:
+            return ultimos
         
-        print(f"🔔 ALERTA #{id_alerta} criado no banco de dados!")
+        metricas.incrementar("janelas_lote_total", len(frios), origem="banco")
+        with metricas.medir("etapa_segundos", etapa="consultar_janelas_lote"):
+            db.comandos.executar(cursor, "janelas_lote", {
+                'ids': [results[i][0] for indices in frios.values() for i in indices], 'janela': janela})
+            historico = {row[0]: row[4] for row in cursor.fetchall()}
+        for chave, indices in frios.items():
+            for i in indices:
+                ultimos[i] = [float(v) for v in historico[results[i][0]]]
+            if janela == self.tamanho_janela and chave not in self.janelas:
+                nova = JanelaMedicoes(self.tamanho_janela)
+                for valor in ultimos[indices[-1]]:
+                    nova.adicionar(valor)
+                nova.ultimo_id = results[indices[-1]][0]
+                self.janelas[chave] = nova
+        return ultimos
+    
+    def verificar_anomalias_em_lote(self, ids_medicao, janela=None):
+        """
+        SISTEMA TRADICIONAL EM LOTE: verifica várias medições de uma vez.
+        As últimas `janela` medições de cada (tipo_sensor, estufa) vêm das janelas em
+        memória (ver janelas_do_lote), o nível de todas é estimado numa só chamada
+        vetorizada (detectores) e todos os alertas são inseridos num único INSERT.
+        Retorna a lista de IDs dos alertas criados
+        """
+        if not ids_medicao:
+            return []
+        janela = janela or self.tamanho_janela
+        
+        cursor = self.connection.cursor()
+        
+        with metricas.medir("etapa_segundos", etapa="consultar_medicoes_lote"):
+            db.comandos.executar(cursor, "medicoes_lote", (list(ids_medicao),))
+            results = cursor.fetchall()
+        metricas.incrementar("medicoes_total", len(results))
+        ultimos = self.janelas_do_lote(cursor, results, janela)
         
+        faixas = []
+        for _, _, tipo_sensor, id_estufa in results:
+            estufa = self.referencia.estufa(self.connection, id_estufa)
+            faixas.append(self.faixa_ideal(tipo_sensor, estufa['cultura'] if estufa else None))
+        
+        # Nível de todas as medições do lote numa chamada; com poucas medições vale o valor atual
+        import numpy as np
+        import detectores
+        with metricas.medir("etapa_segundos", etapa="analisar_lote"):
+            matriz = detectores.montar_matriz(ultimos, janela)
+            niveis = detectores.nivel(matriz, self.estimador, janela)
+            limites = np.array(faixas, dtype=float).reshape(-1, 2)
+            diferencas = detectores.fora_da_faixa(niveis, limites[:, 0], limites[:, 1])
+        
+        # Só as medições fora da faixa passam pela classificação com mensagem;
+        # as demais seguem para o supressor, que fecha os episódios recuperados
+        anomalias = [None] * len(results)
+        for i in np.flatnonzero(diferencas):
+            estufa = self.referencia.estufa(self.connection, results[i][3])
+            anomalias[i] = self.classificar_anomalia(results[i][2], float(niveis[i]),
+                                                     *self.faixas_ideais(estufa['cultura'] if estufa else None))
+        
+        total_anomalias = sum(1 for anomalia in anomalias if anomalia)
+        if total_anomalias:
+            print(f"\n⚠️  {total_anomalias} ANOMALIAS DETECTADAS em {len(results)} medições analisadas")
+        
+        analisadas = [(row[3], row[2], float(niveis[i]), float(diferencas[i]), anomalias[i], row[0])
+                      for i, row in enumerate(results)]
+        with metricas.medir("etapa_segundos", etapa="inserir_alertas_lote"):
+            ids_alerta = self.registrar_alertas(cursor, analisadas)
         cursor.close()
-        return id_alerta
+        
+        return ids_alerta
     
     def get_alerta_info(self, id_alerta):
         """Busca informações completas do alerta para a IA processar"""
@@ -213,110 +1311,46 @@ class AIGreenhouseMonitor:
                 'id_estufa': result[9],
                 'nome_estufa': result[10],
                 'localizacao': result[11],
-                'tamanho': float(result[12])
+                'tamanho': float(result[12]) if result[12] is not None else None
             }
         return None
     
     def get_atuadores_estufa(self, id_estufa):
         """Obtém todos os atuadores disponíveis na estufa"""
-        cursor = self.connection.cursor()
-        query = "SELECT id_atuador, tipo_atuador, capacidade FROM atuador WHERE id_estufa = %s"
-        cursor.execute(query, (id_estufa,))
-        results = cursor.fetchall()
-        cursor.close()
-        
-        return [{'id_atuador': r[0], 'tipo': r[1], 'capacidade': r[2]} for r in results]
+        estufa = self.referencia.estufa(self.connection, id_estufa)
+        return [dict(atuador) for atuador in estufa['atuadores']] if estufa else []
     
     def get_cultura_info(self, id_estufa):
         """Obtém informações sobre a cultura plantada na estufa"""
-        cursor = self.connection.cursor()
-        query = """
-        SELECT 
-            c.nome_popular, 
-            c.nome_cientifico,
-            ci.temp_min, ci.temp_max, ci.umid_min, ci.umid_max,
-            -- ** CORREÇÃO: Adicionando data_plantio à lista de SELECT **
-            lp.data_plantio 
-        FROM cultura c
-        JOIN condicao_ideal ci ON c.id_cultura = ci.id_cultura
-        JOIN lote_plantio lp ON c.id_cultura = lp.id_cultura
-        WHERE lp.id_estufa = %s AND lp.data_previsao_colheita >= CURRENT_DATE
-        ORDER BY lp.data_plantio DESC LIMIT 1
-        """
-        cursor.execute(query, (id_estufa,))
-        result = cursor.fetchone()
-        cursor.close()
-        
-        if result:
-            return {
-                'nome_popular': result[0],
-                'nome_cientifico': result[1],
-                'temp_min': float(result[2]),
-                'temp_max': float(result[3]),
-                'umid_min': float(result[4]),
-                'umid_max': float(result[5])
-            }
+        estufa = self.referencia.estufa(self.connection, id_estufa)
+        if estufa and estufa['cultura']:
+            return dict(estufa['cultura'])
         return None
     
     def get_historico_medicoes(self, id_sensor, id_estufa, tipo_sensor):
         """Obtém histórico recente para contexto da IA"""
-        return self.get_ultimas_medicoes_sensor(id_sensor, tipo_sensor, id_estufa, 5)
+        return self.get_janela(id_estufa, tipo_sensor).ultimas()
     
-    def get_funcionario_com_menos_tarefas(self, id_estufa):
-        """Seleciona funcionário com menos tarefas pendentes"""
-        cursor = self.connection.cursor()
-        query = """
-        WITH funcionarios_estufa AS (
-            SELECT DISTINCT ef.id_funcionario, f.nome
-            FROM estufa_funcionario ef
-            JOIN funcionario f ON ef.id_funcionario = f.id_funcionario
-            WHERE ef.id_estufa = %s AND ef.data_fim IS NULL
-        ),
-        tarefas_pendentes AS (
-            SELECT t.id_funcionario, COUNT(*) as tarefas_pendentes
-            FROM tarefa t
-            WHERE t.data_conclusao IS NULL
-            AND t.id_funcionario IN (SELECT id_funcionario FROM funcionarios_estufa)
-            GROUP BY t.id_funcionario
-        )
-        SELECT fe.id_funcionario, fe.nome, COALESCE(tp.tarefas_pendentes, 0) as tarefas_pendentes
-        FROM funcionarios_estufa fe
-        LEFT JOIN tarefas_pendentes tp ON fe.id_funcionario = tp.id_funcionario
-        ORDER BY COALESCE(tp.tarefas_pendentes, 0) ASC, fe.id_funcionario ASC
-        LIMIT 1
-        """
-        
-        cursor.execute(query, (id_estufa,))
-        result = cursor.fetchone()
-        
-        if not result:
-            # Fallback
-            cursor.execute("""
-                SELECT f.id_funcionario, f.nome, COUNT(t.id_tarefa) as tarefas_pendentes
-                FROM funcionario f
-                LEFT JOIN tarefa t ON f.id_funcionario = t.id_funcionario 
-                    AND t.data_conclusao IS NULL
-                GROUP BY f.id_funcionario, f.nome
-                ORDER BY tarefas_pendentes ASC LIMIT 1
-            """)
-            result = cursor.fetchone()
-        
-        cursor.close()
-        
-        if result:
-            return {
-                'id_funcionario': result[0],
-                'nome': result[1],
-                'tarefas_pendentes': result[2]
-            }
-        return None
+    def descricao_padrao(self, alerta_info):
+        """Descrição de tarefa sem IA, usada quando o Gemini não está disponível ou falha"""
+        return f"[{alerta_info['severidade']}] Corrigir {alerta_info['tipo_sensor'].lower()} na {alerta_info['nome_estufa']}. {alerta_info['mensagem']}"
     
     def generate_task_with_ai(self, alerta_info, atuadores, cultura_info, historico_medicoes):
         """
         IA DO GEMINI: Recebe o ALERTA e gera tarefa contextualizada
         """
         if not self.model:
-            return f"[{alerta_info['severidade']}] Corrigir {alerta_info['tipo_sensor'].lower()} na {alerta_info['nome_estufa']}. {alerta_info['mensagem']}"
+            metricas.incrementar("llm_chamadas_total", resultado="sem_modelo")
+            return self.descricao_padrao(alerta_info)
+        
+        chave_cache = None
+        if self.cache_ia:
+            chave_cache = self.cache_ia.chave(alerta_info, atuadores, cultura_info, historico_medicoes)
+            descricao = self.cache_ia.get(chave_cache)
+            if descricao:
+                metricas.incrementar("llm_chamadas_total", resultado="cache")
+                print("♻️  Tarefa reaproveitada do cache da IA")
+                return descricao
         
         prompt = f"""Você é um assistente especializado em gestão de estufas inteligentes. 
 
@@ -359,21 +1393,32 @@ A descrição deve:
 RETORNE APENAS A DESCRIÇÃO DA TAREFA, SEM INTRODUÇÕES.
 """
         
-        try:
-            response = self.model.generate_content(prompt)
-            descricao = response.text.strip()
-            if len(descricao) > 400:
-                descricao = descricao[:397] + "..."
-            return descricao
-        except Exception as e:
-            print(f"Erro ao gerar tarefa com IA: {e}")
-            return f"[{alerta_info['severidade']}] Corrigir {alerta_info['tipo_sensor'].lower()} na {alerta_info['nome_estufa']}. {alerta_info['mensagem']}"
+        request_options = {'timeout': self.timeout_ia} if self.timeout_ia else None
+        
+        for tentativa in range(self.tentativas_ia):
+            try:
+                with metricas.medir("llm_segundos"):
+                    response = self.model.generate_content(prompt, request_options=request_options)
+                metricas.incrementar("llm_chamadas_total", resultado="ok")
+                descricao = response.text.strip()
+                if len(descricao) > 400:
+                    descricao = descricao[:397] + "..."
+                if chave_cache:
+                    self.cache_ia.set(chave_cache, descricao)
+                return descricao
+            except Exception as e:
+                metricas.incrementar("llm_chamadas_total", resultado="erro")
+                print(f"Erro ao gerar tarefa com IA (tentativa {tentativa + 1}/{self.tentativas_ia}): {e}")
+                if tentativa + 1 < self.tentativas_ia:
+                    time.sleep(self.backoff_ia * 2 ** tentativa)
+        
+        return self.descricao_padrao(alerta_info)
     
     def create_task_in_database(self, descricao, id_estufa, severidade="Média"):
         """Cria tarefa no banco com distribuição igualitária"""
         cursor = self.connection.cursor()
         
-        funcionario_info = self.get_funcionario_com_menos_tarefas(id_estufa)
+        funcionario_info = self.balanceador.reservar(self.connection, id_estufa)
         
         if not funcionario_info:
             print("❌ Erro: Nenhum funcionário disponível!")
@@ -387,49 +1432,83 @@ RETORNE APENAS A DESCRIÇÃO DA TAREFA, SEM INTRODUÇÕES.
         horas = 0.5 if severidade == "Alta" else 1 if severidade == "Média" else 2
         data_agendada = datetime.now() + timedelta(hours=horas)
         
-        query = """
-        INSERT INTO tarefa (descricao, data_conclusao, data_agendada, id_funcionario)
-        VALUES (%s, NULL, %s, %s) RETURNING id_tarefa
+        try:
+            db.comandos.executar(cursor, "inserir_tarefa",
+                                 (descricao, data_agendada, funcionario_info['id_funcionario']))
+            id_tarefa = cursor.fetchone()[0]
+            self.connection.commit()
+        except Exception:
+            self.balanceador.liberar(funcionario_info['id_funcionario'])
+            raise
+        finally:
+            cursor.close()
+        self.balanceador.confirmar(funcionario_info['id_funcionario'])
+        
+        return id_tarefa
+    
+    def carregar_contexto_alertas(self, ids_alerta, limite_historico=5):
         """
+        Carrega numa única consulta o contexto de vários alertas: dados do alerta/estufa
+        e histórico recente do sensor (agregados em JSON). Atuadores e cultura vêm do
+        cache de referência; o funcionário, do balanceador de tarefas.
+        Retorna {id_alerta: contexto}
+        """
+        if not ids_alerta:
+            return {}
         
-        cursor.execute(query, (descricao, data_agendada, funcionario_info['id_funcionario']))
-        id_tarefa = cursor.fetchone()[0]
-        self.connection.commit()
+        cursor = self.connection.cursor()
+        db.comandos.executar(cursor, "contexto_alertas",
+                             {'ids': list(ids_alerta), 'limite_historico': limite_historico})
+        results = cursor.fetchall()
         cursor.close()
         
-        return id_tarefa
+        contextos = {}
+        for id_alerta, alerta_info, historico in results:
+            alerta_info['data_hora_alerta'] = datetime.fromisoformat(alerta_info['data_hora_alerta'])
+            for campo in ('valor_atual', 'tamanho'):
+                if alerta_info[campo] is not None:
+                    alerta_info[campo] = float(alerta_info[campo])
+            contextos[id_alerta] = {
+                'alerta_info': alerta_info,
+                'atuadores': self.get_atuadores_estufa(alerta_info['id_estufa']),
+                'cultura_info': self.get_cultura_info(alerta_info['id_estufa']),
+                'historico_medicoes': [float(v) for v in historico]
+            }
+        return contextos
     
-    def processar_alerta_com_ia(self, id_alerta):
+    def processar_alerta_com_ia(self, id_alerta, contexto=None):
         """
         IA PROCESSA O ALERTA: Recebe um alerta e cria a tarefa corretiva
         """
         print(f"\n🤖 IA processando alerta #{id_alerta}...")
         
-        # Busca informações do alerta
-        alerta_info = self.get_alerta_info(id_alerta)
-        if not alerta_info:
+        # Busca informações do alerta e todo o contexto numa única consulta
+        if contexto is None:
+            with metricas.medir("etapa_segundos", etapa="carregar_contexto"):
+                contexto = self.carregar_contexto_alertas([id_alerta]).get(id_alerta)
+        if not contexto:
             print("❌ Alerta não encontrado!")
             return None
         
-        # Busca contexto adicional
-        atuadores = self.get_atuadores_estufa(alerta_info['id_estufa'])
-        cultura_info = self.get_cultura_info(alerta_info['id_estufa'])
-        historico_medicoes = self.get_historico_medicoes(
-            alerta_info['id_sensor'], 
-            alerta_info['id_estufa'], 
-            alerta_info['tipo_sensor']
-        )
+        alerta_info = contexto['alerta_info']
         
         print("🧠 Consultando IA Gemini para gerar tarefa corretiva...")
-        descricao_tarefa = self.generate_task_with_ai(alerta_info, atuadores, cultura_info, historico_medicoes)
+        with metricas.medir("etapa_segundos", etapa="gerar_tarefa"):
+            descricao_tarefa = self.generate_task_with_ai(
+                alerta_info,
+                contexto['atuadores'],
+                contexto['cultura_info'],
+                contexto['historico_medicoes']
+            )
         
         print(f"📝 Tarefa gerada: {descricao_tarefa}")
         
-        id_tarefa = self.create_task_in_database(
-            descricao_tarefa, 
-            alerta_info['id_estufa'], 
-            alerta_info['severidade']
-        )
+        with metricas.medir("etapa_segundos", etapa="criar_tarefa"):
+            id_tarefa = self.create_task_in_database(
+                descricao_tarefa, 
+                alerta_info['id_estufa'], 
+                alerta_info['severidade']
+            )
         
         if id_tarefa:
             print(f"✅ Tarefa #{id_tarefa} criada com sucesso!")
@@ -437,6 +1516,31 @@ RETORNE APENAS A DESCRIÇÃO DA TAREFA, SEM INTRODUÇÕES.
         
         return id_tarefa
     
+    def processar_alertas_com_ia(self, ids_alerta, processados=None):
+        """
+        Processa vários alertas com o contexto de todos carregado numa única consulta.
+        Um alerta com erro é registrado e pulado sem perder os demais; erros de conexão sobem
+        para quem chamou. `processados` (lista opcional) recebe cada alerta já tratado, para
+        quem precisar retomar o lote depois de reconectar.
+        """
+        with metricas.medir("etapa_segundos", etapa="carregar_contexto_lote"):
+            contextos = self.carregar_contexto_alertas(ids_alerta)
+        ids_tarefa = []
+        for id_alerta in ids_alerta:
+            try:
+                id_tarefa = self.processar_alerta_com_ia(id_alerta, contextos.get(id_alerta))
+            except (OperationalError, InterfaceError):
+                raise
+            except Exception as e:
+                print(f"❌ Erro ao processar alerta #{id_alerta}: {e}")
+                self.connection.rollback()
+                id_tarefa = None
+            if processados is not None:
+                processados.append(id_alerta)
+            if id_tarefa:
+                ids_tarefa.append(id_tarefa)
+        return ids_tarefa
+    
     def process_medicao_automatico(self, id_medicao):
         """
         PROCESSO COMPLETO AUTOMATIZADO:
@@ -446,46 +1550,197 @@ RETORNE APENAS A DESCRIÇÃO DA TAREFA, SEM INTRODUÇÕES.
         print(f"\n🔍 Analisando medição ID: {id_medicao}...")
         
         # ETAPA 1: Sistema tradicional cria alerta
-        id_alerta = self.verificar_anomalia_e_criar_alerta(id_medicao)
+        with metricas.medir("etapa_segundos", etapa="verificar_anomalia"):
+            id_alerta = self.verificar_anomalia_e_criar_alerta(id_medicao)
         
         if not id_alerta:
-            print("✅ Medição dentro do padrão esperado (baseado na mediana).")
+            print("✅ Nenhum alerta novo (medição dentro do padrão ou alerta já aberto).")
+            return None
+        
+        # ETAPA 2 em segundo plano: o alerta já está gravado, a ingestão segue
+        if self.processador:
+            self.processador.enviar(id_alerta)
             return None
         
         # ETAPA 2: IA processa o alerta e cria tarefa
         id_tarefa = self.processar_alerta_com_ia(id_alerta)
         
         return id_tarefa
+    
+    def process_medicoes_em_lote(self, ids_medicao):
+        """
+        PROCESSO EM LOTE: mesmo fluxo de process_medicao_automatico,
+        mas recebe várias medições de uma vez.
+        Retorna a lista de IDs das tarefas criadas.
+        """
+        if not ids_medicao:
+            return []
+        
+        print(f"\n🔍 Analisando lote de {len(ids_medicao)} medições...")
+        
+        # ETAPA 1: Sistema tradicional cria os alertas
+        ids_alerta = self.verificar_anomalias_em_lote(ids_medicao)
+        
+        if not ids_alerta:
+            print("✅ Nenhum alerta novo no lote.")
+            return []
+        
+        # ETAPA 2 em segundo plano: os alertas já estão gravados, a ingestão segue
+        if self.processador:
+            for id_alerta in ids_alerta:
+                self.processador.enviar(id_alerta)
+            return []
+        
+        # ETAPA 2: IA processa os alertas e cria tarefas
+        return self.processar_alertas_com_ia(ids_alerta)
+
+
+class ProcessadorAlertas:
+    """
+    Processa alertas (IA → TAREFA) em segundo plano com um pool limitado de threads.
+    Cada thread pega a própria conexão com `conectar()` (por padrão, do pool em db.py)
+    e usa o próprio monitor, então uma resposta lenta do Gemini não trava a ingestão.
+    """
+    def __init__(self, conectar=None, workers=4, timeout_ia=30, tentativas_ia=3,
+                 backoff_ia=1.0, tamanho_fila=1000, cache_ia=None, devolver=None, lote_contexto=20,
+                 tentativas_conexao=3, backoff_conexao=1.0, backoff_conexao_max=30.0):
+        if conectar is None:
+            conectar, devolver = db.conectar, db.devolver
+        self.conectar = conectar
+        self.devolver = devolver or (lambda connection: connection.close())
+        self.cache_ia = cache_ia
+        self.timeout_ia = timeout_ia
+        self.tentativas_ia = tentativas_ia
+        self.backoff_ia = backoff_ia
+        self.lote_contexto = lote_contexto
+        self.tentativas_conexao = tentativas_conexao
+        self.backoff_conexao = backoff_conexao
+        self.backoff_conexao_max = backoff_conexao_max
+        self.fila = queue.Queue(maxsize=tamanho_fila)
+        self.threads = []
+        metricas.medidor("fila_tamanho", self.fila.qsize, fila="alertas")
+        
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"alertas-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+    
+    def enviar(self, id_alerta):
+        """Coloca o alerta na fila (bloqueia se a fila estiver cheia)"""
+        self.fila.put(id_alerta)
+    
+    def pendentes(self):
+        return self.fila.qsize()
+    
+    def aguardar(self):
+        """Bloqueia até todos os alertas enfileirados serem processados"""
+        self.fila.join()
+    
+    def encerrar(self):
+        """Processa o que já está na fila e encerra as threads"""
+        for _ in self.threads:
+            self.fila.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+    
+    def _conectar_com_backoff(self):
+        """Pede uma conexão até conseguir, esperando cada vez mais entre as tentativas"""
+        espera = self.backoff_conexao
+        while True:
+            try:
+                return self.conectar()
+            except Exception as e:
+                print(f"❌ Falha ao conectar ({e}); nova tentativa em {espera:g}s")
+                time.sleep(espera)
+                espera = min(espera * 2, self.backoff_conexao_max)
+    
+    def _descartar(self, connection):
+        try:
+            self.devolver(connection)
+        except Exception as e:
+            print(f"⚠ Erro ao devolver conexão: {e}")
+    
+    def _worker(self):
+        connection = self._conectar_com_backoff()
+        monitor = AIGreenhouseMonitor(
+            connection,
+            timeout_ia=self.timeout_ia,
+            tentativas_ia=self.tentativas_ia,
+            backoff_ia=self.backoff_ia,
+            cache_ia=self.cache_ia
+        )
+        
+        parar = False
+        while not parar:
+            lote = [self.fila.get()]
+            while len(lote) < self.lote_contexto and lote[-1] is not None:
+                try:
+                    lote.append(self.fila.get_nowait())
+                except queue.Empty:
+                    break
+            pendentes = [id_alerta for id_alerta in lote if id_alerta is not None]
+            parar = len(pendentes) < len(lote)
+            try:
+                for tentativa in range(1, self.tentativas_conexao + 1):
+                    if not pendentes:
+                        break
+                    processados = []
+                    try:
+                        monitor.processar_alertas_com_ia(pendentes, processados)
+                        break
+                    except (OperationalError, InterfaceError) as e:
+                        # Conexão caiu: troca por outra e tenta de novo só o que faltou
+                        print(f"❌ Conexão perdida ao processar alertas {pendentes} "
+                              f"(tentativa {tentativa}/{self.tentativas_conexao}): {e}")
+                        pendentes = [id_alerta for id_alerta in pendentes if id_alerta not in processados]
+                        self._descartar(connection)
+                        connection = monitor.connection = self._conectar_com_backoff()
+                    except Exception as e:
+                        print(f"❌ Erro ao processar alertas {pendentes}: {e}")
+                        try:
+                            connection.rollback()
+                        except Exception as erro:
+                            print(f"❌ Rollback falhou, trocando a conexão: {erro}")
+                            self._descartar(connection)
+                            connection = monitor.connection = self._conectar_com_backoff()
+                        break
+                else:
+                    if pendentes:
+                        print(f"❌ Alertas {pendentes} descartados após {self.tentativas_conexao} tentativas")
+            finally:
+                for _ in lote:
+                    self.fila.task_done()
+        
+        self._descartar(connection)
 
 
 # Função para ser chamada do sistema principal
-def inserir_medicao_com_analise_ia(connect, id_sensor, valor_medido):
+def inserir_medicao_com_analise_ia(connect, id_sensor, valor_medido, processador=None, monitor=None):
     """
     Insere medição e faz análise automática:
     1. Sistema detecta anomalia → cria ALERTA
     2. IA processa alerta → cria TAREFA
     
+    Um monitor já existente pode ser reaproveitado entre chamadas (mantém as janelas em memória).
+    
     ESTA É A FUNÇÃO PRINCIPAL PARA CHAMAR DO MENU
     """
     cursor = connect.cursor()
     
     try:
         # Insere a medição
-        query = """
-        INSERT INTO medicao (data_hora_registro, valor_medido, id_sensor)
-        VALUES (NOW(), %s, %s)
-        RETURNING id_medicao
-        """
-        
-        cursor.execute(query, (valor_medido, id_sensor))
-        id_medicao = cursor.fetchone()[0]
-        connect.commit()
+        with metricas.medir("etapa_segundos", etapa="inserir_medicao"):
+            db.comandos.executar(cursor, "inserir_medicao", (valor_medido, id_sensor))
+            id_medicao = cursor.fetchone()[0]
+            connect.commit()
         cursor.close()
         
         print(f"✅ Medição #{id_medicao} inserida no banco de dados")
         
         # Processa automaticamente: ALERTA → IA → TAREFA
-        monitor = AIGreenhouseMonitor(connect)
+        if monitor is None:
+            monitor = AIGreenhouseMonitor(connect, processador=processador)
         monitor.process_medicao_automatico(id_medicao)
         
         return id_medicao
@@ -494,4 +1749,112 @@ def inserir_medicao_com_analise_ia(connect, id_sensor, valor_medido):
         print(f"❌ Erro ao inserir medição: {e}")
         connect.rollback()
         cursor.close()
-        return None
\ No newline at end of file
+        return None
+
+
+def inserir_medicoes_em_lote(connect, medicoes, tamanho_lote=1000, monitor=None, processador=None,
+                             rejeitadas=None, gravadas=None):
+    """
+    Insere várias medições de uma vez e faz a análise automática do lote.
+    
+    `medicoes` é um iterável de tuplas (id_sensor, valor_medido, data_hora);
+    se data_hora for None, usa NOW() do banco.
+    Cada lote é gravado com um único INSERT multi-linha e um único commit.
+    Se o banco recusar o lote por causa dos dados (ex.: id_sensor inexistente), o lote é
+    dividido ao meio, em savepoints, até isolar as medições recusadas; as demais são gravadas
+    e as recusadas vão para a lista `rejeitadas`, se houver. Erros de conexão sobem para
+    quem chamou: `gravadas` (lista opcional) recebe os IDs já confirmados no banco antes do
+    erro, para quem for tentar de novo não repetir o que já entrou.
+    
+    Com um ProcessadorAlertas, os alertas são tratados pela IA em segundo plano.
+    
+    Retorna a lista de IDs das medições inseridas, na ordem de entrada.
+    """
+    if monitor is None:
+        monitor = AIGreenhouseMonitor(connect, processador=processador)
+    
+    query = """
+    INSERT INTO medicao (data_hora_registro, valor_medido, id_sensor)
+    VALUES %s
+    RETURNING id_medicao
+    """
+    template = "(COALESCE(%s::timestamp, NOW()), %s, %s)"
+    
+    ids_medicao = []
+    lote = []
+    
+    def inserir(cursor, lote, dividido=False):
+        if dividido:
+            cursor.execute("SAVEPOINT lote_medicoes")
+        try:
+            valores = [(data_hora, valor, id_sensor) for id_sensor, valor, data_hora in lote]
+            rows = execute_values(cursor, query, valores, template=template,
+                                  page_size=len(valores), fetch=True)
+        except (DataError, IntegrityError) as e:
+            if dividido:
+                cursor.execute("ROLLBACK TO SAVEPOINT lote_medicoes")
+            else:
+                connect.rollback()
+            if len(lote) == 1:
+                print(f"⚠ Medição recusada {lote[0]}: {str(e).splitlines()[0]}")
+                if rejeitadas is not None:
+                    rejeitadas.append(lote[0])
+                return []
+            meio = len(lote) // 2
+            return inserir(cursor, lote[:meio], True) + inserir(cursor, lote[meio:], True)
+        if dividido:
+            cursor.execute("RELEASE SAVEPOINT lote_medicoes")
+        return rows
+    
+    def gravar_lote(lote):
+        cursor = connect.cursor()
+        try:
+            with metricas.medir("etapa_segundos", etapa="inserir_lote"):
+                rows = inserir(cursor, lote)
+                connect.commit()
+        except Exception:
+            if not connect.closed:
+                connect.rollback()
+            raise
+        finally:
+            cursor.close()
+        
+        ids = [row[0] for row in rows]
+        if gravadas is not None:
+            gravadas.extend(ids)
+        print(f"✅ {len(ids)} medições inseridas no banco de dados")
+        if not ids:
+            return ids
+        
+        # Processa automaticamente o lote: ALERTAS → IA → TAREFAS
+        monitor.process_medicoes_em_lote(ids)
+        return ids
+    
+    for medicao in medicoes:
+        lote.append(medicao)
+        if len(lote) >= tamanho_lote:
+            ids_medicao.extend(gravar_lote(lote))
+            lote = []
+    
+    if lote:
+        ids_medicao.extend(gravar_lote(lote))
+    
+    return ids_medicao
+
+
+def concluir_tarefa(connect, id_tarefa, balanceador=None):
+    """Marca a tarefa como concluída e desconta a carga do funcionário no balanceador"""
+    cursor = connect.cursor()
+    cursor.execute("""
+    UPDATE tarefa SET data_conclusao = NOW()
+    WHERE id_tarefa = %s AND data_conclusao IS NULL
+    RETURNING id_funcionario
+    """, (id_tarefa,))
+    result = cursor.fetchone()
+    connect.commit()
+    cursor.close()
+    
+    if not result:
+        return False
+    (balanceador or balanceador_tarefas).concluir(result[0])
+    return True
@@ -0,0 +1,391 @@
+# benchmark.py
+# Benchmark de ingestão, alertas e consultas, com o Gemini simulado localmente
+# Uso: python benchmark.py --recriar --estufas 50 --dias 2 --leituras 500
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import ai
+import db
+import detectores
+from gerador_carga import gerar_carga
+from planteligente import (consulta1, consulta2, consulta3, consulta_extra,
+                           create_all_tables, drop_all_tables)
+
+# Orçamento do tempo de importação (ms, interpretador novo) dos módulos do núcleo.
+# Importar esses módulos também não pode carregar nenhum dos módulos pesados.
+ORCAMENTO_IMPORTACAO_MS = {'db': 250, 'ai': 300, 'planteligente': 350}
+MODULOS_PESADOS = ('matplotlib', 'tabulate', 'google.generativeai', 'numpy')
+
+
+class RespostaFalsa:
+    def __init__(self, text):
+        self.text = text
+
+
+class ModeloFalso:
+    """Substitui o GenerativeModel do Gemini: resposta fixa após uma latência simulada"""
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.chamadas = 0
+
+    def generate_content(self, prompt, request_options=None):
+        self.chamadas += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        return RespostaFalsa("[Benchmark] Acionar ventilação e reavaliar em 30 minutos.")
+
+
+@contextlib.contextmanager
+def silencioso():
+    """Descarta os prints do monitor durante as medições"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def resumo(amostras):
+    """Estatísticas em milissegundos de uma lista de durações em segundos"""
+    if not amostras:
+        return {}
+    ordenadas = sorted(amostras)
+    return {
+        'n': len(ordenadas),
+        'media_ms': sum(ordenadas) / len(ordenadas) * 1000,
+        'p50_ms': ordenadas[len(ordenadas) // 2] * 1000,
+        'p95_ms': ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))] * 1000,
+        'max_ms': ordenadas[-1] * 1000,
+    }
+
+
+def contar(connect, tabela):
+    cursor = connect.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {tabela}")
+    total = cursor.fetchone()[0]
+    cursor.close()
+    return total
+
+
+def leituras_aleatorias(connect, quantidade, rnd):
+    """(id_sensor, valor) de sensores de temperatura/umidade, ~10% fora da faixa usual"""
+    cursor = connect.cursor()
+    cursor.execute("SELECT id_sensor, tipo_sensor FROM sensor WHERE tipo_sensor IN ('Temperatura', 'Umidade')")
+    sensores = cursor.fetchall()
+    cursor.close()
+
+    leituras = []
+    for _ in range(quantidade):
+        id_sensor, tipo_sensor = rnd.choice(sensores)
+        if tipo_sensor == 'Temperatura':
+            valor = rnd.gauss(22, 2) + (rnd.choice((-10, 10)) if rnd.random() < 0.1 else 0)
+        else:
+            valor = min(99.0, max(5.0, rnd.gauss(72, 4) + (rnd.choice((-25, 25)) if rnd.random() < 0.1 else 0)))
+        leituras.append((id_sensor, round(valor, 2)))
+    return leituras
+
+
+def bench_ingestao(connect, leituras, latencia_ia):
+    """Leituras/s e alertas/s pelo caminho do menu (inserir_medicao_com_analise_ia)"""
+    monitor = ai.AIGreenhouseMonitor(connect)
+    monitor.model = ModeloFalso(latencia_ia)
+    alertas_antes = contar(connect, 'alerta')
+    tarefas_antes = contar(connect, 'tarefa')
+
+    latencias = []
+    inicio = time.perf_counter()
+    with silencioso():
+        for id_sensor, valor in leituras:
+            t0 = time.perf_counter()
+            ai.inserir_medicao_com_analise_ia(connect, id_sensor, valor, monitor=monitor)
+            latencias.append(time.perf_counter() - t0)
+    duracao = time.perf_counter() - inicio
+
+    alertas = contar(connect, 'alerta') - alertas_antes
+    return {
+        'leituras': len(leituras),
+        'segundos': duracao,
+        'leituras_por_segundo': len(leituras) / duracao,
+        'alertas': alertas,
+        'alertas_por_segundo': alertas / duracao,
+        'tarefas': contar(connect, 'tarefa') - tarefas_antes,
+        'chamadas_ia': monitor.model.chamadas,
+        'latencia_leitura': resumo(latencias),
+    }
+
+
+def bench_ingestao_lote(connect, leituras, tamanho_lote, latencia_ia):
+    """Leituras/s e alertas/s pelo caminho em lote (inserir_medicoes_em_lote)"""
+    monitor = ai.AIGreenhouseMonitor(connect)
+    monitor.model = ModeloFalso(latencia_ia)
+    alertas_antes = contar(connect, 'alerta')
+
+    inicio = time.perf_counter()
+    with silencioso():
+        ai.inserir_medicoes_em_lote(connect, [(id_sensor, valor, None) for id_sensor, valor in leituras],
+                                    tamanho_lote=tamanho_lote, monitor=monitor)
+    duracao = time.perf_counter() - inicio
+
+    alertas = contar(connect, 'alerta') - alertas_antes
+    return {
+        'leituras': len(leituras),
+        'tamanho_lote': tamanho_lote,
+        'segundos': duracao,
+        'leituras_por_segundo': len(leituras) / duracao,
+        'alertas': alertas,
+        'alertas_por_segundo': alertas / duracao,
+        'chamadas_ia': monitor.model.chamadas,
+    }
+
+
+def bench_janelas_lote(connect, tamanho_lote, repeticoes):
+    """Latência da consulta de janelas do caminho em lote (janelas_lote) para as últimas medições"""
+    cursor = connect.cursor()
+    cursor.execute("SELECT id_medicao FROM medicao ORDER BY id_medicao DESC LIMIT %s", (tamanho_lote,))
+    ids_medicao = [r[0] for r in cursor.fetchall()]
+    latencias = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        db.comandos.executar(cursor, "janelas_lote", {'ids': ids_medicao, 'janela': 5})
+        cursor.fetchall()
+        latencias.append(time.perf_counter() - t0)
+    connect.rollback()
+    cursor.close()
+    return {'tamanho_lote': len(ids_medicao), **resumo(latencias)}
+
+
+def bench_consultas(connect, repeticoes):
+    """Latência de cada consulta dos relatórios"""
+    resultados = {}
+    for nome, consulta in (('consulta1', consulta1), ('consulta2', consulta2),
+                           ('consulta3', consulta3), ('consulta_extra', consulta_extra)):
+        latencias = []
+        with silencioso():
+            for _ in range(repeticoes):
+                t0 = time.perf_counter()
+                consulta(connect)
+                latencias.append(time.perf_counter() - t0)
+        resultados[nome] = resumo(latencias)
+    return resultados
+
+
+def bench_detectores(sensores, janela, repeticoes, rnd):
+    """Custo por leitura: mediana com statistics.median sensor a sensor x detectores vetorizados"""
+    series = [[rnd.gauss(22, 3) for _ in range(janela)] for _ in range(sensores)]
+    minimos = [18.0] * sensores
+    maximos = [26.0] * sensores
+
+    def laco():
+        anomalas = 0
+        for serie, minimo, maximo in zip(series, minimos, maximos):
+            valor = statistics.median(serie) if len(serie) >= 3 else serie[-1]
+            if valor < minimo or valor > maximo:
+                anomalas += 1
+        return anomalas
+
+    matriz = detectores.montar_matriz(series, janela)
+    limites_min = np.array(minimos)
+    limites_max = np.array(maximos)
+
+    def vetorizado():
+        niveis = detectores.nivel(matriz, "mediana", janela)
+        return int(np.count_nonzero(detectores.fora_da_faixa(niveis, limites_min, limites_max)))
+
+    if laco() != vetorizado():
+        raise RuntimeError("detectores divergem da mediana com statistics.median")
+
+    resultados = {'sensores': sensores, 'janela': janela}
+    for nome, funcao in (('statistics_median', laco), ('detectores', vetorizado)):
+        duracoes = []
+        for _ in range(repeticoes):
+            t0 = time.perf_counter()
+            funcao()
+            duracoes.append(time.perf_counter() - t0)
+        resultados[nome] = {'us_por_leitura': min(duracoes) / sensores * 1e6, **resumo(duracoes)}
+
+    t0 = time.perf_counter()
+    detectores.analisar(matriz, janela)
+    resultados['analisar_completo_us_por_leitura'] = (time.perf_counter() - t0) / sensores * 1e6
+    return resultados
+
+
+def bench_preparados(connect, leituras, repeticoes):
+    """
+    Comandos quentes do monitor com SQL normal x preparados (db.comandos): latência de cada
+    leitura isolada e, ponta a ponta, de cada medição pelo caminho do menu
+    """
+    cursor = connect.cursor()
+    cursor.execute("SELECT id_medicao FROM medicao ORDER BY id_medicao DESC LIMIT 200")
+    ids_medicao = [r[0] for r in cursor.fetchall()]
+    cursor.execute("SELECT DISTINCT tipo_sensor, id_estufa FROM sensor LIMIT 200")
+    pares = cursor.fetchall()
+    cursor.execute("SELECT id_alerta FROM alerta ORDER BY id_alerta DESC LIMIT 200")
+    ids_alerta = [r[0] for r in cursor.fetchall()]
+    connect.rollback()
+
+    casos = [
+        ('medicao_por_id', ids_medicao, lambda i: (i,)),
+        ('ultimas_medicoes', pares, lambda par: (par[0], par[1], 5)),
+        ('contexto_alertas', ids_alerta, lambda i: {'ids': [i], 'limite_historico': 5}),
+    ]
+    ativo = db.comandos.ativo
+    resultados = {'comandos': {}}
+    try:
+        for nome, amostras, parametros in casos:
+            if not amostras:
+                continue
+            resultados['comandos'][nome] = {}
+            for modo, preparar in (('sql', False), ('preparado', True)):
+                db.comandos.ativo = preparar
+                latencias = []
+                for i in range(repeticoes * 100):
+                    t0 = time.perf_counter()
+                    db.comandos.executar(cursor, nome, parametros(amostras[i % len(amostras)]))
+                    cursor.fetchall()
+                    latencias.append(time.perf_counter() - t0)
+                connect.rollback()
+                resultados['comandos'][nome][modo] = resumo(latencias)
+
+        for modo, preparar in (('sql', False), ('preparado', True)):
+            db.comandos.ativo = preparar
+            resultados[f'leitura_{modo}'] = bench_ingestao(connect, leituras, 0.0)['latencia_leitura']
+    finally:
+        db.comandos.ativo = ativo
+        cursor.close()
+    return resultados
+
+
+def medir_importacao(modulo, repeticoes=3):
+    """Melhor tempo (ms) de `import modulo` num interpretador novo e os módulos pesados que vieram junto"""
+    codigo = (
+        "import json, sys, time\n"
+        "inicio = time.perf_counter()\n"
+        f"import {modulo}\n"
+        "duracao = (time.perf_counter() - inicio) * 1000\n"
+        f"print(json.dumps([duracao, [m for m in {MODULOS_PESADOS!r} if m in sys.modules]]))\n"
+    )
+    melhor, pesados = None, []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True, check=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        duracao, pesados = json.loads(saida.strip().splitlines()[-1])
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, pesados
+
+
+def verificar_importacao():
+    """Confere cada módulo do núcleo contra ORCAMENTO_IMPORTACAO_MS"""
+    resultados = {}
+    for modulo, orcamento in ORCAMENTO_IMPORTACAO_MS.items():
+        duracao, pesados = medir_importacao(modulo)
+        resultados[modulo] = {
+            'ms': duracao,
+            'orcamento_ms': orcamento,
+            'pesados_carregados': pesados,
+            'ok': duracao <= orcamento and not pesados,
+        }
+    return resultados
+
+
+def versao_codigo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingestão e consultas do Planteligente")
+    parser.add_argument('--recriar', action='store_true', help="recria o schema e gera carga sintética antes")
+    parser.add_argument('--estufas', type=int, default=50)
+    parser.add_argument('--dias', type=int, default=2)
+    parser.add_argument('--intervalo', type=int, default=5, help="minutos entre medições geradas")
+    parser.add_argument('--leituras', type=int, default=500, help="leituras enviadas pelo caminho do menu")
+    parser.add_argument('--lote', type=int, default=1000, help="tamanho do lote na ingestão em lote")
+    parser.add_argument('--latencia-ia', type=float, default=0.0, help="latência simulada do Gemini (s)")
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--saida', default='benchmark_resultados.jsonl',
+                        help="arquivo JSON Lines; cada execução acrescenta uma linha")
+    parser.add_argument('--importacao', action='store_true',
+                        help="só confere o orçamento de tempo de importação (sai com erro se estourar)")
+    parser.add_argument('--sensores', type=int, default=10000, help="linhas no benchmark dos detectores")
+    parser.add_argument('--detectores', action='store_true',
+                        help="só roda o benchmark dos detectores (sem banco)")
+    args = parser.parse_args()
+
+    print("\n---BENCHMARK: IMPORTAÇÃO---")
+    importacao = verificar_importacao()
+    for modulo, estatisticas in importacao.items():
+        situacao = "OK" if estatisticas['ok'] else "ACIMA DO ORÇAMENTO"
+        print(f"{modulo}: {estatisticas['ms']:.1f} ms (orçamento {estatisticas['orcamento_ms']} ms) "
+              f"{estatisticas['pesados_carregados'] or ''} {situacao}")
+    if args.importacao:
+        sys.exit(0 if all(e['ok'] for e in importacao.values()) else 1)
+
+    print("\n---BENCHMARK: DETECTORES---")
+    detector = bench_detectores(args.sensores, 5, args.repeticoes, random.Random(args.seed))
+    for nome in ('statistics_median', 'detectores'):
+        print(f"{nome}: {detector[nome]['us_por_leitura']:.3f} µs/leitura")
+    if args.detectores:
+        return
+
+    connect = db.conectar()
+    try:
+        if args.recriar:
+            drop_all_tables(connect)
+            create_all_tables(connect)
+            gerar_carga(connect, estufas=args.estufas, dias=args.dias,
+                        intervalo_min=args.intervalo, seed=args.seed)
+
+        rnd = random.Random(args.seed)
+        resultado = {
+            'data_hora': datetime.now().isoformat(timespec='seconds'),
+            'commit': versao_codigo(),
+            'parametros': vars(args),
+            'importacao': importacao,
+            'detectores': detector,
+            'volume': {tabela: contar(connect, tabela) for tabela in ('estufa', 'sensor', 'medicao', 'alerta', 'consumo')},
+        }
+        print("\n---BENCHMARK: INGESTÃO---")
+        resultado['ingestao'] = bench_ingestao(connect, leituras_aleatorias(connect, args.leituras, rnd), args.latencia_ia)
+        print(f"{resultado['ingestao']['leituras_por_segundo']:.1f} leituras/s")
+
+        print("\n---BENCHMARK: INGESTÃO EM LOTE---")
+        resultado['ingestao_lote'] = bench_ingestao_lote(
+            connect, leituras_aleatorias(connect, args.leituras * 10, rnd), args.lote, args.latencia_ia)
+        print(f"{resultado['ingestao_lote']['leituras_por_segundo']:.1f} leituras/s")
+        resultado['janelas_lote'] = bench_janelas_lote(connect, args.lote, args.repeticoes)
+        print(f"janelas de {resultado['janelas_lote']['tamanho_lote']} medições: "
+              f"p50 {resultado['janelas_lote']['p50_ms']:.2f} ms")
+
+        print("\n---BENCHMARK: COMANDOS PREPARADOS---")
+        resultado['preparados'] = bench_preparados(connect, leituras_aleatorias(connect, args.leituras, rnd),
+                                                   args.repeticoes)
+        for nome, modos in resultado['preparados']['comandos'].items():
+            print(f"{nome}: p50 {modos['sql']['p50_ms'] * 1000:.0f} µs -> {modos['preparado']['p50_ms'] * 1000:.0f} µs")
+        print(f"por leitura: p50 {resultado['preparados']['leitura_sql']['p50_ms']:.2f} ms -> "
+              f"{resultado['preparados']['leitura_preparado']['p50_ms']:.2f} ms")
+
+        print("\n---BENCHMARK: CONSULTAS---")
+        resultado['consultas'] = bench_consultas(connect, args.repeticoes)
+        for nome, estatisticas in resultado['consultas'].items():
+            print(f"{nome}: p50 {estatisticas['p50_ms']:.2f} ms")
+
+        with open(args.saida, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+        print(f"\nResultados gravados em {args.saida}")
+    finally:
+        db.devolver(connect)
+        db.fechar_pool()
+
+
+if __name__ == "__main__":
+    main()
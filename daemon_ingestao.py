@@ -0,0 +1,284 @@
+# daemon_ingestao.py
+# Ingestão contínua de medições, sem menu, para o gateway dos sensores
+#
+# Protocolo de linha: "<id_sensor> <valor> [data_hora ISO]" (espaço ou vírgula),
+# uma medição por linha; linhas vazias ou iniciadas com # são ignoradas.
+#
+# Uso:
+#   gateway | python daemon_ingestao.py --stdin
+#   python daemon_ingestao.py --tcp 127.0.0.1:9100 --unix /tmp/planteligente.sock
+#   python daemon_ingestao.py --tcp 127.0.0.1:9100 --metricas-porta 9101   (GET /metrics)
+#   python daemon_ingestao.py --stdin --cache-ia cache_ia.sqlite   (ou CACHE_IA=1 / CACHE_IA_ARQUIVO)
+
+import argparse
+import os
+import queue
+import signal
+import socketserver
+import sys
+import threading
+import time
+from datetime import date, datetime
+from psycopg2 import InterfaceError, OperationalError
+import db
+from ai import AIGreenhouseMonitor, ProcessadorAlertas, cache_ia_pela_config, inserir_medicoes_em_lote
+from metricas import metricas, iniciar_pela_config
+from perfil_sql import perfilador
+from planteligente import create_partitions
+
+
+def interpretar_linha(linha):
+    """Converte uma linha do protocolo em (id_sensor, valor, data_hora) ou None se for vazia/comentário"""
+    linha = linha.strip()
+    if not linha or linha.startswith('#'):
+        return None
+    campos = linha.replace(',', ' ').split(None, 2)
+    if len(campos) < 2:
+        raise ValueError(f"linha incompleta: {linha!r}")
+    data_hora = datetime.fromisoformat(campos[2].strip()) if len(campos) == 3 else None
+    return int(campos[0]), float(campos[1]), data_hora
+
+
+class DaemonIngestao:
+    """
+    Recebe medições de várias fontes numa fila e grava em lotes com um único monitor
+    de longa duração: as janelas aquecidas na partida dão as medianas de cada lote sem
+    voltar ao banco. A IA roda em segundo plano no ProcessadorAlertas.
+    """
+    def __init__(self, tamanho_lote=500, intervalo_lote=1.0, workers_ia=4, tamanho_fila=100000):
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_lote = intervalo_lote
+        self.fila = queue.Queue(maxsize=tamanho_fila)
+        metricas.medidor("fila_tamanho", self.fila.qsize, fila="ingestao")
+        self.parar = threading.Event()
+        self.servidores = []
+        self.leitores = []
+        self.recebidas = 0
+        self.gravadas = 0
+        self.invalidas = 0
+        self.lock_contadores = threading.Lock()
+
+        self.connection = db.conectar()
+        cache_ia = cache_ia_pela_config()
+        if cache_ia is not None:
+            print(f"🗃️  Cache de tarefas da IA ativo ({cache_ia.max_itens} itens, TTL {cache_ia.ttl:.0f} s)")
+        self.processador = ProcessadorAlertas(workers=workers_ia, cache_ia=cache_ia)
+        self.monitor = AIGreenhouseMonitor(self.connection, aquecer_janelas=True, processador=self.processador)
+        print(f"🌡️  Monitor pronto com {len(self.monitor.janelas)} janelas de medições carregadas")
+        self.dia_particoes = None
+        self.garantir_particoes()
+
+    def garantir_particoes(self):
+        """Uma vez por dia cria as partições mensais que faltam, antes que as medições caiam na DEFAULT"""
+        if self.dia_particoes == date.today():
+            return
+        try:
+            create_partitions(self.connection, verboso=False)
+        except Exception as e:
+            print(f"⚠ Erro ao criar partições: {e}")
+            try:
+                self.connection.rollback()
+            except (OperationalError, InterfaceError):
+                pass  # conexão caída: gravar() troca por outra
+            return
+        self.dia_particoes = date.today()
+
+    # ----- Entrada -----
+    def receber(self, linha, origem):
+        try:
+            medicao = interpretar_linha(linha)
+        except ValueError as e:
+            with self.lock_contadores:
+                self.invalidas += 1
+            print(f"⚠ [{origem}] {e}", file=sys.stderr)
+            return
+        if medicao is not None:
+            self.fila.put(medicao)
+            with self.lock_contadores:
+                self.recebidas += 1
+
+    def ouvir_stdin(self, encerrar_no_fim=True):
+        def ler():
+            for linha in sys.stdin:
+                if self.parar.is_set():
+                    break
+                self.receber(linha, 'stdin')
+            if encerrar_no_fim:
+                self.parar.set()
+
+        thread = threading.Thread(target=ler, name="stdin", daemon=True)
+        thread.start()
+        self.leitores.append(thread)
+
+    def _handler(self):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                origem = str(self.client_address or 'unix')
+                for linha in self.rfile:
+                    if daemon.parar.is_set():
+                        break
+                    daemon.receber(linha.decode('utf-8', errors='replace'), origem)
+
+        return Handler
+
+    def ouvir_tcp(self, host, porta):
+        servidor = socketserver.ThreadingTCPServer((host, porta), self._handler())
+        servidor.daemon_threads = True
+        self._iniciar_servidor(servidor, f"tcp {host}:{porta}")
+
+    def ouvir_unix(self, caminho):
+        if os.path.exists(caminho):
+            os.unlink(caminho)
+        servidor = socketserver.ThreadingUnixStreamServer(caminho, self._handler())
+        servidor.daemon_threads = True
+        self._iniciar_servidor(servidor, f"unix {caminho}")
+
+    def _iniciar_servidor(self, servidor, descricao):
+        thread = threading.Thread(target=servidor.serve_forever, name=descricao, daemon=True)
+        thread.start()
+        self.servidores.append(servidor)
+        print(f"📡 Ouvindo em {descricao}")
+
+    # ----- Gravação -----
+    def reconectar(self):
+        """Troca a conexão caída por outra do pool, esperando cada vez mais enquanto o banco não volta"""
+        try:
+            db.devolver(self.connection)
+        except Exception as e:
+            print(f"⚠ Erro ao devolver conexão: {e}")
+        espera = 1.0
+        while True:
+            try:
+                self.connection = db.conectar()
+                break
+            except Exception as e:
+                print(f"❌ Falha ao reconectar ({e}); nova tentativa em {espera:g}s")
+                time.sleep(espera)
+                espera = min(espera * 2, 30.0)
+        self.monitor.connection = self.connection
+
+    def gravar(self, lote, tentativas=3):
+        """
+        Grava e analisa o lote. Se a conexão cair antes do commit, reconecta e tenta o lote de
+        novo; se cair depois, as medições já estão no banco e só a análise do lote se perde.
+        Medições recusadas pelo banco (ex.: sensor inexistente) contam como inválidas.
+        """
+        for tentativa in range(1, tentativas + 1):
+            rejeitadas, gravadas = [], []
+            try:
+                inserir_medicoes_em_lote(self.connection, lote, tamanho_lote=len(lote), monitor=self.monitor,
+                                         rejeitadas=rejeitadas, gravadas=gravadas)
+            except (OperationalError, InterfaceError) as e:
+                print(f"❌ Conexão perdida durante a ingestão (tentativa {tentativa}/{tentativas}): {e}")
+                self.reconectar()
+                if gravadas or tentativa == tentativas:
+                    break
+                continue
+            except Exception as e:
+                print(f"❌ Erro ao analisar lote de medições: {e}")
+                try:
+                    self.connection.rollback()
+                except (OperationalError, InterfaceError):
+                    self.reconectar()
+            break
+        if not gravadas and not rejeitadas:
+            print(f"❌ Lote de {len(lote)} medições não gravado")
+        with self.lock_contadores:
+            self.gravadas += len(gravadas)
+            self.invalidas += len(rejeitadas)
+
+    def executar(self):
+        """Laço principal: junta medições em lotes por tamanho ou por tempo até receber o sinal de parada"""
+        lote = []
+        prazo = time.monotonic() + self.intervalo_lote
+        while not (self.parar.is_set() and self.fila.empty()):
+            try:
+                lote.append(self.fila.get(timeout=max(0.0, prazo - time.monotonic())))
+            except queue.Empty:
+                pass
+            if len(lote) >= self.tamanho_lote or (lote and time.monotonic() >= prazo):
+                self.garantir_particoes()
+                self.gravar(lote)
+                lote = []
+            if time.monotonic() >= prazo:
+                prazo = time.monotonic() + self.intervalo_lote
+        if lote:
+            self.gravar(lote)
+
+    def encerrar(self):
+        """Para as fontes, grava o que sobrou na fila e espera a IA terminar os alertas pendentes"""
+        print("\n🛑 Encerrando ingestão...")
+        self.parar.set()
+        for servidor in self.servidores:
+            servidor.shutdown()
+            servidor.server_close()
+
+        # Medições que chegaram enquanto as fontes fechavam
+        resto = []
+        while True:
+            try:
+                resto.append(self.fila.get_nowait())
+            except queue.Empty:
+                break
+        if resto:
+            self.gravar(resto)
+
+        print(f"⏳ Aguardando {self.processador.pendentes()} alertas na fila da IA...")
+        self.processador.encerrar()
+        db.devolver(self.connection)
+        db.fechar_pool()
+        metricas.encerrar()
+        print(f"✅ Recebidas: {self.recebidas} | Gravadas: {self.gravadas} | Inválidas: {self.invalidas}")
+        if perfilador.ativo:
+            print(perfilador.relatorio())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daemon de ingestão de medições do Planteligente")
+    parser.add_argument('--stdin', action='store_true', help="lê medições da entrada padrão")
+    parser.add_argument('--tcp', metavar='HOST:PORTA', help="ouve numa porta TCP local")
+    parser.add_argument('--unix', metavar='CAMINHO', help="ouve num socket Unix")
+    parser.add_argument('--lote', type=int, default=500, help="medições por INSERT")
+    parser.add_argument('--intervalo', type=float, default=1.0, help="segundos máximos até gravar um lote")
+    parser.add_argument('--workers-ia', type=int, default=4)
+    parser.add_argument('--metricas-porta', type=int, help="expõe as métricas em HTTP nesta porta")
+    parser.add_argument('--cache-ia', metavar='ARQUIVO', nargs='?', const='',
+                        help="reaproveita descrições do Gemini (em memória; com ARQUIVO, também em SQLite)")
+    args = parser.parse_args()
+
+    if args.metricas_porta:
+        os.environ['METRICAS_PORTA'] = str(args.metricas_porta)
+    if args.cache_ia is not None:
+        os.environ['CACHE_IA'] = '1'
+        if args.cache_ia:
+            os.environ['CACHE_IA_ARQUIVO'] = args.cache_ia
+    iniciar_pela_config()
+
+    daemon = DaemonIngestao(tamanho_lote=args.lote, intervalo_lote=args.intervalo, workers_ia=args.workers_ia)
+
+    def sinal_parada(signum, frame):
+        daemon.parar.set()
+
+    signal.signal(signal.SIGINT, sinal_parada)
+    signal.signal(signal.SIGTERM, sinal_parada)
+
+    so_stdin = not (args.tcp or args.unix)
+    if args.stdin or so_stdin:
+        # Sem sockets, o fim da entrada padrão encerra o daemon
+        daemon.ouvir_stdin(encerrar_no_fim=so_stdin)
+    if args.tcp:
+        host, porta = args.tcp.rsplit(':', 1)
+        daemon.ouvir_tcp(host, int(porta))
+    if args.unix:
+        daemon.ouvir_unix(args.unix)
+
+    try:
+        daemon.executar()
+    finally:
+        daemon.encerrar()
+
+
+if __name__ == "__main__":
+    main()
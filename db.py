@@ -0,0 +1,217 @@
+# db.py
+# Pool de conexões com o PostgreSQL usado por planteligente.py e ai.py
+# pip install psycopg2-binary python-dotenv
+
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from psycopg2 import pool, extensions, InterfaceError, OperationalError
+from dotenv import load_dotenv
+import perfil_sql
+
+load_dotenv()
+
+
+class PoolConexoes:
+    """
+    Pool de conexões thread-safe com mínimo/máximo configuráveis.
+    Quem pede uma conexão com o pool cheio espera até alguma ser devolvida.
+    Conexões paradas há mais de `verificar_apos` segundos passam por um SELECT 1
+    antes de serem entregues; as quebradas são descartadas e reabertas.
+    """
+    def __init__(self, minconn=1, maxconn=10, verificar_apos=30, **params):
+        self.pool = pool.ThreadedConnectionPool(minconn, maxconn, **params)
+        self.vagas = threading.BoundedSemaphore(maxconn)
+        self.verificar_apos = verificar_apos
+        self.ultimo_uso = {}
+
+    def conexao_valida(self, conn):
+        if conn.closed:
+            return False
+        if time.time() - self.ultimo_uso.get(id(conn), 0) < self.verificar_apos:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except (OperationalError, InterfaceError):
+            return False
+
+    def getconn(self, timeout=None):
+        if not self.vagas.acquire(timeout=timeout):
+            raise pool.PoolError("Nenhuma conexão livre no pool")
+        try:
+            while True:
+                conn = self.pool.getconn()
+                if self.conexao_valida(conn):
+                    return conn
+                print("⚠ Conexão com o PostgreSQL perdida, reconectando...")
+                self.ultimo_uso.pop(id(conn), None)
+                comandos.esquecer(conn)
+                self.pool.putconn(conn, close=True)
+        except Exception:
+            self.vagas.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            if conn.closed:
+                self.ultimo_uso.pop(id(conn), None)
+                comandos.esquecer(conn)
+                self.pool.putconn(conn, close=True)
+                return
+            # Não devolve conexão com transação aberta ou abortada
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except (OperationalError, InterfaceError):
+                    self.ultimo_uso.pop(id(conn), None)
+                    comandos.esquecer(conn)
+                    self.pool.putconn(conn, close=True)
+                    return
+            self.ultimo_uso[id(conn)] = time.time()
+            self.pool.putconn(conn)
+        finally:
+            self.vagas.release()
+
+    @contextmanager
+    def conexao(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        self.pool.closeall()
+        self.ultimo_uso = {}
+        comandos.esquecer()
+
+
+class ComandosPreparados:
+    """
+    Registro de comandos SQL preparados no servidor (PREPARE) uma vez por conexão e
+    executados pelo nome (EXECUTE), sem novo parse/planejamento a cada chamada.
+    O SQL é registrado com os mesmos marcadores do psycopg2 (%s ou %(nome)s).
+    Cada conexão é identificada pelo PID do backend, então uma conexão reaberta pelo pool
+    (mesmo objeto reaproveitado ou não) prepara tudo de novo na primeira execução.
+    Com DB_PREPARAR=0 (ex.: PgBouncer em modo transação) executa o SQL normalmente.
+    """
+    MARCADOR = re.compile(r"%\((\w+)\)s|%s")
+
+    def __init__(self, ativo=True):
+        self.ativo = ativo
+        self.lock = threading.Lock()
+        self.comandos = {}
+        self.preparados = {}
+
+    def registrar(self, nome, sql, tipos=None):
+        """`tipos` opcional, ex.: ('bigint', 'numeric'); sem ele o servidor deduz pelo contexto"""
+        nomes = []
+
+        def trocar(marcador):
+            if marcador.group(1) is None:
+                nomes.append(None)
+                return f"${len(nomes)}"
+            if marcador.group(1) not in nomes:
+                nomes.append(marcador.group(1))
+            return f"${nomes.index(marcador.group(1)) + 1}"
+
+        preparado = self.MARCADOR.sub(trocar, sql).replace("%%", "%")
+        assinatura = f" ({', '.join(tipos)})" if tipos else ""
+        nomeados = nomes if nomes and nomes[0] is not None else None
+        self.comandos[nome] = (sql, f"PREPARE {nome}{assinatura} AS {preparado}", nomeados, len(nomes))
+        return nome
+
+    @staticmethod
+    def _chave(conn):
+        return id(conn), conn.get_backend_pid()
+
+    def executar(self, cursor, nome, parametros=()):
+        """cursor.execute do comando `nome`; o resultado fica no cursor, como no execute"""
+        sql, prepare, nomeados, quantidade = self.comandos[nome]
+        if not self.ativo:
+            return cursor.execute(sql, parametros)
+
+        chave = self._chave(cursor.connection)
+        with self.lock:
+            feitos = self.preparados.get(chave)
+            if feitos is None:
+                # Backend novo para este objeto de conexão: o que foi preparado antes se perdeu
+                for antiga in [c for c in self.preparados if c[0] == chave[0]]:
+                    del self.preparados[antiga]
+                feitos = self.preparados[chave] = set()
+            preparar = nome not in feitos
+        if preparar:
+            cursor.execute(prepare)
+            with self.lock:
+                feitos.add(nome)
+
+        valores = [parametros[n] for n in nomeados] if nomeados else list(parametros)
+        try:
+            if quantidade:
+                cursor.execute(f"EXECUTE {nome} ({', '.join(['%s'] * quantidade)})", valores)
+            else:
+                cursor.execute(f"EXECUTE {nome}")
+        except Exception as e:
+            # Sessão reiniciada por fora (DISCARD ALL, proxy): prepara de novo na próxima vez
+            if getattr(e, 'pgcode', None) == '26000':
+                self.esquecer(cursor.connection)
+            raise
+
+    def esquecer(self, conn=None):
+        """Descarta o que foi preparado numa conexão (fechada ou trocada), ou em todas"""
+        with self.lock:
+            if conn is None:
+                self.preparados = {}
+            else:
+                for chave in [c for c in self.preparados if c[0] == id(conn)]:
+                    del self.preparados[chave]
+
+
+# Registro do processo; os comandos são registrados pelos módulos que os usam (ai.py)
+comandos = ComandosPreparados(ativo=os.getenv('DB_PREPARAR', '1') == '1')
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool padrão do processo, configurado pelas variáveis do .env (PERFIL_SQL=1 instrumenta as conexões)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolConexoes(
+                minconn=int(os.getenv('DB_POOL_MIN', '1')),
+                maxconn=int(os.getenv('DB_POOL_MAX', '10')),
+                host=os.getenv('DB_HOST', 'localhost'),
+                port=os.getenv('DB_PORT', '5432'),
+                database=os.getenv('DB_NAME', 'planteligente'),
+                user=os.getenv('DB_USER', 'postgres'),
+                password=os.getenv('DB_PASSWORD', 'postgres'),
+                connection_factory=perfil_sql.fabrica_conexao()
+            )
+        return _pool
+
+
+def conectar():
+    """Pega uma conexão do pool padrão"""
+    return get_pool().getconn()
+
+
+def devolver(conn):
+    """Devolve ao pool padrão uma conexão obtida com conectar()"""
+    get_pool().putconn(conn)
+
+
+def fechar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
@@ -0,0 +1,164 @@
+# detectores.py
+# Estatísticas de anomalia vetorizadas sobre matrizes de leituras por sensor
+# pip install numpy
+#
+# Cada linha da matriz é um sensor (ou par estufa/tipo) e as colunas são as leituras,
+# da mais antiga para a mais recente, alinhadas à direita e completadas com NaN.
+# Todas as funções calculam o resultado de milhares de linhas numa única chamada.
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Constante que torna o MAD comparável ao desvio padrão numa distribuição normal
+ESCALA_MAD = 1.4826
+
+
+def montar_matriz(series, tamanho=None):
+    """Lista de sequências (antiga → recente) em matriz n × tamanho, alinhada à direita, NaN nas faltas"""
+    if tamanho is None:
+        tamanho = max((len(s) for s in series), default=0)
+    matriz = np.full((len(series), tamanho), np.nan)
+    for i, serie in enumerate(series):
+        serie = serie[-tamanho:] if tamanho else ()
+        if len(serie):
+            matriz[i, tamanho - len(serie):] = serie
+    return matriz
+
+
+def contagem(matriz, janela=None):
+    """Leituras válidas nas últimas `janela` colunas de cada linha"""
+    if janela is not None:
+        matriz = matriz[:, -janela:]
+    return np.count_nonzero(~np.isnan(matriz), axis=1)
+
+
+def ultimo(matriz):
+    """Leitura mais recente de cada linha (NaN se a linha estiver vazia)"""
+    validos = ~np.isnan(matriz)
+    # Índice da última coluna válida; linhas vazias apontam para a última coluna (NaN)
+    posicao = matriz.shape[1] - 1 - np.argmax(validos[:, ::-1], axis=1)
+    return matriz[np.arange(matriz.shape[0]), posicao]
+
+
+def _mediana_linhas(matriz):
+    # Ordena cada linha (NaN vai para o fim) e tira os elementos do meio das n válidas;
+    # bem mais rápido que np.nanmedian para janelas curtas
+    ordenada = np.sort(matriz, axis=-1)
+    n = np.count_nonzero(~np.isnan(matriz), axis=-1)
+    baixo = np.take_along_axis(ordenada, np.maximum((n - 1) // 2, 0)[..., None], axis=-1)[..., 0]
+    alto = np.take_along_axis(ordenada, (n // 2)[..., None] - (n == 0)[..., None], axis=-1)[..., 0]
+    return np.where(n > 0, (baixo + alto) / 2, np.nan)
+
+
+def mediana(matriz, janela=5):
+    """Mediana das últimas `janela` leituras de cada linha"""
+    return _mediana_linhas(matriz[:, -janela:])
+
+
+def mediana_movel(matriz, janela=5):
+    """Mediana móvel de cada linha: mesma forma da matriz, posição j = mediana das colunas j-janela+1..j"""
+    preenchida = np.pad(matriz, ((0, 0), (janela - 1, 0)), constant_values=np.nan)
+    return _mediana_linhas(sliding_window_view(preenchida, janela, axis=1))
+
+
+def mad(matriz, janela=5):
+    """Desvio absoluto mediano (escalado) das últimas `janela` leituras"""
+    recorte = matriz[:, -janela:]
+    centro = _mediana_linhas(recorte)
+    return ESCALA_MAD * _mediana_linhas(np.abs(recorte - centro[:, None]))
+
+
+def escore_z_robusto(matriz, janela=5):
+    """
+    (leitura mais recente - mediana) / MAD de cada linha.
+    Com MAD zero (janela constante) o escore é 0 se a leitura for igual à mediana e ±inf se não for.
+    """
+    centro = mediana(matriz, janela)
+    dispersao = mad(matriz, janela)
+    desvio = ultimo(matriz) - centro
+    with np.errstate(divide='ignore', invalid='ignore'):
+        escore = desvio / dispersao
+    return np.where(desvio == 0, 0.0, escore)
+
+
+def ewma(matriz, alfa=0.3):
+    """Média móvel exponencial até a leitura mais recente; NaN mantém o valor anterior"""
+    atual = np.full(matriz.shape[0], np.nan)
+    for coluna in matriz.T:
+        validos = ~np.isnan(coluna)
+        inicio = validos & np.isnan(atual)
+        atual = np.where(inicio, coluna, atual)
+        seguir = validos & ~inicio
+        atual = np.where(seguir, alfa * coluna + (1 - alfa) * atual, atual)
+    return atual
+
+
+def tendencia(matriz, janela=None):
+    """Inclinação (unidades por leitura) da reta de mínimos quadrados de cada linha; NaN com menos de 2 leituras"""
+    if janela is not None:
+        matriz = matriz[:, -janela:]
+    validos = ~np.isnan(matriz)
+    x = np.broadcast_to(np.arange(matriz.shape[1], dtype=float), matriz.shape)
+    y = np.where(validos, matriz, 0.0)
+    n = validos.sum(axis=1)
+    soma_x = np.where(validos, x, 0.0).sum(axis=1)
+    soma_y = y.sum(axis=1)
+    soma_xx = np.where(validos, x * x, 0.0).sum(axis=1)
+    soma_xy = (np.where(validos, x, 0.0) * y).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inclinacao = (n * soma_xy - soma_x * soma_y) / (n * soma_xx - soma_x * soma_x)
+    return np.where(n >= 2, inclinacao, np.nan)
+
+
+# Estimadores de nível: o valor que o monitor compara com a faixa ideal da cultura.
+# Outros podem ser registrados com @estimador("nome").
+ESTIMADORES = {}
+
+
+def estimador(nome):
+    def registrar(funcao):
+        ESTIMADORES[nome] = funcao
+        return funcao
+    return registrar
+
+
+@estimador("mediana")
+def _nivel_mediana(matriz, janela):
+    return mediana(matriz, janela)
+
+
+@estimador("ewma")
+def _nivel_ewma(matriz, janela):
+    return ewma(matriz[:, -janela:])
+
+
+def nivel(matriz, nome="mediana", janela=5, minimo=3):
+    """
+    Valor para análise de cada linha pelo estimador `nome`. Linhas com menos de `minimo`
+    leituras na janela usam a leitura mais recente, como no monitor original.
+    """
+    estimado = ESTIMADORES[nome](matriz, janela)
+    return np.where(contagem(matriz, janela) >= minimo, estimado, ultimo(matriz))
+
+
+def analisar(matriz, janela=5):
+    """Todas as estatísticas de uma vez, para relatórios e contexto da IA"""
+    return {
+        'ultimo': ultimo(matriz),
+        'contagem': contagem(matriz, janela),
+        'mediana': mediana(matriz, janela),
+        'mad': mad(matriz, janela),
+        'z_robusto': escore_z_robusto(matriz, janela),
+        'ewma': ewma(matriz[:, -janela:]),
+        'tendencia': tendencia(matriz, janela),
+    }
+
+
+def fora_da_faixa(valores, minimos, maximos):
+    """
+    Diferença até a faixa ideal de cada linha: negativa abaixo do mínimo, positiva acima
+    do máximo, 0 dentro da faixa. Faixa ausente (NaN) nunca é anomalia.
+    """
+    abaixo = np.where(valores < minimos, valores - minimos, 0.0)
+    acima = np.where(valores > maximos, valores - maximos, 0.0)
+    return np.nan_to_num(abaixo + acima)
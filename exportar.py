@@ -0,0 +1,322 @@
+# exportar.py
+# Exporta medicao/consumo (com os dados do sensor/atuador e da estufa) para arquivos
+# colunares particionados por dia e estufa, lendo do PostgreSQL com COPY
+# pip install pyarrow
+#
+# Uso: python exportar.py --destino dados/ --formato parquet
+#      (rodadas seguintes exportam só o que entrou depois da última marca d'água; a marca só
+#      avança até onde não há transação de escrita aberta que ainda possa gravar ids menores)
+#
+# Layout (partições no estilo Hive, lidas direto por pyarrow.dataset, pandas, DuckDB, Spark):
+#   dados/medicao/dia=2025-11-15/id_estufa=3/parte-000000000120-0.parquet
+#   dados/_marca_dagua.json
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import db
+
+PARTICAO_NULA = "__HIVE_DEFAULT_PARTITION__"
+
+# Para cada tabela: chave da marca d'água, consulta (com a coluna `dia` e `id_estufa`)
+# e o tipo Arrow de cada coluna, na ordem do SELECT
+EXPORTACOES = {
+    'medicao': (
+        'id_medicao',
+        """SELECT m.id_medicao, m.data_hora_registro, m.valor_medido::float8,
+                  m.id_sensor, s.tipo_sensor, s.unidade_medida, e.nome AS nome_estufa,
+                  m.data_hora_registro::date AS dia, s.id_estufa
+           FROM medicao m
+           JOIN sensor s ON m.id_sensor = s.id_sensor
+           JOIN estufa e ON s.id_estufa = e.id_estufa
+           WHERE m.id_medicao > {inicio} AND m.id_medicao <= {fim}
+           ORDER BY m.id_medicao""",
+        (
+            ('id_medicao', pa.int64()),
+            ('data_hora_registro', pa.timestamp('us')),
+            ('valor_medido', pa.float64()),
+            ('id_sensor', pa.int64()),
+            ('tipo_sensor', pa.string()),
+            ('unidade_medida', pa.string()),
+            ('nome_estufa', pa.string()),
+            ('dia', pa.date32()),
+            ('id_estufa', pa.int64()),
+        )),
+    'consumo': (
+        'id_consumo',
+        """SELECT c.id_consumo, c.data_hora_consumo, c.quantidade_consumida::float8,
+                  c.id_atuador, a.tipo_atuador, c.id_recurso, r.nome_recurso, r.tipo_consumo,
+                  e.nome AS nome_estufa, c.data_hora_consumo::date AS dia, a.id_estufa
+           FROM consumo c
+           JOIN atuador a ON c.id_atuador = a.id_atuador
+           JOIN recurso r ON c.id_recurso = r.id_recurso
+           JOIN estufa e ON a.id_estufa = e.id_estufa
+           WHERE c.id_consumo > {inicio} AND c.id_consumo <= {fim}
+           ORDER BY c.id_consumo""",
+        (
+            ('id_consumo', pa.int64()),
+            ('data_hora_consumo', pa.timestamp('us')),
+            ('quantidade_consumida', pa.float64()),
+            ('id_atuador', pa.int64()),
+            ('tipo_atuador', pa.string()),
+            ('id_recurso', pa.int64()),
+            ('nome_recurso', pa.string()),
+            ('tipo_consumo', pa.string()),
+            ('nome_estufa', pa.string()),
+            ('dia', pa.date32()),
+            ('id_estufa', pa.int64()),
+        )),
+}
+
+
+def ler_marca_dagua(destino):
+    caminho = os.path.join(destino, "_marca_dagua.json")
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def gravar_marca_dagua(destino, marcas):
+    """Grava num arquivo temporário e renomeia, para nunca deixar uma marca pela metade"""
+    caminho = os.path.join(destino, "_marca_dagua.json")
+    with open(caminho + ".tmp", 'w', encoding='utf-8') as arquivo:
+        json.dump(marcas, arquivo, indent=2)
+    os.replace(caminho + ".tmp", caminho)
+
+
+def marca_segura(connect, nome, espera=30.0):
+    """
+    Maior id de `nome` que pode virar marca d'água sem pular linhas. O id sai da sequência antes
+    do commit, então o MAX(id) visível agora pode estar acima do id de uma transação ainda aberta,
+    que apareceria depois abaixo da marca e nunca seria exportada. Lê o MAX(id), tira um snapshot
+    e espera as transações em andamento nele terminarem (o xmin atual alcançar o xmax do snapshot).
+    Retorna None se alguma continuar aberta depois de `espera` segundos.
+    """
+    chave = EXPORTACOES[nome][0]
+    cursor = connect.cursor()
+    try:
+        cursor.execute(f"SELECT COALESCE(MAX({chave}), 0) FROM {nome}")
+        fim = cursor.fetchone()[0]
+        cursor.execute("SELECT pg_snapshot_xmax(pg_current_snapshot())")
+        xmax = cursor.fetchone()[0]
+        connect.commit()
+        prazo = time.monotonic() + espera
+        while True:
+            cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot()) >= %s::xid8", (xmax,))
+            concluidas = cursor.fetchone()[0]
+            connect.commit()
+            if concluidas:
+                return fim
+            if time.monotonic() >= prazo:
+                return None
+            time.sleep(0.1)
+    finally:
+        cursor.close()
+
+
+def _copy_em_fluxo(connect, query, colunas, tamanho_bloco):
+    """
+    COPY ... TO STDOUT escrito num pipe por uma thread e lido como CSV pelo Arrow em lotes
+    (RecordBatch) de ~`tamanho_bloco` bytes: a memória não cresce com o tamanho da tabela.
+    """
+    leitura, escrita = os.pipe()
+    erros = []
+
+    def copiar():
+        cursor = connect.cursor()
+        try:
+            with os.fdopen(escrita, 'wb') as saida:
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", saida)
+        except Exception as e:
+            erros.append(e)
+        finally:
+            cursor.close()
+
+    thread = threading.Thread(target=copiar, name="copy", daemon=True)
+    thread.start()
+    with os.fdopen(leitura, 'rb') as entrada:
+        leitor = pacsv.open_csv(
+            entrada,
+            read_options=pacsv.ReadOptions(column_names=[nome for nome, _ in colunas], block_size=tamanho_bloco),
+            convert_options=pacsv.ConvertOptions(column_types=dict(colunas), strings_can_be_null=True),
+        )
+        try:
+            for lote in leitor:
+                yield lote
+        finally:
+            # Se o consumidor parar antes do fim, esvazia o pipe para a thread do COPY terminar
+            while entrada.read(1 << 16):
+                pass
+            thread.join()
+    if erros:
+        raise erros[0]
+
+
+class GravadorParticionado:
+    """
+    Mantém um arquivo aberto por partição (dia, id_estufa), até `max_abertos` ao mesmo tempo.
+    A partição fechada por excesso ganha um novo arquivo (parte seguinte) se voltar a aparecer.
+    """
+    def __init__(self, diretorio, esquema, prefixo, formato="parquet", max_abertos=64):
+        self.diretorio = diretorio
+        self.esquema = esquema
+        self.prefixo = prefixo
+        self.formato = formato
+        self.max_abertos = max_abertos
+        self.abertos = OrderedDict()
+        self.partes = {}
+        self.arquivos = []
+        self.linhas = 0
+
+    def _abrir(self, dia, id_estufa):
+        pasta = os.path.join(self.diretorio,
+                             f"dia={dia if dia is not None else PARTICAO_NULA}",
+                             f"id_estufa={id_estufa if id_estufa is not None else PARTICAO_NULA}")
+        os.makedirs(pasta, exist_ok=True)
+        parte = self.partes.get((dia, id_estufa), 0)
+        self.partes[(dia, id_estufa)] = parte + 1
+        extensao = "parquet" if self.formato == "parquet" else "arrow"
+        caminho = os.path.join(pasta, f"{self.prefixo}-{parte}.{extensao}")
+        if self.formato == "parquet":
+            gravador = pq.ParquetWriter(caminho, self.esquema, compression="zstd")
+        else:
+            gravador = ipc.new_file(caminho, self.esquema)
+        self.arquivos.append(caminho)
+        return gravador
+
+    def escrever(self, dia, id_estufa, tabela):
+        chave = (dia, id_estufa)
+        gravador = self.abertos.pop(chave, None)
+        if gravador is None:
+            gravador = self._abrir(dia, id_estufa)
+            while len(self.abertos) >= self.max_abertos:
+                self.abertos.popitem(last=False)[1].close()
+        self.abertos[chave] = gravador
+        gravador.write_table(tabela)
+        self.linhas += tabela.num_rows
+
+    def fechar(self):
+        while self.abertos:
+            self.abertos.popitem(last=False)[1].close()
+
+
+def exportar_tabela(connect, nome, destino, inicio, fim, formato="parquet",
+                    tamanho_bloco=8 << 20, max_abertos=64, pasta=None):
+    """
+    Exporta as linhas de `nome` com chave em (inicio, fim] para `pasta` (por padrão destino/nome);
+    retorna (linhas, arquivos)
+    """
+    chave, query, colunas = EXPORTACOES[nome]
+    esquema = pa.schema([(coluna, tipo) for coluna, tipo in colunas if coluna not in ('dia', 'id_estufa')])
+    gravador = GravadorParticionado(pasta or os.path.join(destino, nome), esquema,
+                                    prefixo=f"parte-{inicio:012d}", formato=formato, max_abertos=max_abertos)
+    try:
+        for lote in _copy_em_fluxo(connect, query.format(inicio=int(inicio), fim=int(fim)), colunas, tamanho_bloco):
+            tabela = pa.Table.from_batches([lote])
+            # Ordena o lote por partição e grava cada trecho contíguo no arquivo da partição
+            tabela = tabela.take(pc.sort_indices(tabela, sort_keys=[('dia', 'ascending'), ('id_estufa', 'ascending')]))
+            dias = pc.fill_null(tabela.column('dia').cast(pa.int32()), -1).to_numpy()
+            estufas = pc.fill_null(tabela.column('id_estufa'), -1).to_numpy()
+            cortes = np.flatnonzero((dias[1:] != dias[:-1]) | (estufas[1:] != estufas[:-1])) + 1
+            dados = tabela.drop_columns(['dia', 'id_estufa'])
+            for comeco, fim_trecho in zip([0, *cortes], [*cortes, tabela.num_rows]):
+                gravador.escrever(tabela.column('dia')[comeco].as_py(), tabela.column('id_estufa')[comeco].as_py(),
+                                  dados.slice(comeco, fim_trecho - comeco))
+    finally:
+        gravador.fechar()
+    return gravador.linhas, gravador.arquivos
+
+
+def _substituir_pasta(destino, nome, nova):
+    """Troca destino/nome por `nova` (leitores ignoram pastas com '_' na frente, então só veem uma das duas)"""
+    pasta = os.path.join(destino, nome)
+    antiga = os.path.join(destino, f"_antiga_{nome}")
+    shutil.rmtree(antiga, ignore_errors=True)
+    if os.path.exists(pasta):
+        os.replace(pasta, antiga)
+    os.replace(nova, pasta)
+    shutil.rmtree(antiga, ignore_errors=True)
+
+
+def exportar(connect, destino, tabelas=('medicao', 'consumo'), formato="parquet", desde_inicio=False,
+             tamanho_bloco=8 << 20, max_abertos=64, espera=30.0):
+    """
+    Exporta cada tabela do ponto da última marca d'água até a marca segura (marca_segura) e
+    avança a marca. Se uma transação de escrita ficar aberta por mais de `espera` segundos,
+    a tabela fica para a próxima rodada em vez de arriscar pular linhas.
+
+    Com `desde_inicio`, as tabelas de `tabelas` são exportadas inteiras numa pasta nova que
+    substitui a antiga no fim (sem partes duplicadas); as marcas das outras tabelas continuam.
+    """
+    os.makedirs(destino, exist_ok=True)
+    marcas = ler_marca_dagua(destino)
+    resumo = {}
+    for nome in tabelas:
+        chave = EXPORTACOES[nome][0]
+        inicio = 0 if desde_inicio else marcas.get(nome, 0)
+        fim = marca_segura(connect, nome, espera)
+        if fim is None:
+            print(f"⚠ {nome}: transação de escrita aberta há mais de {espera:g}s; exportação adiada")
+            resumo[nome] = {'linhas': 0, 'arquivos': 0}
+            continue
+
+        if fim <= inicio and not desde_inicio:
+            print(f"{nome}: nada novo desde {chave} {inicio}")
+            resumo[nome] = {'linhas': 0, 'arquivos': 0}
+            continue
+
+        print(f"Exportando {nome} ({chave} {inicio + 1}..{fim}): ", end='', flush=True)
+        nova = None
+        if desde_inicio:
+            nova = os.path.join(destino, f"_nova_{nome}")
+            shutil.rmtree(nova, ignore_errors=True)
+            os.makedirs(nova)
+        linhas, arquivos = exportar_tabela(connect, nome, destino, inicio, fim, formato=formato,
+                                           tamanho_bloco=tamanho_bloco, max_abertos=max_abertos, pasta=nova)
+        connect.commit()
+        if nova:
+            _substituir_pasta(destino, nome, nova)
+        print(f"{linhas} linhas em {len(arquivos)} arquivos")
+
+        # A marca só avança depois que todos os arquivos da tabela foram fechados
+        marcas[nome] = fim
+        gravar_marca_dagua(destino, marcas)
+        resumo[nome] = {'linhas': linhas, 'arquivos': len(arquivos)}
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta medicao/consumo para Parquet/Arrow particionado")
+    parser.add_argument('--destino', default='exportacao', help="diretório de saída")
+    parser.add_argument('--tabelas', nargs='+', choices=list(EXPORTACOES), default=list(EXPORTACOES))
+    parser.add_argument('--formato', choices=('parquet', 'arrow'), default='parquet')
+    parser.add_argument('--desde-inicio', action='store_true', help="reexporta as tabelas escolhidas inteiras, substituindo o que já estava no destino")
+    parser.add_argument('--bloco-mb', type=int, default=8, help="tamanho de cada lote lido do COPY")
+    parser.add_argument('--max-abertos', type=int, default=64, help="arquivos de partição abertos ao mesmo tempo")
+    parser.add_argument('--espera', type=float, default=30.0,
+                        help="segundos esperando transações de escrita abertas antes de adiar a tabela")
+    args = parser.parse_args()
+
+    connect = db.conectar()
+    try:
+        exportar(connect, args.destino, tabelas=args.tabelas, formato=args.formato,
+                 desde_inicio=args.desde_inicio, tamanho_bloco=args.bloco_mb << 20,
+                 max_abertos=args.max_abertos, espera=args.espera)
+    finally:
+        db.devolver(connect)
+        db.fechar_pool()
+
+
+if __name__ == "__main__":
+    main()
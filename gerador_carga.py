@@ -0,0 +1,278 @@
+# gerador_carga.py
+# Gera dados sintéticos em volume realista para testes de carga
+# Uso: python gerador_carga.py --estufas 500 --dias 30 --intervalo 5
+
+import argparse
+import io
+import math
+import random
+from datetime import date, datetime, timedelta
+from psycopg2.extras import execute_values
+import db
+
+TIPOS_SENSOR = (
+    ('°C', 'Temperatura'),
+    ('%', 'Umidade'),
+    ('lux', 'Luminosidade'),
+    ('pH', 'pH do Solo'),
+)
+
+# (tipo_atuador, capacidade, recurso consumido, consumo médio por hora)
+TIPOS_ATUADOR = (
+    ('Irrigação', '150 L/h', 'Água', 40.0),
+    ('Ventilação', '600 m³/h', 'Energia Elétrica', 2.5),
+    ('Aquecimento', '6000 W', 'Energia Elétrica', 5.0),
+)
+
+CARGOS = ('Técnico Agrícola', 'Operador de Estufa', 'Engenheira Agrônoma', 'Supervisora')
+
+
+def _copy(cursor, tabela, colunas, linhas):
+    """Grava as linhas com COPY FROM STDIN (muito mais rápido que INSERT para volume)"""
+    buffer = io.StringIO()
+    for linha in linhas:
+        buffer.write("\t".join("\\N" if v is None else str(v) for v in linha))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN", buffer)
+
+
+def _copy_em_blocos(connect, tabela, colunas, linhas, tamanho_chunk):
+    """COPY em blocos de `tamanho_chunk` linhas, com memória constante"""
+    cursor = connect.cursor()
+    bloco = []
+    total = 0
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) >= tamanho_chunk:
+            _copy(cursor, tabela, colunas, bloco)
+            connect.commit()
+            total += len(bloco)
+            bloco = []
+            print(f"  {tabela}: {total} linhas")
+    if bloco:
+        _copy(cursor, tabela, colunas, bloco)
+        connect.commit()
+        total += len(bloco)
+    cursor.close()
+    return total
+
+
+def _garantir_dados_base(connect):
+    """Culturas, condições ideais e recursos vêm dos inserts padrão se o banco estiver vazio"""
+    from planteligente import inserts
+
+    cursor = connect.cursor()
+    for table_name in ('CULTURA', 'CONDICAO_IDEAL', 'RECURSO'):
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name.lower()}")
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(inserts[table_name])
+    connect.commit()
+
+    cursor.execute("""
+        SELECT c.id_cultura, c.tempo_ciclo_dias, ci.temp_min, ci.temp_max, ci.umid_min, ci.umid_max
+        FROM cultura c
+        JOIN condicao_ideal ci ON c.id_cultura = ci.id_cultura
+    """)
+    culturas = [(r[0], r[1], float(r[2]), float(r[3]), float(r[4]), float(r[5])) for r in cursor.fetchall()]
+    cursor.execute("SELECT nome_recurso, id_recurso FROM recurso")
+    recursos = dict(cursor.fetchall())
+    cursor.close()
+    return culturas, recursos
+
+
+def _medicoes(sensores, perfis, inicio, fim, intervalo, prob_anomalia, rnd):
+    """
+    Curvas diárias de temperatura/umidade/luminosidade com ruído e excursões injetadas.
+    Gera (data_hora_registro, valor_medido, id_sensor) em ordem de tempo.
+    """
+    # Excursões: por estufa e por dia, com probabilidade prob_anomalia
+    excursoes = {}
+    dia = inicio
+    while dia < fim:
+        for id_estufa in perfis:
+            if rnd.random() < prob_anomalia:
+                comeco = dia + timedelta(minutes=rnd.randint(0, 24 * 60 - 1))
+                duracao = timedelta(minutes=rnd.randint(30, 120))
+                tipo = rnd.choice(('Temperatura', 'Umidade'))
+                desvio = rnd.choice((-1, 1)) * (8.0 if tipo == 'Temperatura' else 20.0)
+                excursoes.setdefault(id_estufa, []).append((comeco, comeco + duracao, tipo, desvio))
+        dia += timedelta(days=1)
+
+    momento = inicio
+    while momento < fim:
+        hora = momento.hour + momento.minute / 60
+        ciclo = math.sin(2 * math.pi * (hora - 8) / 24)
+        for id_sensor, tipo_sensor, id_estufa in sensores:
+            perfil = perfis[id_estufa]
+            temp = perfil['temp'] + perfil['amplitude'] * ciclo + rnd.gauss(0, 0.4)
+            if tipo_sensor == 'Temperatura':
+                valor = temp
+            elif tipo_sensor == 'Umidade':
+                valor = perfil['umid'] - 1.5 * (temp - perfil['temp']) + rnd.gauss(0, 1.5)
+            elif tipo_sensor == 'Luminosidade':
+                valor = max(0.0, 1200 * math.sin(math.pi * (hora - 6) / 12)) + abs(rnd.gauss(0, 20))
+            else:
+                valor = 6.5 + rnd.gauss(0, 0.1)
+
+            for comeco, termino, tipo, desvio in excursoes.get(id_estufa, ()):
+                if tipo == tipo_sensor and comeco <= momento < termino:
+                    valor += desvio
+
+            if tipo_sensor == 'Umidade':
+                valor = min(max(valor, 5.0), 99.0)
+            yield (momento, round(valor, 4), id_sensor)
+        momento += intervalo
+
+
+def _consumos(atuadores, recursos, inicio, fim, rnd):
+    """Um registro de consumo por atuador por hora; aquecimento só à noite, ventilação de dia"""
+    momento = inicio
+    while momento < fim:
+        hora = momento.hour
+        for id_atuador, tipo_atuador in atuadores:
+            for tipo, _, recurso, media in TIPOS_ATUADOR:
+                if tipo != tipo_atuador:
+                    continue
+                if tipo == 'Aquecimento' and 6 <= hora < 20:
+                    continue
+                if tipo == 'Ventilação' and not 9 <= hora < 18:
+                    continue
+                quantidade = max(0.0, rnd.gauss(media, media * 0.2))
+                yield (momento, round(quantidade, 4), id_atuador, recursos[recurso])
+        momento += timedelta(hours=1)
+
+
+def gerar_carga(connect, estufas=50, dias=7, intervalo_min=5, prob_anomalia=0.2,
+                funcionarios_por_estufa=2, dias_rotacao=30, seed=42, tamanho_chunk=100000):
+    """
+    Preenche o schema (já criado) com estufas, sensores, atuadores, lotes, funcionários
+    em rodízio, tarefas, medições dos últimos `dias` a cada `intervalo_min` minutos e consumos.
+    Retorna a quantidade de linhas geradas por tabela.
+    """
+    rnd = random.Random(seed)
+    print(f"\n---GERANDO CARGA: {estufas} estufas, {dias} dias, medições a cada {intervalo_min} min---")
+    culturas, recursos = _garantir_dados_base(connect)
+    cursor = connect.cursor()
+    hoje = date.today()
+    contagem = {}
+
+    # Estufas
+    ids_estufa = [r[0] for r in execute_values(cursor, """
+        INSERT INTO estufa (nome, localizacao, tamanho, status) VALUES %s RETURNING id_estufa
+    """, [(f"Estufa Sintética {i + 1}", f"Setor {i % 20 + 1} - Lote {i // 20 + 1}",
+           round(rnd.uniform(100, 400), 2), 'Ativa') for i in range(estufas)],
+        page_size=1000, fetch=True)]
+    contagem['estufa'] = len(ids_estufa)
+
+    # Sensores
+    sensores = []
+    rows = execute_values(cursor, """
+        INSERT INTO sensor (unidade_medida, tipo_sensor, id_estufa) VALUES %s
+        RETURNING id_sensor, tipo_sensor, id_estufa
+    """, [(unidade, tipo, id_estufa) for id_estufa in ids_estufa for unidade, tipo in TIPOS_SENSOR],
+        page_size=1000, fetch=True)
+    sensores.extend(rows)
+    contagem['sensor'] = len(sensores)
+
+    # Atuadores
+    atuadores = execute_values(cursor, """
+        INSERT INTO atuador (tipo_atuador, capacidade, id_estufa) VALUES %s
+        RETURNING id_atuador, tipo_atuador
+    """, [(tipo, capacidade, id_estufa) for id_estufa in ids_estufa for tipo, capacidade, _, _ in TIPOS_ATUADOR],
+        page_size=1000, fetch=True)
+    contagem['atuador'] = len(atuadores)
+
+    # Lotes de plantio ativos e perfil climático de cada estufa
+    perfis = {}
+    lotes = []
+    for id_estufa in ids_estufa:
+        id_cultura, ciclo, temp_min, temp_max, umid_min, umid_max = rnd.choice(culturas)
+        plantio = hoje - timedelta(days=rnd.randint(0, ciclo // 2))
+        lotes.append((plantio, plantio + timedelta(days=ciclo), id_estufa, id_cultura))
+        perfis[id_estufa] = {
+            'temp': (temp_min + temp_max) / 2 + rnd.gauss(0, 1),
+            'amplitude': rnd.uniform(2, (temp_max - temp_min) / 2 + 1),
+            'umid': (umid_min + umid_max) / 2 + rnd.gauss(0, 2),
+        }
+    execute_values(cursor, """
+        INSERT INTO lote_plantio (data_plantio, data_previsao_colheita, id_estufa, id_cultura) VALUES %s
+    """, lotes, page_size=1000)
+    contagem['lote_plantio'] = len(lotes)
+
+    # Funcionários em rodízio entre estufas a cada `dias_rotacao` dias
+    total_funcionarios = estufas * funcionarios_por_estufa
+    ids_funcionario = [r[0] for r in execute_values(cursor, """
+        INSERT INTO funcionario (cpf, nome, telefone, cargo) VALUES %s RETURNING id_funcionario
+    """, [(f"{90000000000 + i}", f"Funcionário Sintético {i + 1}",
+           f"(47)9{i % 10000:04d}-{rnd.randint(0, 9999):04d}", rnd.choice(CARGOS))
+          for i in range(total_funcionarios)],
+        page_size=1000, fetch=True)]
+    contagem['funcionario'] = len(ids_funcionario)
+
+    rodizios = []
+    periodos = max(1, math.ceil(dias / dias_rotacao))
+    for i, id_funcionario in enumerate(ids_funcionario):
+        for p in range(periodos):
+            inicio_periodo = hoje - timedelta(days=(periodos - p) * dias_rotacao)
+            fim_periodo = None if p == periodos - 1 else inicio_periodo + timedelta(days=dias_rotacao - 1)
+            id_estufa = ids_estufa[(i + p * funcionarios_por_estufa) % estufas]
+            rodizios.append((inicio_periodo, fim_periodo, id_funcionario, id_estufa))
+    execute_values(cursor, """
+        INSERT INTO estufa_funcionario (data_inicio, data_fim, id_funcionario, id_estufa) VALUES %s
+    """, rodizios, page_size=1000)
+    contagem['estufa_funcionario'] = len(rodizios)
+
+    # Tarefas: algumas concluídas, algumas pendentes
+    agora = datetime.now().replace(second=0, microsecond=0)
+    tarefas = []
+    for id_funcionario in ids_funcionario:
+        for _ in range(rnd.randint(0, 4)):
+            agendada = agora - timedelta(hours=rnd.randint(-48, 24 * dias))
+            concluida = agendada + timedelta(hours=rnd.randint(1, 8)) if rnd.random() < 0.7 else None
+            tarefas.append(("Tarefa sintética de manutenção", concluida, agendada, id_funcionario))
+    if tarefas:
+        execute_values(cursor, """
+            INSERT INTO tarefa (descricao, data_conclusao, data_agendada, id_funcionario) VALUES %s
+        """, tarefas, page_size=1000)
+    contagem['tarefa'] = len(tarefas)
+
+    connect.commit()
+    cursor.close()
+
+    # Séries temporais via COPY em blocos
+    inicio = agora - timedelta(days=dias)
+    contagem['medicao'] = _copy_em_blocos(
+        connect, 'medicao', ('data_hora_registro', 'valor_medido', 'id_sensor'),
+        _medicoes(sensores, perfis, inicio, agora, timedelta(minutes=intervalo_min), prob_anomalia, rnd),
+        tamanho_chunk)
+    contagem['consumo'] = _copy_em_blocos(
+        connect, 'consumo', ('data_hora_consumo', 'quantidade_consumida', 'id_atuador', 'id_recurso'),
+        _consumos(atuadores, recursos, inicio, agora, rnd),
+        tamanho_chunk)
+
+    for tabela, total in contagem.items():
+        print(f"{tabela}: {total} linhas")
+    return contagem
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera carga sintética no banco do Planteligente")
+    parser.add_argument('--estufas', type=int, default=50)
+    parser.add_argument('--dias', type=int, default=7)
+    parser.add_argument('--intervalo', type=int, default=5, help="minutos entre medições")
+    parser.add_argument('--anomalias', type=float, default=0.2, help="probabilidade de excursão por estufa/dia")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    connect = db.conectar()
+    try:
+        gerar_carga(connect, estufas=args.estufas, dias=args.dias, intervalo_min=args.intervalo,
+                    prob_anomalia=args.anomalias, seed=args.seed)
+    finally:
+        db.devolver(connect)
+        db.fechar_pool()
+
+
+if __name__ == "__main__":
+    main()
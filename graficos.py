@@ -0,0 +1,162 @@
+# graficos.py
+# Desenho dos gráficos das consultas: na tela (plt.show) ou sem tela (backend Agg)
+# gravando PNG/SVG, com redução de séries grandes (LTTB), cache por versão dos dados
+# e renderização opcional em paralelo (um processo por figura)
+# pip install matplotlib
+
+import hashlib
+import json
+import os
+import sys
+
+# Cada painel é (titulo, rotulo_x, rotulo_y, categorias, valores)
+MAX_BARRAS = 60
+PAINEIS_POR_FIGURA = 12
+COLUNAS_GRADE = 3
+
+
+def modo_sem_tela():
+    """Sem tela quando GRAFICOS_DIR está definido ou não há display (servidor, SSH, cron)"""
+    if os.getenv('GRAFICOS_DIR'):
+        return True
+    if sys.platform.startswith('linux'):
+        return not (os.getenv('DISPLAY') or os.getenv('WAYLAND_DISPLAY'))
+    return False
+
+
+def lttb(valores, limite):
+    """
+    Largest-Triangle-Three-Buckets: índices de `limite` pontos que preservam o formato
+    da série (picos e vales), sempre incluindo o primeiro e o último
+    """
+    n = len(valores)
+    if limite >= n or limite < 3:
+        return list(range(n))
+
+    indices = [0]
+    tamanho_balde = (n - 2) / (limite - 2)
+    anterior = 0
+    for i in range(limite - 2):
+        inicio = int(i * tamanho_balde) + 1
+        fim = int((i + 1) * tamanho_balde) + 1
+
+        # Média do balde seguinte (ou o último ponto) como terceiro vértice do triângulo
+        proximo_inicio, proximo_fim = fim, min(int((i + 2) * tamanho_balde) + 1, n)
+        if proximo_inicio >= proximo_fim:
+            media_x, media_y = n - 1, valores[n - 1]
+        else:
+            media_x = (proximo_inicio + proximo_fim - 1) / 2
+            media_y = sum(valores[proximo_inicio:proximo_fim]) / (proximo_fim - proximo_inicio)
+
+        melhor, maior_area = inicio, -1.0
+        for j in range(inicio, fim):
+            area = abs((anterior - media_x) * (valores[j] - valores[anterior])
+                       - (anterior - j) * (media_y - valores[anterior]))
+            if area > maior_area:
+                melhor, maior_area = j, area
+        indices.append(melhor)
+        anterior = melhor
+
+    indices.append(n - 1)
+    return indices
+
+
+def reduzir(painel, max_barras=MAX_BARRAS):
+    """Painel com no máximo `max_barras` categorias escolhidas por LTTB"""
+    titulo, rotulo_x, rotulo_y, categorias, valores = painel
+    if len(categorias) <= max_barras:
+        return painel
+    indices = lttb([float(v) for v in valores], max_barras)
+    return (f"{titulo} ({len(indices)} de {len(categorias)})", rotulo_x, rotulo_y,
+            [categorias[i] for i in indices], [valores[i] for i in indices])
+
+
+def _desenhar(titulo, paineis, caminho=None, formato="png"):
+    """Uma figura em grade com os painéis; grava em `caminho` (Agg) ou mostra na tela"""
+    import matplotlib
+    if caminho is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    colunas = min(COLUNAS_GRADE, len(paineis))
+    linhas = (len(paineis) + colunas - 1) // colunas
+    fig, axes = plt.subplots(linhas, colunas, figsize=(6 * colunas, 4 * linhas), squeeze=False)
+    for ax, (titulo_painel, rotulo_x, rotulo_y, categorias, valores) in zip(axes.flat, paineis):
+        ax.bar(range(len(categorias)), [float(v) for v in valores])
+        ax.set_title(titulo_painel)
+        ax.set_xlabel(rotulo_x)
+        ax.set_ylabel(rotulo_y)
+        ax.set_xticks(range(len(categorias)))
+        ax.set_xticklabels(categorias, rotation=45, ha="right", fontsize=8 if len(categorias) > 20 else None)
+    for ax in list(axes.flat)[len(paineis):]:
+        ax.set_visible(False)
+    if titulo:
+        fig.suptitle(titulo)
+    fig.tight_layout()
+
+    if caminho is None:
+        plt.show()
+    else:
+        fig.savefig(caminho, format=formato)
+    plt.close(fig)
+    return caminho
+
+
+def _paginas(paineis, max_barras, por_figura):
+    reduzidos = [reduzir(p, max_barras) for p in paineis]
+    return [reduzidos[i:i + por_figura] for i in range(0, len(reduzidos), por_figura)]
+
+
+def versao_dados(nome, paineis, formato, max_barras, por_figura):
+    """Chave do cache: muda quando qualquer valor, rótulo ou parâmetro de desenho muda"""
+    conteudo = json.dumps([nome, formato, max_barras, por_figura, paineis], default=str, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:16]
+
+
+def renderizar(nome, paineis, destino=None, formato="png", paralelo=False,
+               max_barras=MAX_BARRAS, por_figura=PAINEIS_POR_FIGURA, titulo=None):
+    """
+    Grava as figuras em `destino` (padrão: GRAFICOS_DIR ou ./graficos) e retorna os caminhos.
+    Figuras já desenhadas para a mesma versão dos dados são reaproveitadas do disco.
+    """
+    destino = destino or os.getenv('GRAFICOS_DIR', 'graficos')
+    os.makedirs(destino, exist_ok=True)
+    versao = versao_dados(nome, paineis, formato, max_barras, por_figura)
+    paginas = _paginas(paineis, max_barras, por_figura)
+
+    caminhos, pendentes = [], []
+    for numero, pagina in enumerate(paginas, 1):
+        caminho = os.path.join(destino, f"{nome}-{versao}-{numero:02d}.{formato}")
+        caminhos.append(caminho)
+        if not os.path.exists(caminho):
+            sufixo = f" ({numero}/{len(paginas)})" if len(paginas) > 1 else ""
+            pendentes.append(((titulo or "") + sufixo, pagina, caminho, formato))
+
+    if paralelo and len(pendentes) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(len(pendentes), os.cpu_count() or 1)) as executor:
+            list(executor.map(_desenhar, *zip(*pendentes)))
+    else:
+        for args in pendentes:
+            _desenhar(*args)
+    return caminhos
+
+
+def exibir(nome, paineis, titulo=None, **opcoes):
+    """
+    Mostra na tela ou, sem tela, grava os arquivos e informa onde ficaram.
+    GRAFICOS_FORMATO (png/svg) e GRAFICOS_PARALELO=1 definem os padrões do modo sem tela.
+    """
+    if not paineis:
+        return []
+    if not modo_sem_tela():
+        for pagina in _paginas(paineis, opcoes.get('max_barras', MAX_BARRAS),
+                               opcoes.get('por_figura', PAINEIS_POR_FIGURA)):
+            _desenhar(titulo, pagina)
+        return []
+    opcoes.setdefault('formato', os.getenv('GRAFICOS_FORMATO', 'png'))
+    opcoes.setdefault('paralelo', os.getenv('GRAFICOS_PARALELO', '0') == '1')
+    caminhos = renderizar(nome, paineis, titulo=titulo, **opcoes)
+    for caminho in caminhos:
+        print(f"🖼️  Gráfico salvo em {caminho}")
+    return caminhos
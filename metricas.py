@@ -0,0 +1,229 @@
+# metricas.py
+# Contadores, histogramas de latência e medidores (filas) do pipeline de medições,
+# expostos em texto no formato do Prometheus por HTTP local ou por dump periódico.
+#
+# Desligado por padrão: sem METRICAS=1 (ou METRICAS_PORTA/METRICAS_ARQUIVO) cada
+# ponto instrumentado custa só um teste de booleano.
+#
+# Uso:
+#   METRICAS_PORTA=9101 python daemon_ingestao.py --tcp 127.0.0.1:9100
+#   curl http://127.0.0.1:9101/metrics
+
+import contextlib
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Limites (segundos) dos baldes de latência: de 0,5 ms até chamadas lentas ao Gemini
+BALDES_PADRAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_NULO = contextlib.nullcontext()
+
+
+class Histograma:
+    def __init__(self, baldes=BALDES_PADRAO):
+        self.baldes = baldes
+        self.contagens = [0] * (len(baldes) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.baldes, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+class Metricas:
+    """
+    Registro de métricas do processo. Séries são identificadas por nome + rótulos
+    (ex.: etapa_segundos{etapa="inserir_alerta"}). Thread-safe.
+    """
+    def __init__(self, ativo=False, prefixo="planteligente"):
+        self.ativo = ativo
+        self.prefixo = prefixo
+        self.lock = threading.Lock()
+        self.contadores = {}
+        self.histogramas = {}
+        self.medidores = {}
+        self.ajudas = {}
+        self.servidor = None
+        self._parar_dump = None
+
+    def descrever(self, nome, ajuda):
+        self.ajudas[nome] = ajuda
+
+    @staticmethod
+    def _chave(nome, rotulos):
+        return nome, tuple(sorted(rotulos.items()))
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        if not self.ativo:
+            return
+        chave = self._chave(nome, rotulos)
+        with self.lock:
+            self.contadores[chave] = self.contadores.get(chave, 0) + valor
+
+    def observar(self, nome, segundos, **rotulos):
+        if not self.ativo:
+            return
+        chave = self._chave(nome, rotulos)
+        with self.lock:
+            histograma = self.histogramas.get(chave)
+            if histograma is None:
+                histograma = self.histogramas[chave] = Histograma()
+            histograma.observar(segundos)
+
+    @contextlib.contextmanager
+    def _cronometro(self, nome, rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, time.perf_counter() - inicio, **rotulos)
+
+    def medir(self, nome, **rotulos):
+        """`with metricas.medir("etapa_segundos", etapa="x"):` registra a duração do bloco"""
+        if not self.ativo:
+            return _NULO
+        return self._cronometro(nome, rotulos)
+
+    def medidor(self, nome, funcao, **rotulos):
+        """Valor lido na hora da coleta (ex.: tamanho de uma fila)"""
+        with self.lock:
+            self.medidores[self._chave(nome, rotulos)] = funcao
+
+    def remover_medidor(self, nome, **rotulos):
+        with self.lock:
+            self.medidores.pop(self._chave(nome, rotulos), None)
+
+    # ----- Exposição -----
+    def _nome(self, nome):
+        return f"{self.prefixo}_{nome}"
+
+    @staticmethod
+    def _rotulos(rotulos, extra=()):
+        pares = list(rotulos) + list(extra)
+        if not pares:
+            return ""
+        return "{" + ",".join(f'{k}="{Metricas._escapar(v)}"' for k, v in pares) + "}"
+
+    @staticmethod
+    def _escapar(valor):
+        """Valor de rótulo no formato de texto: barra invertida, aspas e quebra de linha escapadas"""
+        return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    def texto_prometheus(self):
+        with self.lock:
+            contadores = sorted(self.contadores.items())
+            histogramas = sorted(self.histogramas.items(), key=lambda item: item[0])
+            medidores = sorted(self.medidores.items(), key=lambda item: item[0])
+            histogramas = [(chave, list(h.baldes), list(h.contagens), h.soma, h.total) for chave, h in histogramas]
+
+        linhas = []
+        declarados = set()
+
+        def cabecalho(nome, tipo):
+            if nome not in declarados:
+                declarados.add(nome)
+                if nome in self.ajudas:
+                    linhas.append(f"# HELP {self._nome(nome)} {self.ajudas[nome]}")
+                linhas.append(f"# TYPE {self._nome(nome)} {tipo}")
+
+        for (nome, rotulos), valor in contadores:
+            cabecalho(nome, "counter")
+            linhas.append(f"{self._nome(nome)}{self._rotulos(rotulos)} {valor}")
+
+        for (nome, rotulos), baldes, contagens, soma, total in histogramas:
+            cabecalho(nome, "histogram")
+            acumulado = 0
+            for limite, contagem in zip(list(baldes) + ["+Inf"], contagens):
+                acumulado += contagem
+                linhas.append(f"{self._nome(nome)}_bucket{self._rotulos(rotulos, [('le', limite)])} {acumulado}")
+            linhas.append(f"{self._nome(nome)}_sum{self._rotulos(rotulos)} {soma}")
+            linhas.append(f"{self._nome(nome)}_count{self._rotulos(rotulos)} {total}")
+
+        for (nome, rotulos), funcao in medidores:
+            try:
+                valor = funcao()
+            except Exception:
+                continue
+            cabecalho(nome, "gauge")
+            linhas.append(f"{self._nome(nome)}{self._rotulos(rotulos)} {valor}")
+
+        return "\n".join(linhas) + "\n"
+
+    def servir(self, porta, host="127.0.0.1"):
+        """Endpoint HTTP local com GET /metrics, numa thread daemon"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metricas = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                corpo = metricas.texto_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, formato, *args):
+                pass
+
+        self.ativo = True
+        self.servidor = ThreadingHTTPServer((host, porta), Handler)
+        self.servidor.daemon_threads = True
+        threading.Thread(target=self.servidor.serve_forever, name="metricas", daemon=True).start()
+        print(f"📈 Métricas em http://{host}:{porta}/metrics")
+
+    def despejar_periodicamente(self, caminho, intervalo=15):
+        """Regrava `caminho` com o texto das métricas a cada `intervalo` segundos (ex.: textfile collector)"""
+        self.ativo = True
+        parar = self._parar_dump = threading.Event()
+
+        def despejar():
+            while not parar.wait(intervalo):
+                self.despejar(caminho)
+
+        threading.Thread(target=despejar, name="metricas-dump", daemon=True).start()
+
+    def despejar(self, caminho):
+        with open(caminho + ".tmp", "w", encoding="utf-8") as arquivo:
+            arquivo.write(self.texto_prometheus())
+        os.replace(caminho + ".tmp", caminho)
+
+    def encerrar(self):
+        if self.servidor is not None:
+            self.servidor.shutdown()
+            self.servidor.server_close()
+            self.servidor = None
+        if self._parar_dump is not None:
+            self._parar_dump.set()
+            self._parar_dump = None
+
+
+# Registro do processo, usado por ai.py e daemon_ingestao.py
+metricas = Metricas(ativo=os.getenv("METRICAS", "0") == "1")
+metricas.descrever("etapa_segundos", "Duração de cada etapa do pipeline de medições e alertas")
+metricas.descrever("medicoes_total", "Medições analisadas")
+metricas.descrever("janelas_lote_total", "Janelas do lote por origem (memória do monitor ou consulta ao banco)")
+metricas.descrever("alertas_total", "Alertas criados, por severidade")
+metricas.descrever("episodios_alerta_total", "Decisões do agrupamento de alertas (abrir, escalar, atualizar, suprimir, fechar)")
+metricas.descrever("llm_chamadas_total", "Chamadas ao Gemini, por resultado")
+metricas.descrever("llm_segundos", "Latência das chamadas ao Gemini")
+metricas.descrever("fila_tamanho", "Itens esperando em cada fila")
+
+
+def iniciar_pela_config():
+    """Liga o endpoint e/ou o dump conforme METRICAS_PORTA / METRICAS_ARQUIVO (e METRICAS_INTERVALO)"""
+    porta = os.getenv("METRICAS_PORTA")
+    if porta and metricas.servidor is None:
+        metricas.servir(int(porta), os.getenv("METRICAS_HOST", "127.0.0.1"))
+    arquivo = os.getenv("METRICAS_ARQUIVO")
+    if arquivo and metricas._parar_dump is None:
+        metricas.despejar_periodicamente(arquivo, float(os.getenv("METRICAS_INTERVALO", "15")))
+    return metricas
@@ -0,0 +1,292 @@
+# perfil_sql.py
+# Perfil das consultas SQL: tempo, linhas e formato dos parâmetros de cada comando,
+# agrupados por impressão digital (o SQL sem literais), com log das consultas lentas
+# e EXPLAIN automático delas
+# pip install psycopg2-binary
+#
+# Desligado por padrão. Com PERFIL_SQL=1 as conexões do pool (db.py) usam um cursor
+# instrumentado; nada muda em ai.py/planteligente.py, que continuam chamando cursor.execute.
+#
+#   PERFIL_SQL=1                 liga o perfil
+#   PERFIL_SQL_LENTA_MS=100      limite para a consulta ser considerada lenta
+#   PERFIL_SQL_EXPLAIN=1         roda EXPLAIN (ANALYZE, BUFFERS) na primeira vez que cada consulta fica lenta
+#   PERFIL_SQL_LOG=lentas.jsonl  grava as consultas lentas (com o plano) em JSON, uma por linha
+#
+# Relatório: opção 24 do menu, ou perfilador.relatorio() / perfilador.top(n)
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from psycopg2 import extensions
+from metricas import metricas
+
+_COMENTARIOS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_TEXTOS = re.compile(r"'(?:[^']|'')*'")
+_NUMEROS = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.I)
+_PARAMETROS = re.compile(r"%\(\w+\)s|%s")
+_CONSTANTES = re.compile(r"\b(null|true|false)\b", re.I)
+_LISTAS = re.compile(r"\?(?:\s*,\s*\?)+")
+# Tuplas iguais repetidas (VALUES de execute_values) viram uma só
+_TUPLA = r"\((?:[^()]|\((?:[^()]|\([^()]*\))*\))*\)"  # até 3 níveis de parênteses
+_TUPLAS = re.compile(rf"({_TUPLA})(?:\s*,\s*\1)+")
+_ESPACOS = re.compile(r"\s+")
+_SOMENTE_LEITURA = re.compile(r"^\s*(select|with|values)\b", re.I)
+_ESCRITA = re.compile(r"\b(insert|update|delete|merge)\b", re.I)
+_EXPLICAVEL = re.compile(r"^\s*(select|with|values|insert|update|delete)\b", re.I)
+_EXECUTE = re.compile(r"^\s*execute\s+(\w+)", re.I)
+
+
+def normalizar(sql):
+    """SQL sem comentários, literais e parâmetros, com listas e tuplas repetidas colapsadas"""
+    sql = _COMENTARIOS.sub(" ", sql)
+    sql = _TEXTOS.sub("?", sql)
+    sql = _PARAMETROS.sub("?", sql)
+    sql = _NUMEROS.sub("?", sql)
+    sql = _CONSTANTES.sub("?", sql)
+    sql = _TUPLAS.sub(r"\1, ...", sql)
+    sql = _LISTAS.sub("?, ...", sql)
+    return _ESPACOS.sub(" ", sql).strip()
+
+
+def impressao_digital(sql_normalizado):
+    return hashlib.md5(sql_normalizado.encode('utf-8')).hexdigest()[:10]
+
+
+def formato_parametros(parametros):
+    """Forma dos parâmetros sem os valores: '(int, float, list[12])', '{id, nome}' ou '-'"""
+    if parametros is None:
+        return "-"
+    if isinstance(parametros, dict):
+        return "{" + ", ".join(sorted(parametros)) + "}"
+
+    def tipo(valor):
+        if isinstance(valor, (list, tuple)):
+            return f"{type(valor).__name__}[{len(valor)}]"
+        return type(valor).__name__
+
+    return "(" + ", ".join(tipo(valor) for valor in parametros) + ")"
+
+
+class EstatisticaConsulta:
+    def __init__(self, sql, formato):
+        self.sql = sql
+        self.formatos = {formato}
+        self.chamadas = 0
+        self.erros = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.linhas = 0
+        self.lentas = 0
+        self.plano = None
+
+    @property
+    def media(self):
+        return self.total / self.chamadas if self.chamadas else 0.0
+
+
+class Perfilador:
+    """
+    Acumula as estatísticas por impressão digital da consulta. Thread-safe: as conexões
+    do pool são usadas por várias threads (workers da IA, daemon de ingestão).
+    """
+    def __init__(self, ativo=False, limite_lenta=0.1, explicar=False, arquivo_log=None):
+        self.ativo = ativo
+        self.limite_lenta = limite_lenta
+        self.explicar = explicar
+        self.arquivo_log = arquivo_log
+        self.lock = threading.Lock()
+        self.consultas = {}
+
+    def registrar(self, sql, parametros, segundos, linhas, erro=False):
+        """Registra uma execução; retorna (impressão digital, lenta, primeira vez que ficou lenta)"""
+        normalizado = normalizar(sql)
+        digital = impressao_digital(normalizado)
+        formato = formato_parametros(parametros)
+        lenta = segundos >= self.limite_lenta
+        with self.lock:
+            estatistica = self.consultas.get(digital)
+            if estatistica is None:
+                estatistica = self.consultas[digital] = EstatisticaConsulta(normalizado, formato)
+            estatistica.formatos.add(formato)
+            estatistica.chamadas += 1
+            estatistica.total += segundos
+            estatistica.maximo = max(estatistica.maximo, segundos)
+            if erro:
+                estatistica.erros += 1
+            elif linhas is not None and linhas > 0:
+                estatistica.linhas += linhas
+            primeira_lenta = lenta and estatistica.lentas == 0
+            if lenta:
+                estatistica.lentas += 1
+        metricas.observar("sql_segundos", segundos, consulta=digital)
+        return digital, lenta, primeira_lenta
+
+    def anotar_plano(self, digital, plano):
+        with self.lock:
+            if digital in self.consultas:
+                self.consultas[digital].plano = plano
+
+    def logar_lenta(self, digital, sql, parametros, segundos, linhas, plano=None):
+        resumo = _ESPACOS.sub(" ", sql).strip()
+        if len(resumo) > 160:
+            resumo = resumo[:157] + "..."
+        print(f"🐢 Consulta lenta [{digital}] {segundos * 1000:.1f} ms, {linhas} linhas: {resumo}")
+        if self.arquivo_log:
+            registro = {
+                'quando': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'consulta': digital,
+                'ms': round(segundos * 1000, 3),
+                'linhas': linhas,
+                'parametros': formato_parametros(parametros),
+                'sql': normalizar(sql),
+                'plano': plano,
+            }
+            with self.lock, open(self.arquivo_log, 'a', encoding='utf-8') as arquivo:
+                arquivo.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+
+    def top(self, n=10, ordem="total"):
+        """As `n` consultas com maior `ordem` (total, media, maximo, chamadas ou linhas)"""
+        with self.lock:
+            consultas = list(self.consultas.items())
+        return sorted(consultas, key=lambda item: getattr(item[1], ordem), reverse=True)[:n]
+
+    def relatorio(self, n=10, ordem="total"):
+        consultas = self.top(n, ordem)
+        if not consultas:
+            return "Nenhuma consulta registrada (o perfil só coleta com PERFIL_SQL=1)."
+        tempo_total = sum(estatistica.total for _, estatistica in consultas) or 1.0
+        linhas = [f"{'consulta':<10} {'chamadas':>8} {'total ms':>10} {'%':>5} {'média ms':>9} "
+                  f"{'máx ms':>9} {'linhas':>8} {'lentas':>6}  sql"]
+        for digital, e in consultas:
+            sql = e.sql if len(e.sql) <= 90 else e.sql[:87] + "..."
+            linhas.append(f"{digital:<10} {e.chamadas:>8} {e.total * 1000:>10.1f} "
+                          f"{100 * e.total / tempo_total:>5.1f} {e.media * 1000:>9.2f} "
+                          f"{e.maximo * 1000:>9.2f} {e.linhas:>8} {e.lentas:>6}  {sql}")
+            if e.plano:
+                plano = e.plano.get('Plan', {})
+                execucao = e.plano.get('Execution Time')
+                detalhe = f"{execucao:.1f} ms" if execucao is not None else f"custo {plano.get('Total Cost')}"
+                linhas.append(f"{'':<10} └ plano: {plano.get('Node Type')} ({detalhe})")
+        return "\n".join(linhas)
+
+    def limpar(self):
+        with self.lock:
+            self.consultas = {}
+
+
+def _texto_sql(cursor, sql):
+    if isinstance(sql, bytes):
+        return sql.decode(extensions.encodings.get(cursor.connection.encoding, 'utf-8'), 'replace')
+    if isinstance(sql, str):
+        return sql
+    # psycopg2.sql.Composable
+    return sql.as_string(cursor.connection)
+
+
+def _expandir_execute(sql, parametros):
+    """
+    EXECUTE de um comando preparado (db.comandos) de volta ao SQL registrado, com os parâmetros
+    no formato dele, para o EXPLAIN ver a consulta (e saber se é leitura). (None, None) se o
+    comando não estiver registrado; outros SQL voltam como vieram.
+    """
+    encontrado = _EXECUTE.match(sql)
+    if not encontrado:
+        return sql, parametros
+    import db  # db importa este módulo, então só aqui, quando ele já está carregado
+    registro = db.comandos.comandos.get(encontrado.group(1))
+    if registro is None:
+        return None, None
+    original, _, nomeados, _ = registro
+    valores = list(parametros or ())
+    return original, dict(zip(nomeados, valores)) if nomeados else valores
+
+
+def _explicar(connection, sql, parametros):
+    """
+    Plano da consulta em JSON. EXPLAIN ANALYZE executa o comando de novo, então só é usado
+    em leituras; escritas recebem o plano estimado. Roda num savepoint para que um erro aqui
+    não aborte a transação de quem chamou.
+    """
+    if sql is None or not _EXPLICAVEL.match(sql) or connection.get_transaction_status() == extensions.TRANSACTION_STATUS_INERROR:
+        return None
+    analisar = _SOMENTE_LEITURA.match(sql) and not _ESCRITA.search(sql)
+    opcoes = "ANALYZE, BUFFERS, FORMAT JSON" if analisar else "FORMAT JSON"
+    em_transacao = not connection.autocommit
+    cursor = extensions.cursor(connection)
+    try:
+        if em_transacao:
+            cursor.execute("SAVEPOINT perfil_sql")
+        cursor.execute(f"EXPLAIN ({opcoes}) {sql}", parametros)
+        plano = cursor.fetchone()[0][0]
+        if em_transacao:
+            cursor.execute("RELEASE SAVEPOINT perfil_sql")
+        return plano
+    except Exception as e:
+        print(f"⚠ EXPLAIN falhou: {e}")
+        if em_transacao:
+            cursor.execute("ROLLBACK TO SAVEPOINT perfil_sql")
+        return None
+    finally:
+        cursor.close()
+
+
+class CursorPerfilado(extensions.cursor):
+    """Cursor que mede cada execute/executemany (inclusive os feitos por execute_values)"""
+
+    def _medir(self, executar, sql, parametros, amostra):
+        # `amostra`: parâmetros de uma execução, usados no formato e no EXPLAIN
+        inicio = time.perf_counter()
+        try:
+            resultado = executar(sql, parametros)
+        except Exception:
+            perfilador.registrar(_texto_sql(self, sql), amostra, time.perf_counter() - inicio, None, erro=True)
+            raise
+        segundos = time.perf_counter() - inicio
+        texto = _texto_sql(self, sql)
+        digital, lenta, primeira_lenta = perfilador.registrar(texto, amostra, segundos, self.rowcount)
+        if lenta:
+            plano = None
+            # Cursores nomeados só fazem DECLARE aqui; o tempo real está nos fetch
+            if primeira_lenta and perfilador.explicar and self.name is None:
+                plano = _explicar(self.connection, *_expandir_execute(texto, amostra))
+                perfilador.anotar_plano(digital, plano)
+            perfilador.logar_lenta(digital, texto, amostra, segundos, self.rowcount, plano)
+        return resultado
+
+    def execute(self, sql, parametros=None):
+        if not perfilador.ativo:
+            return super().execute(sql, parametros)
+        return self._medir(super().execute, sql, parametros, parametros)
+
+    def executemany(self, sql, lista_parametros):
+        if not perfilador.ativo:
+            return super().executemany(sql, lista_parametros)
+        lista_parametros = list(lista_parametros)
+        return self._medir(super().executemany, sql, lista_parametros,
+                           lista_parametros[0] if lista_parametros else None)
+
+
+class ConexaoPerfilada(extensions.connection):
+    """Conexão cujos cursores (inclusive os nomeados) são CursorPerfilado"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = CursorPerfilado
+
+
+def fabrica_conexao():
+    """connection_factory para o pool: ConexaoPerfilada com o perfil ligado, senão a padrão"""
+    return ConexaoPerfilada if perfilador.ativo else None
+
+
+# Perfil do processo, configurado pelo ambiente
+perfilador = Perfilador(
+    ativo=os.getenv('PERFIL_SQL', '0') == '1',
+    limite_lenta=float(os.getenv('PERFIL_SQL_LENTA_MS', '100')) / 1000,
+    explicar=os.getenv('PERFIL_SQL_EXPLAIN', '0') == '1',
+    arquivo_log=os.getenv('PERFIL_SQL_LOG'),
+)
+metricas.descrever("sql_segundos", "Duração dos comandos SQL, por impressão digital da consulta")
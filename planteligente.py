@@ -1,12 +1,19 @@
 # pip install psycopg2-binary python-dotenv
 
 import psycopg2
-from psycopg2 import DatabaseError, OperationalError
+from psycopg2 import DatabaseError, OperationalError, extensions
 import os
+import re
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
-from ai import inserir_medicao_com_analise_ia
-from tabulate import tabulate
-import matplotlib.pyplot as plt
+from ai import (inserir_medicao_com_analise_ia, concluir_tarefa, invalidar_caches, supressor_alertas,
+                cache_ia_pela_config)
+import db
+import graficos
+from perfil_sql import perfilador
+
+# tabulate é importado dentro das funções de exibição e matplotlib dentro de graficos,
+# para que o núcleo de banco/ingestão carregue rápido sem eles
 
 # Carrega variáveis do arquivo .env
 load_dotenv()
@@ -129,6 +136,526 @@ tables = {
             CONSTRAINT fk_estufa_funcionario_funcionario FOREIGN KEY (id_funcionario) REFERENCES funcionario (id_funcionario),
             CONSTRAINT fk_estufa_funcionario_estufa FOREIGN KEY (id_estufa) REFERENCES estufa (id_estufa)
         )"""),
+    'CONSUMO_HORA': (
+        """CREATE TABLE consumo_hora (
+            id_estufa BIGINT,
+            id_recurso BIGINT,
+            hora TIMESTAMP,
+            total NUMERIC(16,4) NOT NULL DEFAULT 0,
+            registros BIGINT NOT NULL DEFAULT 0,
+            CONSTRAINT pk_consumo_hora PRIMARY KEY (id_estufa, id_recurso, hora)
+        )"""),
+    'CONSUMO_DIA': (
+        """CREATE TABLE consumo_dia (
+            id_estufa BIGINT,
+            id_recurso BIGINT,
+            dia DATE,
+            total NUMERIC(16,4) NOT NULL DEFAULT 0,
+            registros BIGINT NOT NULL DEFAULT 0,
+            CONSTRAINT pk_consumo_dia PRIMARY KEY (id_estufa, id_recurso, dia)
+        )"""),
+    'DESVIO_TEMPERATURA_HORA': (
+        """CREATE TABLE desvio_temperatura_hora (
+            id_cultura BIGINT,
+            id_estufa BIGINT,
+            hora TIMESTAMP,
+            soma_desvio NUMERIC(18,4) NOT NULL DEFAULT 0,
+            registros BIGINT NOT NULL DEFAULT 0,
+            CONSTRAINT pk_desvio_temperatura_hora PRIMARY KEY (id_cultura, id_estufa, hora)
+        )"""),
+    'DESVIO_TEMPERATURA': (
+        """CREATE TABLE desvio_temperatura (
+            id_cultura BIGINT,
+            id_estufa BIGINT,
+            soma_desvio NUMERIC(18,4) NOT NULL DEFAULT 0,
+            registros BIGINT NOT NULL DEFAULT 0,
+            CONSTRAINT pk_desvio_temperatura PRIMARY KEY (id_cultura, id_estufa)
+        )"""),
+    'ALERTA_DIA': (
+        """CREATE TABLE alerta_dia (
+            id_estufa BIGINT,
+            seriedade VARCHAR(50),
+            dia DATE,
+            total BIGINT NOT NULL DEFAULT 0,
+            CONSTRAINT pk_alerta_dia PRIMARY KEY (id_estufa, seriedade, dia)
+        )"""),
+    # Excursão contínua para fora da faixa que gerou o alerta (direcao: 1 acima, -1 abaixo);
+    # data_hora_fim NULL enquanto o episódio está aberto
+    'EPISODIO_ALERTA': (
+        """CREATE TABLE episodio_alerta (
+            id_alerta BIGINT PRIMARY KEY,
+            id_estufa BIGINT,
+            tipo_sensor VARCHAR(100),
+            direcao SMALLINT,
+            seriedade VARCHAR(50),
+            pico NUMERIC(10,4),
+            ocorrencias INT NOT NULL DEFAULT 1,
+            id_ultima_medicao BIGINT,
+            data_hora_inicio TIMESTAMP,
+            ultima_ocorrencia TIMESTAMP,
+            data_hora_fim TIMESTAMP,
+            CONSTRAINT fk_episodioalerta_alerta FOREIGN KEY (id_alerta) REFERENCES alerta (id_alerta) ON DELETE CASCADE
+        )"""),
+}
+
+# Versões particionadas por tempo (RANGE mensal) das tabelas de séries temporais.
+# A chave primária precisa incluir a coluna de partição, então alerta deixa de ter
+# a FK para medicao(id_medicao): a retenção das medições vira um DROP da partição,
+# precedido do DELETE dos alertas dessas medições (ver _apagar_alertas_das_medicoes).
+tables_particionadas = {
+    'MEDICAO': (
+        """CREATE TABLE medicao (
+            id_medicao BIGSERIAL,
+            data_hora_registro TIMESTAMP NOT NULL,
+            valor_medido NUMERIC(10,4),
+            id_sensor BIGINT,
+            CONSTRAINT pk_medicao PRIMARY KEY (id_medicao, data_hora_registro),
+            CONSTRAINT fk_medicao_sensor FOREIGN KEY (id_sensor) REFERENCES sensor (id_sensor)
+        ) PARTITION BY RANGE (data_hora_registro)"""),
+    'ALERTA': (
+        """CREATE TABLE alerta (
+            id_alerta BIGSERIAL PRIMARY KEY,
+            seriedade VARCHAR(50),
+            mensagem VARCHAR(255),
+            data_hora_alerta TIMESTAMP,
+            id_medicao BIGINT
+        )"""),
+    'CONSUMO': (
+        """CREATE TABLE consumo (
+            id_consumo BIGSERIAL,
+            data_hora_consumo TIMESTAMP NOT NULL,
+            quantidade_consumida NUMERIC(10,4),
+            id_atuador BIGINT,
+            id_recurso BIGINT,
+            CONSTRAINT pk_consumo PRIMARY KEY (id_consumo, data_hora_consumo),
+            CONSTRAINT fk_consumo_atuador FOREIGN KEY (id_atuador) REFERENCES atuador (id_atuador),
+            CONSTRAINT fk_consumo_recurso FOREIGN KEY (id_recurso) REFERENCES recurso (id_recurso)
+        ) PARTITION BY RANGE (data_hora_consumo)"""),
+}
+
+# Triggers que mantêm as tabelas de resumo em dia a cada comando sobre as tabelas base.
+# São triggers por comando (FOR EACH STATEMENT) com tabelas de transição, então um
+# COPY ou INSERT multi-linha atualiza o resumo com um único UPSERT agregado.
+triggers = {
+    'FN_RESUMO_CONSUMO': (
+        """CREATE OR REPLACE FUNCTION fn_resumo_consumo() RETURNS trigger AS $$
+        DECLARE
+            origem TEXT;
+            sinal INT;
+        BEGIN
+            FOR origem, sinal IN
+                SELECT o, s FROM (VALUES ('novos', 1), ('antigos', -1)) v(o, s)
+                WHERE (o = 'novos' AND TG_OP IN ('INSERT', 'UPDATE'))
+                   OR (o = 'antigos' AND TG_OP IN ('DELETE', 'UPDATE'))
+            LOOP
+                EXECUTE format($sql$
+                    WITH delta AS (
+                        SELECT a.id_estufa, t.id_recurso, t.data_hora_consumo AS momento,
+                               t.quantidade_consumida * %1$s AS quantidade, %1$s AS registros
+                        FROM %2$I t
+                        JOIN atuador a ON t.id_atuador = a.id_atuador
+                    ),
+                    por_hora AS (
+                        INSERT INTO consumo_hora (id_estufa, id_recurso, hora, total, registros)
+                        SELECT id_estufa, id_recurso, date_trunc('hour', momento), SUM(quantidade), SUM(registros)
+                        FROM delta
+                        GROUP BY 1, 2, 3
+                        ON CONFLICT (id_estufa, id_recurso, hora) DO UPDATE
+                        SET total = consumo_hora.total + EXCLUDED.total,
+                            registros = consumo_hora.registros + EXCLUDED.registros
+                    )
+                    INSERT INTO consumo_dia (id_estufa, id_recurso, dia, total, registros)
+                    SELECT id_estufa, id_recurso, momento::date, SUM(quantidade), SUM(registros)
+                    FROM delta
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT (id_estufa, id_recurso, dia) DO UPDATE
+                    SET total = consumo_dia.total + EXCLUDED.total,
+                        registros = consumo_dia.registros + EXCLUDED.registros
+                $sql$, sinal, origem);
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql"""),
+    'TRG_CONSUMO_RESUMO_INSERT': (
+        """CREATE TRIGGER trg_consumo_resumo_insert
+        AFTER INSERT ON consumo
+        REFERENCING NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_resumo_consumo()"""),
+    'TRG_CONSUMO_RESUMO_UPDATE': (
+        """CREATE TRIGGER trg_consumo_resumo_update
+        AFTER UPDATE ON consumo
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_resumo_consumo()"""),
+    'TRG_CONSUMO_RESUMO_DELETE': (
+        """CREATE TRIGGER trg_consumo_resumo_delete
+        AFTER DELETE ON consumo
+        REFERENCING OLD TABLE AS antigos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_resumo_consumo()"""),
+    # Atuador trocado de estufa: o consumo dele sai da estufa antiga e entra na nova
+    # em consumo_hora/consumo_dia, sem recontar o resto dos resumos.
+    'FN_REATRIBUIR_CONSUMO': (
+        """CREATE OR REPLACE FUNCTION fn_reatribuir_consumo() RETURNS trigger AS $$
+        BEGIN
+            WITH mov AS (
+                SELECT n.id_atuador, v.id_estufa, v.sinal
+                FROM novos n
+                JOIN antigos o ON n.id_atuador = o.id_atuador
+                CROSS JOIN LATERAL (VALUES (n.id_estufa, 1), (o.id_estufa, -1)) v(id_estufa, sinal)
+                WHERE n.id_estufa IS DISTINCT FROM o.id_estufa AND v.id_estufa IS NOT NULL
+            ),
+            delta AS (
+                SELECT mov.id_estufa, c.id_recurso, c.data_hora_consumo AS momento,
+                       c.quantidade_consumida * mov.sinal AS quantidade, mov.sinal AS registros
+                FROM mov
+                JOIN consumo c ON c.id_atuador = mov.id_atuador
+            ),
+            por_hora AS (
+                INSERT INTO consumo_hora (id_estufa, id_recurso, hora, total, registros)
+                SELECT id_estufa, id_recurso, date_trunc('hour', momento), SUM(quantidade), SUM(registros)
+                FROM delta
+                GROUP BY 1, 2, 3
+                ON CONFLICT (id_estufa, id_recurso, hora) DO UPDATE
+                SET total = consumo_hora.total + EXCLUDED.total,
+                    registros = consumo_hora.registros + EXCLUDED.registros
+            )
+            INSERT INTO consumo_dia (id_estufa, id_recurso, dia, total, registros)
+            SELECT id_estufa, id_recurso, momento::date, SUM(quantidade), SUM(registros)
+            FROM delta
+            GROUP BY 1, 2, 3
+            ON CONFLICT (id_estufa, id_recurso, dia) DO UPDATE
+            SET total = consumo_dia.total + EXCLUDED.total,
+                registros = consumo_dia.registros + EXCLUDED.registros;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql"""),
+    # Com tabelas de transição o PostgreSQL não aceita UPDATE OF coluna: a função filtra as trocas
+    'TRG_ATUADOR_CONSUMO_UPDATE': (
+        """CREATE TRIGGER trg_atuador_consumo_update
+        AFTER UPDATE ON atuador
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_reatribuir_consumo()"""),
+    # Contagem de alertas por (estufa, seriedade, dia) para consulta2 e consulta_extra
+    'FN_RESUMO_ALERTA': (
+        """CREATE OR REPLACE FUNCTION fn_resumo_alerta() RETURNS trigger AS $$
+        DECLARE
+            origem TEXT;
+            sinal INT;
+        BEGIN
+            FOR origem, sinal IN
+                SELECT o, s FROM (VALUES ('novos', 1), ('antigos', -1)) v(o, s)
+                WHERE (o = 'novos' AND TG_OP IN ('INSERT', 'UPDATE'))
+                   OR (o = 'antigos' AND TG_OP IN ('DELETE', 'UPDATE'))
+            LOOP
+                EXECUTE format($sql$
+                    INSERT INTO alerta_dia (id_estufa, seriedade, dia, total)
+                    SELECT s.id_estufa, COALESCE(t.seriedade, ''), COALESCE(t.data_hora_alerta::date, '-infinity'),
+                           COUNT(*) * %1$s
+                    FROM %2$I t
+                    JOIN medicao m ON t.id_medicao = m.id_medicao
+                    JOIN sensor s ON m.id_sensor = s.id_sensor
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT (id_estufa, seriedade, dia) DO UPDATE
+                    SET total = alerta_dia.total + EXCLUDED.total
+                $sql$, sinal, origem);
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql"""),
+    'TRG_ALERTA_RESUMO_INSERT': (
+        """CREATE TRIGGER trg_alerta_resumo_insert
+        AFTER INSERT ON alerta
+        REFERENCING NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_resumo_alerta()"""),
+    'TRG_ALERTA_RESUMO_UPDATE': (
+        """CREATE TRIGGER trg_alerta_resumo_update
+        AFTER UPDATE ON alerta
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_resumo_alerta()"""),
+    'TRG_ALERTA_RESUMO_DELETE': (
+        """CREATE TRIGGER trg_alerta_resumo_delete
+        AFTER DELETE ON alerta
+        REFERENCING OLD TABLE AS antigos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_resumo_alerta()"""),
+    # Sensor trocado de estufa: os alertas das suas medições saem da estufa antiga
+    # e entram na nova, sem recontar o resto de alerta_dia.
+    'FN_REATRIBUIR_ALERTA': (
+        """CREATE OR REPLACE FUNCTION fn_reatribuir_alerta() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO alerta_dia (id_estufa, seriedade, dia, total)
+            SELECT mov.id_estufa, COALESCE(a.seriedade, ''), COALESCE(a.data_hora_alerta::date, '-infinity'),
+                   SUM(mov.sinal)
+            FROM (
+                SELECT n.id_sensor, v.id_estufa, v.sinal
+                FROM novos n
+                JOIN antigos o ON n.id_sensor = o.id_sensor
+                CROSS JOIN LATERAL (VALUES (n.id_estufa, 1), (o.id_estufa, -1)) v(id_estufa, sinal)
+                WHERE n.id_estufa IS DISTINCT FROM o.id_estufa AND v.id_estufa IS NOT NULL
+            ) mov
+            JOIN medicao m ON m.id_sensor = mov.id_sensor
+            JOIN alerta a ON a.id_medicao = m.id_medicao
+            GROUP BY 1, 2, 3
+            ON CONFLICT (id_estufa, seriedade, dia) DO UPDATE
+            SET total = alerta_dia.total + EXCLUDED.total;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql"""),
+    'TRG_SENSOR_ALERTA_UPDATE': (
+        """CREATE TRIGGER trg_sensor_alerta_update
+        AFTER UPDATE ON sensor
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_reatribuir_alerta()"""),
+    # Desvio de temperatura (consulta3): soma de |valor - ponto médio ideal| e contagem
+    # por (cultura, estufa), no total e por hora. Medições entram/saem com sinal +1/-1;
+    # mudanças em lote_plantio, sensor ou condicao_ideal recalculam só os pares afetados.
+    'FN_RESUMO_DESVIO_MEDICAO': (
+        """CREATE OR REPLACE FUNCTION fn_resumo_desvio_medicao() RETURNS trigger AS $$
+        DECLARE
+            origem TEXT;
+            sinal INT;
+        BEGIN
+            FOR origem, sinal IN
+                SELECT o, s FROM (VALUES ('novos', 1), ('antigos', -1)) v(o, s)
+                WHERE (o = 'novos' AND TG_OP IN ('INSERT', 'UPDATE'))
+                   OR (o = 'antigos' AND TG_OP IN ('DELETE', 'UPDATE'))
+            LOOP
+                EXECUTE format($sql$
+                    WITH delta AS (
+                        SELECT lp.id_cultura, lp.id_estufa, date_trunc('hour', t.data_hora_registro) AS hora,
+                               ABS(t.valor_medido - ((ci.temp_min + ci.temp_max) / 2)) * %1$s AS desvio,
+                               %1$s AS registros
+                        FROM %2$I t
+                        JOIN sensor s ON t.id_sensor = s.id_sensor AND s.tipo_sensor = 'Temperatura'
+                        JOIN (SELECT DISTINCT id_estufa, id_cultura FROM lote_plantio) lp ON s.id_estufa = lp.id_estufa
+                        JOIN condicao_ideal ci ON lp.id_cultura = ci.id_cultura
+                        WHERE t.valor_medido IS NOT NULL
+                    ),
+                    por_hora AS (
+                        INSERT INTO desvio_temperatura_hora (id_cultura, id_estufa, hora, soma_desvio, registros)
+                        SELECT id_cultura, id_estufa, hora, SUM(desvio), SUM(registros)
+                        FROM delta
+                        GROUP BY 1, 2, 3
+                        ON CONFLICT (id_cultura, id_estufa, hora) DO UPDATE
+                        SET soma_desvio = desvio_temperatura_hora.soma_desvio + EXCLUDED.soma_desvio,
+                            registros = desvio_temperatura_hora.registros + EXCLUDED.registros
+                    )
+                    INSERT INTO desvio_temperatura (id_cultura, id_estufa, soma_desvio, registros)
+                    SELECT id_cultura, id_estufa, SUM(desvio), SUM(registros)
+                    FROM delta
+                    GROUP BY 1, 2
+                    ON CONFLICT (id_cultura, id_estufa) DO UPDATE
+                    SET soma_desvio = desvio_temperatura.soma_desvio + EXCLUDED.soma_desvio,
+                        registros = desvio_temperatura.registros + EXCLUDED.registros
+                $sql$, sinal, origem);
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql"""),
+    'FN_RECALCULAR_DESVIO': (
+        """CREATE OR REPLACE FUNCTION fn_recalcular_desvio() RETURNS trigger AS $$
+        DECLARE
+            coluna TEXT := CASE WHEN TG_TABLE_NAME = 'condicao_ideal' THEN 'id_cultura' ELSE 'id_estufa' END;
+            afetados BIGINT[] := '{}';
+            ids BIGINT[];
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                EXECUTE format('SELECT array_agg(DISTINCT %I) FROM novos', coluna) INTO ids;
+                afetados := afetados || COALESCE(ids, '{}');
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                EXECUTE format('SELECT array_agg(DISTINCT %I) FROM antigos', coluna) INTO ids;
+                afetados := afetados || COALESCE(ids, '{}');
+            END IF;
+
+            EXECUTE format('DELETE FROM desvio_temperatura_hora WHERE %I = ANY($1)', coluna) USING afetados;
+            EXECUTE format('DELETE FROM desvio_temperatura WHERE %I = ANY($1)', coluna) USING afetados;
+            EXECUTE format($sql$
+                WITH base AS (
+                    SELECT lp.id_cultura, lp.id_estufa, date_trunc('hour', m.data_hora_registro) AS hora,
+                           ABS(m.valor_medido - ((ci.temp_min + ci.temp_max) / 2)) AS desvio
+                    FROM (SELECT DISTINCT id_estufa, id_cultura FROM lote_plantio) lp
+                        JOIN condicao_ideal ci ON lp.id_cultura = ci.id_cultura
+                        JOIN sensor s ON lp.id_estufa = s.id_estufa AND s.tipo_sensor = 'Temperatura'
+                        JOIN medicao m ON s.id_sensor = m.id_sensor
+                    WHERE m.valor_medido IS NOT NULL AND lp.%I = ANY($1)
+                ),
+                por_hora AS (
+                    INSERT INTO desvio_temperatura_hora (id_cultura, id_estufa, hora, soma_desvio, registros)
+                    SELECT id_cultura, id_estufa, hora, SUM(desvio), COUNT(*)
+                    FROM base
+                    GROUP BY 1, 2, 3
+                )
+                INSERT INTO desvio_temperatura (id_cultura, id_estufa, soma_desvio, registros)
+                SELECT id_cultura, id_estufa, SUM(desvio), COUNT(*)
+                FROM base
+                GROUP BY 1, 2
+            $sql$, coluna) USING afetados;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql"""),
+    'TRG_MEDICAO_DESVIO_INSERT': (
+        """CREATE TRIGGER trg_medicao_desvio_insert
+        AFTER INSERT ON medicao
+        REFERENCING NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_resumo_desvio_medicao()"""),
+    'TRG_MEDICAO_DESVIO_UPDATE': (
+        """CREATE TRIGGER trg_medicao_desvio_update
+        AFTER UPDATE ON medicao
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_resumo_desvio_medicao()"""),
+    'TRG_MEDICAO_DESVIO_DELETE': (
+        """CREATE TRIGGER trg_medicao_desvio_delete
+        AFTER DELETE ON medicao
+        REFERENCING OLD TABLE AS antigos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_resumo_desvio_medicao()"""),
+    'TRG_LOTE_PLANTIO_DESVIO_INSERT': (
+        """CREATE TRIGGER trg_lote_plantio_desvio_insert
+        AFTER INSERT ON lote_plantio
+        REFERENCING NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_recalcular_desvio()"""),
+    'TRG_LOTE_PLANTIO_DESVIO_UPDATE': (
+        """CREATE TRIGGER trg_lote_plantio_desvio_update
+        AFTER UPDATE ON lote_plantio
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_recalcular_desvio()"""),
+    'TRG_LOTE_PLANTIO_DESVIO_DELETE': (
+        """CREATE TRIGGER trg_lote_plantio_desvio_delete
+        AFTER DELETE ON lote_plantio
+        REFERENCING OLD TABLE AS antigos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_recalcular_desvio()"""),
+    'TRG_CONDICAO_IDEAL_DESVIO_INSERT': (
+        """CREATE TRIGGER trg_condicao_ideal_desvio_insert
+        AFTER INSERT ON condicao_ideal
+        REFERENCING NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_recalcular_desvio()"""),
+    'TRG_CONDICAO_IDEAL_DESVIO_UPDATE': (
+        """CREATE TRIGGER trg_condicao_ideal_desvio_update
+        AFTER UPDATE ON condicao_ideal
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_recalcular_desvio()"""),
+    'TRG_CONDICAO_IDEAL_DESVIO_DELETE': (
+        """CREATE TRIGGER trg_condicao_ideal_desvio_delete
+        AFTER DELETE ON condicao_ideal
+        REFERENCING OLD TABLE AS antigos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_recalcular_desvio()"""),
+    'TRG_SENSOR_DESVIO_UPDATE': (
+        """CREATE TRIGGER trg_sensor_desvio_update
+        AFTER UPDATE ON sensor
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION fn_recalcular_desvio()"""),
+}
+
+# Recalculo completo das tabelas de resumo (bancos antigos ou após carga sem triggers)
+rollups = {
+    'CONSUMO_HORA': (
+        """INSERT INTO consumo_hora (id_estufa, id_recurso, hora, total, registros)
+        SELECT a.id_estufa, c.id_recurso, date_trunc('hour', c.data_hora_consumo),
+               SUM(c.quantidade_consumida), COUNT(*)
+        FROM consumo c
+        JOIN atuador a ON c.id_atuador = a.id_atuador
+        GROUP BY 1, 2, 3"""),
+    'CONSUMO_DIA': (
+        """INSERT INTO consumo_dia (id_estufa, id_recurso, dia, total, registros)
+        SELECT a.id_estufa, c.id_recurso, c.data_hora_consumo::date,
+               SUM(c.quantidade_consumida), COUNT(*)
+        FROM consumo c
+        JOIN atuador a ON c.id_atuador = a.id_atuador
+        GROUP BY 1, 2, 3"""),
+    'DESVIO_TEMPERATURA_HORA': (
+        """INSERT INTO desvio_temperatura_hora (id_cultura, id_estufa, hora, soma_desvio, registros)
+        SELECT lp.id_cultura, lp.id_estufa, date_trunc('hour', m.data_hora_registro),
+               SUM(ABS(m.valor_medido - ((ci.temp_min + ci.temp_max) / 2))), COUNT(*)
+        FROM (SELECT DISTINCT id_estufa, id_cultura FROM lote_plantio) lp
+        JOIN condicao_ideal ci ON lp.id_cultura = ci.id_cultura
+        JOIN sensor s ON lp.id_estufa = s.id_estufa AND s.tipo_sensor = 'Temperatura'
+        JOIN medicao m ON s.id_sensor = m.id_sensor
+        WHERE m.valor_medido IS NOT NULL
+        GROUP BY 1, 2, 3"""),
+    'DESVIO_TEMPERATURA': (
+        """INSERT INTO desvio_temperatura (id_cultura, id_estufa, soma_desvio, registros)
+        SELECT id_cultura, id_estufa, SUM(soma_desvio), SUM(registros)
+        FROM desvio_temperatura_hora
+        GROUP BY 1, 2"""),
+    'ALERTA_DIA': (
+        """INSERT INTO alerta_dia (id_estufa, seriedade, dia, total)
+        SELECT s.id_estufa, COALESCE(a.seriedade, ''), COALESCE(a.data_hora_alerta::date, '-infinity'), COUNT(*)
+        FROM alerta a
+        JOIN medicao m ON a.id_medicao = m.id_medicao
+        JOIN sensor s ON m.id_sensor = s.id_sensor
+        GROUP BY 1, 2, 3"""),
+}
+
+# Tabelas particionadas e quantos meses de partições criar adiante
+particoes = ('medicao', 'consumo')
+MESES_PARTICOES_A_FRENTE = 2
+
+# Índices para as consultas mais frequentes (monitor de IA e relatórios)
+indexes = {
+    'IDX_MEDICAO_SENSOR_DATA': (
+        """CREATE INDEX IF NOT EXISTS idx_medicao_sensor_data
+        ON medicao (id_sensor, data_hora_registro DESC)"""),
+    'IDX_MEDICAO_DATA_BRIN': (
+        """CREATE INDEX IF NOT EXISTS idx_medicao_data_brin
+        ON medicao USING BRIN (data_hora_registro)"""),
+    'IDX_SENSOR_ESTUFA_TIPO': (
+        """CREATE INDEX IF NOT EXISTS idx_sensor_estufa_tipo
+        ON sensor (id_estufa, tipo_sensor)"""),
+    'IDX_ALERTA_MEDICAO': (
+        """CREATE INDEX IF NOT EXISTS idx_alerta_medicao
+        ON alerta (id_medicao)"""),
+    'IDX_LOTE_PLANTIO_ESTUFA_COLHEITA': (
+        """CREATE INDEX IF NOT EXISTS idx_lote_plantio_estufa_colheita
+        ON lote_plantio (id_estufa, data_previsao_colheita)"""),
+    'IDX_TAREFA_PENDENTE_FUNCIONARIO': (
+        """CREATE INDEX IF NOT EXISTS idx_tarefa_pendente_funcionario
+        ON tarefa (id_funcionario) WHERE data_conclusao IS NULL"""),
+    'IDX_ESTUFA_FUNCIONARIO_ATIVO': (
+        """CREATE INDEX IF NOT EXISTS idx_estufa_funcionario_ativo
+        ON estufa_funcionario (id_estufa, id_funcionario) WHERE data_fim IS NULL"""),
+    'IDX_ATUADOR_ESTUFA': (
+        """CREATE INDEX IF NOT EXISTS idx_atuador_estufa
+        ON atuador (id_estufa)"""),
+    'IDX_CONSUMO_ATUADOR_RECURSO': (
+        """CREATE INDEX IF NOT EXISTS idx_consumo_atuador_recurso
+        ON consumo (id_atuador, id_recurso)"""),
+    'IDX_CONDICAO_IDEAL_CULTURA': (
+        """CREATE INDEX IF NOT EXISTS idx_condicao_ideal_cultura
+        ON condicao_ideal (id_cultura)"""),
+    # No máximo um episódio aberto por (estufa, tipo de sensor, direção)
+    'UX_EPISODIO_ALERTA_ABERTO': (
+        """CREATE UNIQUE INDEX IF NOT EXISTS ux_episodio_alerta_aberto
+        ON episodio_alerta (id_estufa, tipo_sensor, direcao) WHERE data_hora_fim IS NULL"""),
+}
+
+# Consultas representativas para medir o efeito dos índices (EXPLAIN ANALYZE)
+explain_queries = {
+    'ULTIMAS_MEDICOES': (
+        """SELECT m.valor_medido, m.data_hora_registro
+        FROM medicao m
+        JOIN sensor s ON m.id_sensor = s.id_sensor
+        WHERE s.tipo_sensor = 'Temperatura' AND s.id_estufa = 1
+        AND m.valor_medido IS NOT NULL
+        ORDER BY m.data_hora_registro DESC
+        LIMIT 5"""),
+    'MEDICOES_ULTIMAS_24H': (
+        """SELECT COUNT(*) FROM medicao
+        WHERE data_hora_registro >= NOW() - INTERVAL '24 hours'"""),
+    'ALERTAS_DA_MEDICAO': (
+        """SELECT id_alerta FROM alerta WHERE id_medicao = 1"""),
+    'CULTURA_ATIVA': (
+        """SELECT ci.temp_min, ci.temp_max, ci.umid_min, ci.umid_max
+        FROM lote_plantio lp
+        JOIN condicao_ideal ci ON lp.id_cultura = ci.id_cultura
+        WHERE lp.id_estufa = 1 AND lp.data_previsao_colheita >= CURRENT_DATE"""),
+    'TAREFAS_PENDENTES': (
+        """SELECT id_funcionario, COUNT(*) FROM tarefa
+        WHERE data_conclusao IS NULL AND id_funcionario IN (1, 2, 5)
+        GROUP BY id_funcionario"""),
+    'CONSUMO_POR_ESTUFA': (
+        """SELECT a.id_estufa, c.id_recurso, SUM(c.quantidade_consumida)
+        FROM atuador a
+        JOIN consumo c ON a.id_atuador = c.id_atuador
+        WHERE a.id_estufa = 1
+        GROUP BY a.id_estufa, c.id_recurso"""),
 }
 
 # Valores para serem inseridos no Banco de Dados
@@ -330,6 +857,12 @@ inserts = {
 
 # Valores para deletar as tabelas (ordem reversa devido às dependências)
 drop = {
+    'EPISODIO_ALERTA': "DROP TABLE IF EXISTS episodio_alerta",
+    'ALERTA_DIA': "DROP TABLE IF EXISTS alerta_dia",
+    'DESVIO_TEMPERATURA': "DROP TABLE IF EXISTS desvio_temperatura",
+    'DESVIO_TEMPERATURA_HORA': "DROP TABLE IF EXISTS desvio_temperatura_hora",
+    'CONSUMO_DIA': "DROP TABLE IF EXISTS consumo_dia",
+    'CONSUMO_HORA': "DROP TABLE IF EXISTS consumo_hora",
     'ESTUFA_FUNCIONARIO': "DROP TABLE IF EXISTS estufa_funcionario",
     'CONSUMO': "DROP TABLE IF EXISTS consumo",
     'LOTE_PLANTIO': "DROP TABLE IF EXISTS lote_plantio",
@@ -392,13 +925,8 @@ delete = {
 # Funções
 def connect_estufa():
     try:
-        cnx = psycopg2.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            port=os.getenv('DB_PORT', '5432'),
-            database=os.getenv('DB_NAME', 'planteligente'),
-            user=os.getenv('DB_USER', 'postgres'),
-            password=os.getenv('DB_PASSWORD', 'postgres')
-        )
+        # A conexão vem do pool compartilhado com o monitor de IA (db.py)
+        cnx = db.conectar()
         print("Conectado ao servidor PostgreSQL")
         cursor = cnx.cursor()
         cursor.execute("SELECT version();")
@@ -426,13 +954,18 @@ def drop_all_tables(connect):
             print("OK")
     connect.commit()
     cursor.close()
+    invalidar_caches()
 
 
-def create_all_tables(connect):
+def create_all_tables(connect, particionado=None):
     print("\n---CREATE ALL TABLES---")
+    if particionado is None:
+        particionado = os.getenv('DB_PARTICIONAR', '0') == '1'
     cursor = connect.cursor()
     for table_name in tables:
         table_description = tables[table_name]
+        if particionado:
+            table_description = tables_particionadas.get(table_name, table_description)
         try:
             print(f"Criando tabela {table_name}: ", end='')
             cursor.execute(table_description)
@@ -442,52 +975,427 @@ def create_all_tables(connect):
             print("OK")
     connect.commit()
     cursor.close()
+    if particionado:
+        create_partitions(connect)
+    create_all_indexes(connect)
+    create_all_triggers(connect)
 
 
-def show_table(connect):
-    print("\n---SELECIONAR TABELA---")
+def create_all_triggers(connect):
+    print("\n---CREATE ALL TRIGGERS---")
     cursor = connect.cursor()
+    for trigger_name in triggers:
+        trigger_description = triggers[trigger_name]
+        try:
+            print(f"Criando {trigger_name}: ", end='')
+            cursor.execute(trigger_description)
+        except Error as err:
+            print(err)
+        else:
+            print("OK")
+    connect.commit()
+    cursor.close()
+
+
+def rebuild_rollups(connect):
+    """
+    Cria (se faltarem) as tabelas de resumo e seus triggers num banco existente
+    e recalcula os resumos a partir das tabelas base
+    """
+    print("\n---RECALCULAR RESUMOS---")
+    cursor = connect.cursor()
+    try:
+        for rollup_name in rollups:
+            cursor.execute(tables[rollup_name].replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+        for trigger_name in triggers:
+            if trigger_name.startswith('TRG_'):
+                nome = trigger_name.lower()
+                tabela = triggers[trigger_name].split(" ON ", 1)[1].split()[0]
+                cursor.execute(f"DROP TRIGGER IF EXISTS {nome} ON {tabela}")
+            cursor.execute(triggers[trigger_name])
+        for rollup_name in rollups:
+            print(f"Recalculando {rollup_name}: ", end='')
+            cursor.execute(f"TRUNCATE {rollup_name.lower()}")
+            cursor.execute(rollups[rollup_name])
+            print(f"{cursor.rowcount} linhas")
+    except Error as err:
+        print(err)
+        connect.rollback()
+    else:
+        connect.commit()
+    cursor.close()
+
+
+def _add_months(dia, meses):
+    total = dia.year * 12 + dia.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _criar_particao(cursor, table_name, partition_name, inicio, fim):
+    """
+    Cria a partição [inicio, fim) e retorna quantas linhas vieram da DEFAULT.
+    O PostgreSQL recusa criar a partição se a DEFAULT já tem linhas do intervalo;
+    nesse caso desanexa a DEFAULT, cria a partição, move as linhas e anexa de volta.
+    Mover direto entre partições não dispara os triggers por comando da tabela mãe,
+    então os resumos não contam as linhas de novo.
+    """
+    default = f"{table_name}_default"
+    coluna = time_columns[table_name.upper()]
+    faixa = f"{coluna} >= %s AND {coluna} < %s"
+    criar = (f"CREATE TABLE {partition_name} PARTITION OF {table_name} "
+             f"FOR VALUES FROM ('{inicio}') TO ('{fim}')")
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {faixa})", (inicio, fim))
+    if not cursor.fetchone()[0]:
+        cursor.execute(criar)
+        return 0
+    cursor.execute(f"ALTER TABLE {table_name} DETACH PARTITION {default}")
+    cursor.execute(criar)
+    cursor.execute(f"""
+        WITH movidas AS (DELETE FROM {default} WHERE {faixa} RETURNING *)
+        INSERT INTO {partition_name} SELECT * FROM movidas""", (inicio, fim))
+    movidas = cursor.rowcount
+    cursor.execute(f"ALTER TABLE {table_name} ATTACH PARTITION {default} DEFAULT")
+    return movidas
+
+
+def _apagar_alertas_das_medicoes(cursor, table_name, partition_name, filtro="TRUE", parametros=()):
+    """
+    Antes da retenção apagar medições: apaga pela tabela alerta (sem FK para medicao no modo
+    particionado) os alertas delas. O trigger de alerta_dia ainda acha estufa e dia pela
+    medição e desconta a contagem; depois do DROP não haveria mais como descontar
+    """
+    if table_name != 'medicao':
+        return
+    cursor.execute(f"""
+        DELETE FROM alerta a USING {partition_name} m
+        WHERE a.id_medicao = m.id_medicao AND {filtro}""", parametros)
+
+
+def create_partitions(connect, meses_a_frente=MESES_PARTICOES_A_FRENTE, reter_meses=None, verboso=True):
+    """
+    Cria as partições mensais do mês atual até `meses_a_frente` meses adiante
+    (mais uma partição DEFAULT para datas fora do intervalo), movendo para cada partição
+    nova as linhas que já estavam na DEFAULT. Com `reter_meses`, desanexa e apaga as
+    partições que terminam antes desse limite e apaga da DEFAULT as linhas anteriores a ele,
+    junto com os alertas dessas medições.
+    Cada partição é criada/removida na própria transação: um erro não desfaz as outras.
+    Com verboso=False só informa o que mudou (uso na inicialização e na ingestão).
+    """
+    if verboso:
+        print("\n---PARTIÇÕES---")
+    cursor = connect.cursor()
+    mes_atual = date.today().replace(day=1)
+    for table_name in particoes:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", (table_name,))
+        result = cursor.fetchone()
+        if not result or result[0] != 'p':
+            if verboso:
+                print(f"Tabela {table_name} não é particionada, ignorando")
+            continue
+
+        default = f"{table_name}_default"
+        cursor.execute("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON i.inhrelid = c.oid
+            JOIN pg_class p ON i.inhparent = p.oid
+            WHERE p.relname = %s
+        """, (table_name,))
+        existentes = {nome for (nome,) in cursor.fetchall()}
+        connect.commit()
+
+        passos = []
+        if default not in existentes:
+            passos.append((f"Partição {default}",
+                           lambda: cursor.execute(f"CREATE TABLE {default} PARTITION OF {table_name} DEFAULT")))
+        for i in range(meses_a_frente + 1):
+            inicio = _add_months(mes_atual, i)
+            partition_name = f"{table_name}_{inicio:%Y_%m}"
+            if partition_name in existentes:
+                if verboso:
+                    print(f"Partição {partition_name}: já existe")
+                continue
+            passos.append((f"Partição {partition_name}",
+                           lambda p=partition_name, a=inicio: _criar_particao(
+                               cursor, table_name, p, a, _add_months(a, 1))))
+
+        if reter_meses:
+            limite = _add_months(mes_atual, -reter_meses)
+            for partition_name in sorted(existentes):
+                match = re.fullmatch(rf"{table_name}_(\d{{4}})_(\d{{2}})", partition_name)
+                if not match:
+                    continue
+                inicio = date(int(match.group(1)), int(match.group(2)), 1)
+                if _add_months(inicio, 1) <= limite:
+                    def remover(p=partition_name):
+                        _apagar_alertas_das_medicoes(cursor, table_name, p)
+                        cursor.execute(f"ALTER TABLE {table_name} DETACH PARTITION {p}")
+                        cursor.execute(f"DROP TABLE {p}")
+                    passos.append((f"Removendo partição antiga {partition_name}", remover))
+
+            def limpar_default():
+                coluna = time_columns[table_name.upper()]
+                _apagar_alertas_das_medicoes(cursor, table_name, default, f"m.{coluna} < %s", (limite,))
+                cursor.execute(f"DELETE FROM {default} WHERE {coluna} < %s", (limite,))
+                return cursor.rowcount
+            passos.append((f"Removendo de {default} as linhas anteriores a {limite}", limpar_default))
+
+        for descricao, passo in passos:
+            try:
+                print(f"{descricao}: ", end='')
+                linhas = passo()
+            except Error as err:
+                print(err)
+                connect.rollback()
+            else:
+                connect.commit()
+                print(f"OK ({linhas} linhas)" if linhas else "OK")
+    cursor.close()
+
+
+def manage_partitions(connect):
+    print("\n---GERENCIAR PARTIÇÕES---")
+    try:
+        reter = input("Meses de histórico a manter (vazio = manter tudo): ").strip()
+        create_partitions(connect, reter_meses=int(reter) if reter else None)
+    except ValueError:
+        print("❌ Erro: Digite um número válido")
+
+
+def create_all_indexes(connect):
+    print("\n---CREATE ALL INDEXES---")
+    cursor = connect.cursor()
+    for index_name in indexes:
+        index_description = indexes[index_name]
+        try:
+            print(f"Criando índice {index_name}: ", end='')
+            cursor.execute(index_description)
+        except Error as err:
+            print(err)
+        else:
+            print("OK")
+    connect.commit()
+    cursor.close()
+
+
+_INDICE = re.compile(r"\s*CREATE (UNIQUE )?INDEX IF NOT EXISTS (\w+)\s+ON (\w+)\s(.*)", re.S)
+
+
+def _criar_indice_particionado(cursor, index_description):
+    """
+    CREATE INDEX CONCURRENTLY não é aceito em tabela particionada. O índice da tabela mãe
+    é criado com ON ONLY (vazio, inválido e instantâneo); cada partição ganha o seu índice
+    em modo CONCURRENTLY e é anexada a ele. Quando todas estão anexadas o índice fica válido.
+    """
+    unico, index_name, table_name, definicao = _INDICE.match(index_description).groups()
+    unico = unico or ""
+    cursor.execute(f"CREATE {unico}INDEX IF NOT EXISTS {index_name} ON ONLY {table_name} {definicao}")
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON i.inhrelid = c.oid
+        JOIN pg_class p ON i.inhparent = p.oid
+        WHERE p.relname = %s
+        ORDER BY c.relname
+    """, (table_name,))
+    for (partition_name,) in cursor.fetchall():
+        # Partição que já tem índice anexado (criado junto com o da tabela mãe) fica como está
+        cursor.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM pg_inherits i
+                JOIN pg_class pai ON i.inhparent = pai.oid
+                JOIN pg_index x ON x.indexrelid = i.inhrelid
+                JOIN pg_class t ON x.indrelid = t.oid
+                WHERE pai.relname = %s AND t.relname = %s
+            )""", (index_name, partition_name))
+        if cursor.fetchone()[0]:
+            continue
+        partition_index = f"{index_name}_{partition_name[len(table_name) + 1:]}"
+        cursor.execute(f"CREATE {unico}INDEX CONCURRENTLY IF NOT EXISTS {partition_index} "
+                       f"ON {partition_name} {definicao}")
+        cursor.execute(f"ALTER INDEX {index_name} ATTACH PARTITION {partition_index}")
+
+
+def migrate_indexes(connect):
+    """
+    Cria os índices em um banco já existente sem bloquear escritas
+    (CREATE INDEX CONCURRENTLY precisa rodar fora de transação; nas tabelas particionadas,
+    partição por partição) e atualiza as estatísticas.
+    Também cria a tabela episodio_alerta, se faltar.
+    """
+    print("\n---MIGRAÇÃO DE ÍNDICES---")
+    connect.commit()
+    autocommit = connect.autocommit
+    connect.autocommit = True
+    cursor = connect.cursor()
+    try:
+        cursor.execute(tables['EPISODIO_ALERTA'].replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+        supressor_alertas.invalidar()
+        cursor.execute("SELECT relname FROM pg_class WHERE relkind = 'p'")
+        particionadas = {nome for (nome,) in cursor.fetchall()}
+        for index_name in indexes:
+            index_description = indexes[index_name]
+            try:
+                print(f"Criando índice {index_name}: ", end='')
+                if _INDICE.match(index_description).group(3) in particionadas:
+                    _criar_indice_particionado(cursor, index_description)
+                else:
+                    cursor.execute(re.sub(r"CREATE (UNIQUE )?INDEX", r"CREATE \1INDEX CONCURRENTLY",
+                                          index_description, count=1))
+            except Error as err:
+                print(err)
+            else:
+                print("OK")
+        for table_name in ('medicao', 'sensor', 'alerta', 'lote_plantio', 'tarefa',
+                           'estufa_funcionario', 'atuador', 'consumo', 'condicao_ideal'):
+            try:
+                cursor.execute(f"ANALYZE {table_name}")
+            except Error as err:
+                print(f"ANALYZE {table_name}: {err}")
+    finally:
+        cursor.close()
+        connect.autocommit = autocommit
+
+
+def explain_indices(connect):
+    """Roda EXPLAIN ANALYZE nas consultas de referência; compare antes e depois de migrate_indexes"""
+    print("\n---EXPLAIN ANALYZE---")
+    cursor = connect.cursor()
+    resultados = {}
+    for query_name in explain_queries:
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {explain_queries[query_name]}")
+            plano = cursor.fetchone()[0][0]
+        except Error as err:
+            print(f"{query_name}: {err}")
+            connect.rollback()
+            continue
+        resultados[query_name] = plano['Execution Time']
+        print(f"{query_name}: {plano['Execution Time']:.3f} ms ({plano['Plan']['Node Type']})")
+    connect.rollback()
+    cursor.close()
+    return resultados
+
+
+# Coluna de data/hora usada no filtro por período de cada tabela
+time_columns = {
+    'MEDICAO': 'data_hora_registro',
+    'CONSUMO': 'data_hora_consumo',
+    'ALERTA': 'data_hora_alerta',
+    'TAREFA': 'data_agendada',
+    'CONSUMO_HORA': 'hora',
+    'CONSUMO_DIA': 'dia',
+    'DESVIO_TEMPERATURA_HORA': 'hora',
+    'ALERTA_DIA': 'dia',
+    'EPISODIO_ALERTA': 'data_hora_inicio',
+}
+
+
+def _key_column(name):
+    """Coluna BIGSERIAL da tabela, usada para paginação por chave (keyset)"""
+    match = re.search(r"(\w+) BIGSERIAL", tables[name])
+    return match.group(1) if match else None
+
+
+def stream_table(connect, name, where=None, desde=None, ate=None, apos=None,
+                 limite=None, tamanho_pagina=100):
+    """
+    Lê uma tabela em páginas com um cursor no servidor (named cursor), sem carregar
+    tudo na memória. Gera tuplas (nomes_das_colunas, linhas_da_pagina).
+    `where` é um filtro SQL livre; `desde`/`ate` filtram pela coluna de data da tabela;
+    `apos` retoma a leitura depois desse valor da chave (paginação keyset).
+    O cursor nomeado precisa de uma transação: se quem chamou já tinha uma aberta, ela
+    continua aberta e intocada no fim; senão, a transação aberta aqui é encerrada.
+    """
+    filtros = []
+    params = {}
+    if where:
+        filtros.append(f"({where})")
+    time_column = time_columns.get(name)
+    if time_column and desde is not None:
+        filtros.append(f"{time_column} >= %(desde)s")
+        params['desde'] = desde
+    if time_column and ate is not None:
+        filtros.append(f"{time_column} < %(ate)s")
+        params['ate'] = ate
+    key_column = _key_column(name)
+    if key_column and apos is not None:
+        filtros.append(f"{key_column} > %(apos)s")
+        params['apos'] = apos
+
+    select = f"SELECT * FROM {name.lower()}"
+    if filtros:
+        select += " WHERE " + " AND ".join(filtros)
+    if key_column:
+        select += f" ORDER BY {key_column}"
+    if limite:
+        select += " LIMIT %(limite)s"
+        params['limite'] = limite
+
+    transacao_de_fora = connect.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE
+    cursor = connect.cursor(name=f"stream_{name.lower()}")
+    cursor.itersize = tamanho_pagina
+    try:
+        cursor.execute(select, params)
+        while True:
+            rows = cursor.fetchmany(tamanho_pagina)
+            if not rows:
+                break
+            yield [desc[0] for desc in cursor.description], rows
+    finally:
+        cursor.close()
+        if not transacao_de_fora:
+            connect.commit()
+
+
+def show_table(connect, tamanho_pagina=50):
+    print("\n---SELECIONAR TABELA---")
     # Lista os nomes das tabelas disponíveis
     available_tables = list(tables.keys())
     print("Tabelas disponíveis:")
     for table_name in available_tables:
         print(f"- {table_name}")
-        
+
+    paginas = None
     try:
         name = input("\nDigite o nome da tabela que deseja consultar: ").upper()
-        
+
         if name not in available_tables:
             print(f"❌ Erro: Tabela '{name}' não encontrada ou indisponível.")
             return
 
-        select = f"SELECT * FROM {name.lower()}"
-        cursor.execute(select)
-        
-        # --- NOVO TRECHO PARA MOSTRAR OS NOMES DAS COLUNAS ---
-        print(f"\nTABELA {name}")
-        
-        # Obtém os nomes das colunas usando cursor.description
-        # Cada tupla em cursor.description contém (name, type_code, ...)
-        column_names = [desc[0] for desc in cursor.description]
-        
-        # Imprime os nomes das colunas para indicar o significado de cada dado
-        print("COLUNAS:")
-        print(column_names)
-        print("-" * 50) # Separador visual
+        where = input("Filtro WHERE opcional (ex: id_sensor = 1; vazio = sem filtro): ").strip() or None
+        desde = pedir_periodo() if name in time_columns else None
 
-        # --- FIM DO NOVO TRECHO ---
-        
-        myresult = cursor.fetchall()
-        if myresult:
-            for x in myresult:
+        # Lê página por página com cursor no servidor: a memória não cresce com a tabela
+        paginas = stream_table(connect, name, where=where, desde=desde, tamanho_pagina=tamanho_pagina)
+
+        print(f"\nTABELA {name}")
+        total = 0
+        for numero, (column_names, rows) in enumerate(paginas, start=1):
+            if numero == 1:
+                # Imprime os nomes das colunas para indicar o significado de cada dado
+                print("COLUNAS:")
+                print(column_names)
+                print("-" * 50) # Separador visual
+            for x in rows:
                 print(x)
-        else:
+            total += len(rows)
+            if len(rows) < tamanho_pagina:
+                break
+            resposta = input(f"-- Página {numero} ({total} linhas). Enter = próxima página, q = sair: ")
+            if resposta.strip().lower() == 'q':
+                break
+
+        if total == 0:
             print("Tabela vazia")
-            
+
     except Error as err:
         print(f"❌ Erro ao consultar a tabela: {err}")
+        connect.rollback()
     finally:
-        cursor.close()
+        if paginas is not None:
+            paginas.close()
 
 
 def insert_value(connect):
@@ -514,6 +1422,7 @@ def insert_value(connect):
         print("Registro inserido com sucesso")
     connect.commit()
     cursor.close()
+    invalidar_caches()
 
 
 def update_value(connect):
@@ -539,6 +1448,7 @@ def update_value(connect):
         print("Atributo atualizado")
     connect.commit()
     cursor.close()
+    invalidar_caches()
 
 
 def delete_value(connect):
@@ -566,6 +1476,7 @@ def delete_value(connect):
         print("Deleção concluída")
     connect.commit()
     cursor.close()
+    invalidar_caches()
 
 
 def insert_test(connect):
@@ -582,6 +1493,7 @@ def insert_test(connect):
             print("OK")
     connect.commit()
     cursor.close()
+    invalidar_caches()
 
 
 def update_test(connect):
@@ -598,6 +1510,7 @@ def update_test(connect):
             print("OK")
     connect.commit()
     cursor.close()
+    invalidar_caches()
 
 
 def delete_test(connect):
@@ -614,30 +1527,54 @@ def delete_test(connect):
             print("OK")
     connect.commit()
     cursor.close()
+    invalidar_caches()
 
 
-def consulta1(connect):
-    query = """
+def consulta1(connect, desde=None, ate=None):
+    # Lê dos resumos mantidos por trigger: diário para o histórico todo,
+    # por hora quando há período (desde/ate com granularidade de hora)
+    if desde is None and ate is None:
+        resumo, coluna = "consumo_dia", "dia"
+    else:
+        resumo, coluna = "consumo_hora", "hora"
+
+    query = f"""
         SELECT
             e.nome AS estufa,
             r.nome_recurso AS recurso,
-            SUM(c.quantidade_consumida) AS total_consumido
-        FROM estufa e
-        JOIN atuador a ON e.id_estufa = a.id_estufa
-        JOIN consumo c ON a.id_atuador = c.id_atuador
-        JOIN recurso r ON c.id_recurso = r.id_recurso
+            SUM(cr.total) AS total_consumido
+        FROM {resumo} cr
+        JOIN estufa e ON cr.id_estufa = e.id_estufa
+        JOIN recurso r ON cr.id_recurso = r.id_recurso
+        WHERE (%(desde)s::timestamp IS NULL OR cr.{coluna} >= date_trunc('hour', %(desde)s::timestamp))
+        AND (%(ate)s::timestamp IS NULL OR cr.{coluna} < %(ate)s::timestamp)
         GROUP BY e.nome, r.nome_recurso
+        HAVING SUM(cr.registros) > 0
         ORDER BY e.nome, total_consumido DESC
     """
 
     cursor = connect.cursor()
-    cursor.execute(query)
+    cursor.execute(query, {'desde': desde, 'ate': ate})
     rows = cursor.fetchall()
     cursor.close()
 
     return rows
 
+def pedir_periodo():
+    """Pergunta os últimos N dias para o relatório; vazio = todo o histórico"""
+    dias = input("Últimos N dias (vazio = todo o histórico): ").strip()
+    if not dias:
+        return None
+    try:
+        return datetime.now() - timedelta(days=int(dias))
+    except ValueError:
+        print("❌ Erro: Digite um número válido. Mostrando todo o histórico.")
+        return None
+
+
 def exibir_tabela1(rows):
+    from tabulate import tabulate
+
     if not rows:
         print("Nenhum dado encontrado.")
         return
@@ -645,7 +1582,7 @@ def exibir_tabela1(rows):
     print("\nTabela – Consumo Total por Estufa e Recurso\n")
     print(tabulate(rows, headers=["Estufa", "Recurso", "Total Consumido"], tablefmt="fancy_grid"))
 
-def exibir_graficos1(rows):
+def exibir_graficos1(rows, **opcoes):
     if not rows:
         return
 
@@ -656,38 +1593,21 @@ def exibir_graficos1(rows):
             dados_por_recurso[recurso] = []
         dados_por_recurso[recurso].append((estufa, total))
 
-    recursos = list(dados_por_recurso.keys())
-
-    # Subplots (um gráfico por recurso)
-    fig, axes = plt.subplots(len(recursos), 1, figsize=(12, 4 * len(recursos)))
-
-    if len(recursos) == 1:
-        axes = [axes]
-
-    for i, recurso in enumerate(recursos):
-        dados = dados_por_recurso[recurso]
-
-        estufas = [item[0] for item in dados]
-        totais = [item[1] for item in dados]
-
-        ax = axes[i]
-        ax.bar(estufas, totais)
-
-        ax.set_title(f"Consumo do recurso: {recurso}")
-        ax.set_xlabel("Estufa")
-        ax.set_ylabel("Total Consumido")
-        ax.set_xticks(range(len(estufas)))
-        ax.set_xticklabels(estufas, rotation=45)
-
-    plt.tight_layout()
-    plt.show()
+    # Um painel por recurso
+    paineis = [
+        (f"Consumo do recurso: {recurso}", "Estufa", "Total Consumido",
+         [item[0] for item in dados], [item[1] for item in dados])
+        for recurso, dados in dados_por_recurso.items()
+    ]
+    return graficos.exibir("consulta1", paineis, **opcoes)
 
 def consulta2(connect):
+    # Conta pelo resumo alerta_dia (mantido por trigger), sem passar por medicao/alerta
     query = """
     SELECT
         f.nome AS nome_funcionario,
         e.nome AS estufa,
-        COUNT(al.id_alerta) AS quantidade_alertas_criticos
+        SUM(ad.total) AS quantidade_alertas_criticos
     FROM
         funcionario f
     JOIN
@@ -695,17 +1615,13 @@ def consulta2(connect):
     JOIN
         estufa e ON ef.id_estufa = e.id_estufa
     JOIN
-        sensor s ON e.id_estufa = s.id_estufa
-    JOIN
-        medicao m ON s.id_sensor = m.id_sensor
-    JOIN
-        alerta al ON m.id_medicao = al.id_medicao
+        alerta_dia ad ON e.id_estufa = ad.id_estufa
     WHERE
-        al.seriedade = 'Alta'
+        ad.seriedade = 'Alta'
     GROUP BY
         f.nome, e.nome
     HAVING
-        COUNT(al.id_alerta) > 0
+        SUM(ad.total) > 0
     ORDER BY
         f.nome, quantidade_alertas_criticos DESC
     """
@@ -718,6 +1634,8 @@ def consulta2(connect):
     return rows
 
 def exibir_tabela2(rows):
+    from tabulate import tabulate
+
     if not rows:
         print("Nenhum alerta crítico encontrado.")
         return
@@ -727,7 +1645,7 @@ def exibir_tabela2(rows):
                    headers=["Funcionário", "Estufa", "Alertas Críticos"],
                    tablefmt="fancy_grid"))
 
-def exibir_graficos2(rows):
+def exibir_graficos2(rows, **opcoes):
     if not rows:
         return
 
@@ -738,63 +1656,52 @@ def exibir_graficos2(rows):
             dados_por_estufa[estufa] = []
         dados_por_estufa[estufa].append((funcionario, qtd))
 
-    estufas = list(dados_por_estufa.keys())
-
-    fig, axes = plt.subplots(len(estufas), 1, figsize=(12, 5 * len(estufas)))
-
-    if len(estufas) == 1:
-        axes = [axes]
-
-    for i, estufa in enumerate(estufas):
-        dados = dados_por_estufa[estufa]
-        funcionarios = [item[0] for item in dados]
-        totais = [item[1] for item in dados]
-
-        ax = axes[i]
-        ax.bar(funcionarios, totais)
-        ax.set_title(f"Alertas Críticos na {estufa}")
-        ax.set_xlabel("Funcionário")
-        ax.set_ylabel("Total de Alertas Críticos")
-        ax.set_xticklabels(funcionarios, rotation=45)
-
-    plt.tight_layout()
-    plt.show()
+    # Um painel por estufa, em grade e paginado em várias figuras quando são muitas
+    paineis = [
+        (f"Alertas Críticos na {estufa}", "Funcionário", "Total de Alertas Críticos",
+         [item[0] for item in dados], [item[1] for item in dados])
+        for estufa, dados in dados_por_estufa.items()
+    ]
+    return graficos.exibir("consulta2", paineis, **opcoes)
+
+def consulta3(connect, desde=None):
+    # Lê os acumuladores mantidos por trigger: total por (cultura, estufa) para o
+    # histórico todo, por hora quando há período (últimas 24h, 7 dias, ...)
+    if desde is None:
+        resumo, filtro = "desvio_temperatura", ""
+    else:
+        resumo, filtro = "desvio_temperatura_hora", "WHERE d.hora >= date_trunc('hour', %(desde)s::timestamp)"
 
-def consulta3(connect):
-    query = """
+    query = f"""
     SELECT
         c.nome_popular AS cultura,
         e.nome AS estufa,
-        AVG(ABS(m.valor_medido - ((ci.temp_min + ci.temp_max) / 2))) AS desvio_medio_temperatura
+        SUM(d.soma_desvio) / SUM(d.registros) AS desvio_medio_temperatura
     FROM
-        cultura c
-    JOIN
-        condicao_ideal ci ON c.id_cultura = ci.id_cultura
+        {resumo} d
     JOIN
-        lote_plantio lp ON c.id_cultura = lp.id_cultura
+        cultura c ON d.id_cultura = c.id_cultura
     JOIN
-        estufa e ON lp.id_estufa = e.id_estufa
-    JOIN
-        sensor s ON e.id_estufa = s.id_estufa
-    JOIN
-        medicao m ON s.id_sensor = m.id_sensor
-    WHERE
-        s.tipo_sensor = 'Temperatura'
-        AND m.valor_medido IS NOT NULL
+        estufa e ON d.id_estufa = e.id_estufa
+    {filtro}
     GROUP BY
         c.nome_popular, e.nome
+    HAVING
+        SUM(d.registros) > 0
     ORDER BY
         desvio_medio_temperatura DESC
     """
 
     cursor = connect.cursor()
-    cursor.execute(query)
+    cursor.execute(query, {'desde': desde})
     rows = cursor.fetchall()
     cursor.close()
 
     return rows
 
 def exibir_tabela3(rows):
+    from tabulate import tabulate
+
     if not rows:
         print("Nenhum dado encontrado.")
         return
@@ -807,7 +1714,7 @@ def exibir_tabela3(rows):
         tablefmt="fancy_grid"
     ))
 
-def exibir_graficos3(rows):
+def exibir_graficos3(rows, **opcoes):
     if not rows:
         return
 
@@ -815,26 +1722,19 @@ def exibir_graficos3(rows):
     labels = [f"{cultura} - {estufa}" for cultura, estufa, _ in rows]
     valores = [desvio for _, _, desvio in rows]
 
-    plt.figure(figsize=(14, 6))
-    plt.bar(labels, valores)
-    plt.ylabel("Desvio Médio (°C)")
-    plt.title("Desvio Médio de Temperatura por Cultura e Estufa")
-    plt.xticks(rotation=45, ha="right")
-
-    plt.tight_layout()
+    painel = ("Desvio Médio de Temperatura por Cultura e Estufa", "", "Desvio Médio (°C)", labels, valores)
+    return graficos.exibir("consulta3", [painel], **opcoes)
 
 def consulta_extra(connect):
     select_query = """
     SELECT 
         e.nome AS estufa,
-        COUNT(DISTINCT a.id_alerta) AS total_alertas,
-        COUNT(DISTINCT CASE WHEN a.seriedade = 'Alta' THEN a.id_alerta END) AS alertas_alta,
-        COUNT(DISTINCT CASE WHEN a.seriedade = 'Média' THEN a.id_alerta END) AS alertas_media,
-        COUNT(DISTINCT CASE WHEN a.seriedade = 'Baixa' THEN a.id_alerta END) AS alertas_baixa
+        COALESCE(SUM(ad.total), 0) AS total_alertas,
+        COALESCE(SUM(ad.total) FILTER (WHERE ad.seriedade = 'Alta'), 0) AS alertas_alta,
+        COALESCE(SUM(ad.total) FILTER (WHERE ad.seriedade = 'Média'), 0) AS alertas_media,
+        COALESCE(SUM(ad.total) FILTER (WHERE ad.seriedade = 'Baixa'), 0) AS alertas_baixa
     FROM estufa e
-    LEFT JOIN sensor s ON e.id_estufa = s.id_estufa
-    LEFT JOIN medicao m ON s.id_sensor = m.id_sensor
-    LEFT JOIN alerta a ON m.id_medicao = a.id_medicao
+    LEFT JOIN alerta_dia ad ON e.id_estufa = ad.id_estufa
     WHERE e.status = 'Ativa'
     GROUP BY e.nome
     ORDER BY total_alertas DESC
@@ -861,9 +1761,33 @@ def inserir_medicao_com_ia(connect):
         print(f"❌ Erro: {e}")
 
 
+def concluir_tarefa_menu(connect):
+    print("\n---CONCLUIR TAREFA---")
+    try:
+        id_tarefa = int(input("ID da Tarefa: "))
+    except ValueError:
+        print("❌ Erro: Digite um ID numérico válido")
+        return
+    if concluir_tarefa(connect, id_tarefa):
+        print(f"✅ Tarefa #{id_tarefa} concluída!")
+    else:
+        print("❌ Tarefa não encontrada ou já concluída!")
+
+
+def relatorio_sql():
+    """Consultas que mais consumiram tempo desde o início do programa"""
+    print("\n---RELATÓRIO DE CONSULTAS SQL---")
+    ordem = input("Ordenar por (total/media/maximo/chamadas) [total]: ").strip() or "total"
+    if ordem not in ('total', 'media', 'maximo', 'chamadas'):
+        print("Ordem inválida, usando total.")
+        ordem = "total"
+    print(perfilador.relatorio(n=15, ordem=ordem))
+
+
 def exit_db(connect):
     print("\n---EXIT DB---")
-    connect.close()
+    db.devolver(connect)
+    db.fechar_pool()
     print("Conexão com o banco de dados foi encerrada!")
 
 
@@ -895,17 +1819,25 @@ def crud_estufa(connect):
 
 
 # Main
-try:
-    # Estabelece Conexão com o DB
-    con = connect_estufa()
+def main():
+    try:
+        # Estabelece Conexão com o DB
+        con = connect_estufa()
     
-    if con is None:
-        print("Não foi possível conectar ao banco de dados.")
-        exit(1)
+        if con is None:
+            print("Não foi possível conectar ao banco de dados.")
+            exit(1)
+
+        # Partições do mês atual e dos próximos já prontas antes das primeiras medições
+        create_partitions(con, verboso=False)
 
-    power_up = 1
-    while power_up == 1:
-        interface = """\n       ---MENU---
+        # Com CACHE_IA=1 ou CACHE_IA_ARQUIVO, alertas de contexto equivalente reaproveitam a descrição do Gemini
+        if cache_ia_pela_config() is not None:
+            print("🗃️  Cache de tarefas da IA ativo")
+
+        power_up = 1
+        while power_up == 1:
+            interface = """\n       ---MENU---
         1.  CRUD ESTUFA COMPLETO
         2.  TESTE - Create all tables
         3.  TESTE - Insert all values
@@ -924,83 +1856,111 @@ try:
         16. DELETE VALUES (Manual)
         17. CLEAR ALL ESTUFA
         18. 🤖 INSERIR MEDIÇÃO COM ANÁLISE IA
+        19. MIGRAR ÍNDICES (banco existente)
+        20. EXPLAIN ANALYZE das consultas principais
+        21. GERENCIAR PARTIÇÕES (medicao/consumo)
+        22. RECALCULAR RESUMOS (consumo, desvio de temperatura, alertas)
+        23. CONCLUIR TAREFA
+        24. RELATÓRIO DE CONSULTAS SQL (PERFIL_SQL=1)
         0.  DISCONNECT DB\n """
-        print(interface)
+            print(interface)
 
-        choice = int(input("Opção: "))
-        if choice < 0 or choice > 18:
-            print("Erro tente novamente!")
-            continue
+            choice = int(input("Opção: "))
+            if choice < 0 or choice > 24:
+                print("Erro tente novamente!")
+                continue
+
+            if choice == 0:
+                exit_db(con)
+                print("Muito obrigada(o).")
+                break
+
+            if choice == 1:
+                crud_estufa(con)
+
+            if choice == 2:
+                create_all_tables(con)
 
-        if choice == 0:
-            exit_db(con)
-            print("Muito obrigada(o).")
-            break
+            if choice == 3:
+                insert_test(con)
 
-        if choice == 1:
-            crud_estufa(con)
+            if choice == 4:
+                update_test(con)
 
-        if choice == 2:
-            create_all_tables(con)
+            if choice == 5:
+                delete_test(con)
 
-        if choice == 3:
-            insert_test(con)
+            # CONSULTA 01
+            if choice == 6:
+                rows = consulta1(con, desde=pedir_periodo())
+                exibir_tabela1(rows)
 
-        if choice == 4:
-            update_test(con)
+            if choice == 7:
+                rows = consulta1(con, desde=pedir_periodo())
+                exibir_graficos1(rows)
 
-        if choice == 5:
-            delete_test(con)
+            # CONSULTA 02
+            if choice == 8:
+                rows = consulta2(con)
+                exibir_tabela2(rows)
 
-        # CONSULTA 01
-        if choice == 6:
-            rows = consulta1(con)
-            exibir_tabela1(rows)
+            if choice == 9:
+                rows = consulta2(con)
+                exibir_graficos2(rows)
 
-        if choice == 7:
-            rows = consulta1(con)
-            exibir_graficos1(rows)
+            # CONSULTA 03
+            if choice == 10:
+                rows = consulta3(con, desde=pedir_periodo())
+                exibir_tabela3(rows)
 
-        # CONSULTA 02
-        if choice == 8:
-            rows = consulta2(con)
-            exibir_tabela2(rows)
+            if choice == 11:
+                rows = consulta3(con, desde=pedir_periodo())
+                exibir_graficos3(rows)
 
-        if choice == 9:
-            rows = consulta2(con)
-            exibir_graficos2(rows)
+            if choice == 12:
+                consulta_extra(con)
 
-        # CONSULTA 03
-        if choice == 10:
-            rows = consulta3(con)
-            exibir_tabela3(rows)
+            if choice == 13:
+                show_table(con)
 
-        if choice == 11:
-            rows = consulta3(con)
-            exibir_graficos3(rows)
+            if choice == 14:
+                insert_value(con)
 
-        if choice == 12:
-            consulta_extra(con)
+            if choice == 15:
+                update_value(con)
 
-        if choice == 13:
-            show_table(con)
+            if choice == 16:
+                delete_value(con)
 
-        if choice == 14:
-            insert_value(con)
+            if choice == 17:
+                drop_all_tables(con)
 
-        if choice == 15:
-            update_value(con)
+            if choice == 18:
+                inserir_medicao_com_ia(con)
 
-        if choice == 16:
-            delete_value(con)
+            if choice == 19:
+                migrate_indexes(con)
 
-        if choice == 17:
-            drop_all_tables(con)
+            if choice == 20:
+                explain_indices(con)
 
-        if choice == 18:
-            inserir_medicao_com_ia(con)
+            if choice == 21:
+                manage_partitions(con)
+
+            if choice == 22:
+                rebuild_rollups(con)
+
+            if choice == 23:
+                concluir_tarefa_menu(con)
+
+            if choice == 24:
+                relatorio_sql()
+
+        con.close()
+
+    except Error as err:
+        print(f"Erro na conexão com o banco de dados: {err}")
 
-    con.close()
 
-except Error as err:
-    print(f"Erro na conexão com o banco de dados: {err}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
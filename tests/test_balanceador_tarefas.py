@@ -0,0 +1,124 @@
+import threading
+from ai import BalanceadorTarefas
+
+
+class ConexaoFalsa:
+    """Responde às duas consultas de BalanceadorTarefas.carregar"""
+    def __init__(self, pendentes, alocacoes):
+        self.pendentes = pendentes
+        self.alocacoes = alocacoes
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, parametros=None):
+        self.ultima = sql
+
+    def fetchall(self):
+        if "estufa_funcionario" in self.ultima:
+            return list(self.alocacoes)
+        return [(f, f"Funcionário {f}", n) for f, n in self.pendentes.items()]
+
+    def close(self):
+        pass
+
+
+def balanceador(pendentes, alocacoes=()):
+    return BalanceadorTarefas(ttl=3600), ConexaoFalsa(dict(pendentes), alocacoes)
+
+
+def test_escolhe_o_menos_carregado_da_equipe():
+    b, conexao = balanceador({1: 3, 2: 1, 3: 0}, [(10, 1), (10, 2)])
+    escolhido = b.reservar(conexao, 10)
+    assert (escolhido['id_funcionario'], escolhido['tarefas_pendentes']) == (2, 1)
+    # Empate (2 x 2): o menor id
+    assert b.reservar(conexao, 10)['id_funcionario'] == 2
+    assert b.reservar(conexao, 10)['id_funcionario'] == 1
+    # Estufa sem equipe ativa: todos os funcionários
+    assert b.reservar(conexao, 99)['id_funcionario'] == 3
+
+
+def test_sem_funcionarios():
+    b, conexao = balanceador({})
+    assert b.reservar(conexao, 10) is None
+
+
+def test_liberar_e_concluir_devolvem_a_vaga():
+    b, conexao = balanceador({1: 0, 2: 0}, [(10, 1), (10, 2)])
+    assert b.reservar(conexao, 10)['id_funcionario'] == 1
+    b.liberar(1)
+    assert b.reservar(conexao, 10)['id_funcionario'] == 1
+    b.confirmar(1)
+    assert b.reservar(conexao, 10)['id_funcionario'] == 2
+    b.confirmar(2)
+    b.concluir(1)
+    assert b.pendentes == {1: 0, 2: 1}
+    # Liberar sem reserva em andamento não mexe na contagem
+    b.liberar(2)
+    assert b.pendentes == {1: 0, 2: 1}
+
+
+def test_heap_reconstruido_continua_escolhendo_certo():
+    b, conexao = balanceador({1: 0, 2: 0, 3: 0}, [(10, 1), (10, 2), (10, 3)])
+    for _ in range(200):
+        escolhido = b.reservar(conexao, 10)['id_funcionario']
+        b.confirmar(escolhido)
+        b.concluir(escolhido)
+    # As entradas antigas não acumulam além do limite de reconstrução
+    assert all(len(heap) <= 4 * 3 + 16 for heap in b.heaps.values())
+    for esperado in (1, 2, 3, 1):
+        assert b.reservar(conexao, 10)['id_funcionario'] == esperado
+
+
+def test_invalidar_recarrega_do_banco():
+    b, conexao = balanceador({1: 0, 2: 5}, [(10, 1), (10, 2)])
+    assert b.reservar(conexao, 10)['id_funcionario'] == 1
+    b.confirmar(1)
+    conexao.pendentes = {1: 9, 2: 5}  # outro processo gravou tarefas para 1
+    b.invalidar()
+    assert b.reservar(conexao, 10)['id_funcionario'] == 2
+    assert b.carregamentos == 2
+
+
+def test_reserva_atravessa_recarga():
+    b, conexao = balanceador({1: 2, 2: 3}, [(10, 1), (10, 2)])
+    assert b.reservar(conexao, 10)['id_funcionario'] == 1
+    # Recarga antes da tarefa ser gravada: o banco ainda não a conta, a reserva continua somada
+    b.carregar(conexao)
+    assert b.pendentes == {1: 3, 2: 3}
+    b.liberar(1)
+    assert b.pendentes == {1: 2, 2: 3}
+
+    # Reserva gravada e confirmada antes da recarga: só a contagem do banco vale
+    assert b.reservar(conexao, 10)['id_funcionario'] == 1
+    b.confirmar(1)
+    conexao.pendentes[1] = 3
+    b.carregar(conexao)
+    assert b.pendentes == {1: 3, 2: 3}
+    assert b.estatisticas()['reservas'] == 0
+
+
+def test_reservas_concorrentes_nao_pegam_a_mesma_vaga():
+    funcionarios = {f: 0 for f in range(1, 9)}
+    b, conexao = balanceador(funcionarios, [(10, f) for f in funcionarios])
+    escolhidos = []
+    lock = threading.Lock()
+    largada = threading.Barrier(16)
+
+    def worker():
+        largada.wait()
+        for _ in range(50):
+            escolhido = b.reservar(conexao, 10)
+            with lock:
+                escolhidos.append((escolhido['id_funcionario'], escolhido['tarefas_pendentes']))
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 800 reservas em 8 funcionários: cada (funcionário, contagem anterior) sai uma vez só
+    assert len(escolhidos) == len(set(escolhidos)) == 800
+    assert b.pendentes == {f: 100 for f in funcionarios}
+    assert b.estatisticas()['reservas'] == 800
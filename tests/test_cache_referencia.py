@@ -0,0 +1,78 @@
+import ai
+from ai import AIGreenhouseMonitor, CacheReferencia
+
+
+class ConexaoFalsa:
+    """Responde às consultas de CacheReferencia.carregar pela tabela do FROM"""
+    def __init__(self, culturas):
+        self.respostas = {
+            'estufa': [(1, "Estufa 1", "Norte", 120, "Ativa"), (2, "Estufa 2", "Sul", None, "Ativa")],
+            'lote_plantio': culturas,
+            'atuador': [(1, "Ventilador", 5, 1), (2, "Aquecedor", 3, 1)],
+            'sensor': [(10, 1, "Temperatura", "°C"), (11, 2, "Umidade", "%")],
+        }
+        self.consultas = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, parametros=None):
+        self.consultas += 1
+        self.tabela = sql.split("FROM", 1)[1].split()[0]
+
+    def fetchall(self):
+        return self.respostas[self.tabela]
+
+    def close(self):
+        pass
+
+
+CULTURAS = [(1, "Tomate", "Solanum lycopersicum", 18, 26, 60, 80),
+            (2, "Alface", "Lactuca sativa", None, None, 70, None)]
+
+
+def test_carrega_cadastro_com_faixas_nulas():
+    cache = CacheReferencia()
+    conexao = ConexaoFalsa(CULTURAS)
+    estufa = cache.estufa(conexao, 1)
+    assert estufa['cultura']['temp_max'] == 26.0
+    assert [a['tipo'] for a in estufa['atuadores']] == ["Ventilador", "Aquecedor"]
+    alface = cache.estufa(conexao, 2)
+    assert alface['tamanho'] is None
+    assert (alface['cultura']['temp_min'], alface['cultura']['umid_min'], alface['cultura']['umid_max']) == \
+        (None, 70.0, None)
+    assert cache.sensor(conexao, 11) == (2, "Umidade", "%")
+
+
+def test_faixa_nula_so_verifica_o_lado_cadastrado():
+    cultura = CacheReferencia().estufa(ConexaoFalsa(CULTURAS), 2)['cultura']
+    monitor = AIGreenhouseMonitor(None)
+    faixas = monitor.faixas_ideais(cultura)
+    assert monitor.classificar_anomalia('Temperatura', 50.0, *faixas) is None
+    assert monitor.classificar_anomalia('Umidade', 95.0, *faixas) is None
+    assert monitor.classificar_anomalia('Umidade', 50.0, *faixas)[1] == "Alta"
+    assert monitor.faixa_ideal('Umidade', cultura) == (70.0, None)
+
+
+def test_ttl_invalidar_e_chave_nova(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(ai.time, 'time', lambda: agora[0])
+    cache = CacheReferencia(ttl=60, recarga_minima=5)
+    conexao = ConexaoFalsa(CULTURAS)
+    cache.estufa(conexao, 1)
+    cache.estufa(conexao, 1)
+    assert cache.estatisticas() == {'hits': 1, 'misses': 1, 'carregamentos': 1}
+
+    # Chave desconhecida logo depois de carregar não recarrega; passada a recarga mínima, sim
+    assert cache.estufa(conexao, 99) is None
+    assert cache.carregamentos == 1
+    agora[0] += 10
+    cache.estufa(conexao, 99)
+    assert cache.carregamentos == 2
+
+    cache.invalidar()
+    cache.sensor(conexao, 10)
+    assert cache.carregamentos == 3
+    agora[0] += 61
+    cache.sensor(conexao, 10)
+    assert cache.carregamentos == 4
@@ -0,0 +1,78 @@
+import ai
+from ai import CacheTarefasIA
+
+
+def alerta(valor=30.2, mensagem="Temperatura acima do ideal (mediana: 30.20°C > máximo: 26°C)"):
+    return {'id_estufa': 1, 'tipo_sensor': 'Temperatura', 'severidade': 'Média',
+            'mensagem': mensagem, 'valor_atual': valor}
+
+
+def chaves_sqlite(cache):
+    return sorted(r[0] for r in cache.db.execute("SELECT chave FROM cache_ia"))
+
+
+def test_chave_ignora_numeros_da_mensagem_e_ruido_do_valor():
+    cache = CacheTarefasIA(passo_valor=1.0)
+    atuadores = [{'tipo': 'Ventilador'}, {'tipo': 'Aquecedor'}]
+    a = cache.chave(alerta(30.2), atuadores, None, [30.2, 30.0])
+    b = cache.chave(alerta(29.9, "Temperatura acima do ideal (mediana: 29.90°C > máximo: 26°C)"),
+                    list(reversed(atuadores)), None, [29.9, 29.8])
+    assert a == b
+    assert cache.chave(alerta(30.2), atuadores, None, [30.2, 28.0]) != a  # tendência subindo
+
+
+def test_lru_despeja_o_menos_usado():
+    cache = CacheTarefasIA(max_itens=2)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    assert cache.get('a') == 'A'
+    cache.set('c', 'C')
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('A', 'C')
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_ttl_vence_a_entrada(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(ai.time, 'time', lambda: agora[0])
+    cache = CacheTarefasIA(ttl=60)
+    cache.set('a', 'A')
+    agora[0] += 59
+    assert cache.get('a') == 'A'
+    agora[0] += 2
+    assert cache.get('a') is None
+    assert 'a' not in cache.itens
+
+
+def test_sqlite_sobrevive_a_reabertura(tmp_path):
+    caminho = str(tmp_path / "cache.sqlite")
+    CacheTarefasIA(caminho_sqlite=caminho).set('a', 'A')
+    cache = CacheTarefasIA(caminho_sqlite=caminho)
+    assert cache.itens == {}
+    assert cache.get('a') == 'A'
+
+
+def test_sqlite_apaga_vencidas_e_excedentes(tmp_path):
+    caminho = str(tmp_path / "cache.sqlite")
+    cache = CacheTarefasIA(max_itens=2, ttl=60, caminho_sqlite=caminho)
+    for chave in 'abc':
+        cache.set(chave, chave.upper())
+    assert chaves_sqlite(cache) == ['b', 'c']
+
+    cache.db.execute("UPDATE cache_ia SET criado_em = 0 WHERE chave = 'b'")
+    cache.db.commit()
+    assert chaves_sqlite(CacheTarefasIA(max_itens=2, ttl=60, caminho_sqlite=caminho)) == ['c']
+
+
+def test_configuracao_pelo_ambiente(monkeypatch, tmp_path):
+    monkeypatch.setattr(ai, '_cache_ia', None)
+    monkeypatch.delenv('CACHE_IA', raising=False)
+    monkeypatch.delenv('CACHE_IA_ARQUIVO', raising=False)
+    assert ai.cache_ia_pela_config() is None
+
+    monkeypatch.setenv('CACHE_IA_ARQUIVO', str(tmp_path / "cache.sqlite"))
+    monkeypatch.setenv('CACHE_IA_ITENS', '10')
+    cache = ai.cache_ia_pela_config()
+    assert cache.max_itens == 10 and cache.db is not None
+    assert ai.cache_ia_pela_config() is cache
+    assert ai.AIGreenhouseMonitor(None).cache_ia is cache
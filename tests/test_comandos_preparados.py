@@ -0,0 +1,89 @@
+import pytest
+from db import ComandosPreparados
+
+
+class ConexaoFalsa:
+    def __init__(self, pid=100):
+        self.pid = pid
+
+    def get_backend_pid(self):
+        return self.pid
+
+
+class CursorFalso:
+    def __init__(self, connection, erro=None):
+        self.connection = connection
+        self.executados = []
+        self.erro = erro
+
+    def execute(self, sql, parametros=None):
+        if self.erro and sql.startswith("EXECUTE"):
+            erro, self.erro = self.erro, None
+            raise erro
+        self.executados.append((sql, parametros))
+
+
+class ErroSemComando(Exception):
+    pgcode = '26000'
+
+
+def test_registrar_posicionais():
+    comandos = ComandosPreparados()
+    comandos.registrar("c", "SELECT * FROM t WHERE a = %s AND b LIKE 'x%%' AND c = %s")
+    sql, prepare, nomeados, quantidade = comandos.comandos["c"]
+    assert prepare == "PREPARE c AS SELECT * FROM t WHERE a = $1 AND b LIKE 'x%' AND c = $2"
+    assert nomeados is None and quantidade == 2
+
+
+def test_registrar_nomeados_repetidos_e_tipos():
+    comandos = ComandosPreparados()
+    comandos.registrar("c", "SELECT %(ids)s, %(limite)s, %(ids)s", tipos=('bigint[]', 'int'))
+    _, prepare, nomeados, quantidade = comandos.comandos["c"]
+    assert prepare == "PREPARE c (bigint[], int) AS SELECT $1, $2, $1"
+    assert nomeados == ['ids', 'limite'] and quantidade == 2
+
+
+def test_prepara_uma_vez_por_backend():
+    comandos = ComandosPreparados()
+    comandos.registrar("c", "SELECT %s")
+    conexao = ConexaoFalsa()
+    cursor = CursorFalso(conexao)
+    comandos.executar(cursor, "c", (1,))
+    comandos.executar(cursor, "c", (2,))
+    assert cursor.executados == [("PREPARE c AS SELECT $1", None),
+                                 ("EXECUTE c (%s)", [1]), ("EXECUTE c (%s)", [2])]
+
+    # Conexão reaberta (outro backend no mesmo objeto): prepara de novo
+    conexao.pid = 200
+    comandos.executar(cursor, "c", (3,))
+    assert cursor.executados[-2:] == [("PREPARE c AS SELECT $1", None), ("EXECUTE c (%s)", [3])]
+
+
+def test_parametros_nomeados_na_ordem_do_prepare():
+    comandos = ComandosPreparados()
+    comandos.registrar("c", "SELECT %(b)s, %(a)s")
+    cursor = CursorFalso(ConexaoFalsa())
+    comandos.executar(cursor, "c", {'a': 1, 'b': 2})
+    assert cursor.executados[-1] == ("EXECUTE c (%s, %s)", [2, 1])
+
+
+def test_sessao_reiniciada_prepara_de_novo():
+    comandos = ComandosPreparados()
+    comandos.registrar("c", "SELECT 1")
+    conexao = ConexaoFalsa()
+    cursor = CursorFalso(conexao)
+    comandos.executar(cursor, "c")
+    cursor.erro = ErroSemComando("prepared statement \"c\" does not exist")
+    with pytest.raises(ErroSemComando):
+        comandos.executar(cursor, "c")
+    comandos.executar(cursor, "c")
+    assert [sql for sql, _ in cursor.executados] == ["PREPARE c AS SELECT 1", "EXECUTE c",
+                                                      "PREPARE c AS SELECT 1", "EXECUTE c"]
+
+
+def test_desligado_executa_o_sql():
+    comandos = ComandosPreparados(ativo=False)
+    comandos.registrar("c", "SELECT %s")
+    cursor = CursorFalso(ConexaoFalsa())
+    comandos.executar(cursor, "c", (1,))
+    assert cursor.executados == [("SELECT %s", (1,))]
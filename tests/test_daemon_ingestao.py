@@ -0,0 +1,24 @@
+from datetime import datetime
+import pytest
+from daemon_ingestao import interpretar_linha
+
+
+def test_espaco_ou_virgula():
+    assert interpretar_linha("12 23.5\n") == (12, 23.5, None)
+    assert interpretar_linha("12,23.5") == (12, 23.5, None)
+
+
+def test_data_hora_opcional():
+    assert interpretar_linha("12 23.5 2025-11-13T08:00:00") == (12, 23.5, datetime(2025, 11, 13, 8))
+    assert interpretar_linha("12, 23.5, 2025-11-13 08:00") == (12, 23.5, datetime(2025, 11, 13, 8))
+
+
+def test_vazia_ou_comentario():
+    assert interpretar_linha("   \n") is None
+    assert interpretar_linha("# gateway 3") is None
+
+
+@pytest.mark.parametrize("linha", ["12", "x 23.5", "12 quente", "12 23.5 ontem"])
+def test_linha_invalida(linha):
+    with pytest.raises(ValueError):
+        interpretar_linha(linha)
@@ -0,0 +1,89 @@
+import warnings
+import numpy as np
+import pytest
+import detectores
+
+
+def matriz_aleatoria(linhas=200, colunas=9, semente=0):
+    gerador = np.random.default_rng(semente)
+    series = [gerador.normal(25, 5, gerador.integers(0, colunas + 1)) for _ in range(linhas)]
+    return detectores.montar_matriz(series, colunas)
+
+
+def test_montar_matriz_alinha_a_direita():
+    matriz = detectores.montar_matriz([[1, 2], [3, 4, 5, 6], []], 3)
+    assert matriz.shape == (3, 3)
+    np.testing.assert_array_equal(matriz[0], [np.nan, 1, 2])
+    np.testing.assert_array_equal(matriz[1], [4, 5, 6])
+    assert np.isnan(matriz[2]).all()
+
+
+def test_contagem_e_ultimo():
+    matriz = detectores.montar_matriz([[1, 2, 3], [7], []], 3)
+    np.testing.assert_array_equal(detectores.contagem(matriz), [3, 1, 0])
+    np.testing.assert_array_equal(detectores.contagem(matriz, janela=2), [2, 1, 0])
+    np.testing.assert_array_equal(detectores.ultimo(matriz), [3, 7, np.nan])
+
+
+@pytest.mark.parametrize("janela", [1, 4, 5, 9])
+def test_mediana_igual_a_nanmedian(janela):
+    matriz = matriz_aleatoria()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # linhas vazias: "All-NaN slice"
+        esperado = np.nanmedian(matriz[:, -janela:], axis=1)
+    np.testing.assert_allclose(detectores.mediana(matriz, janela), esperado, equal_nan=True)
+
+
+def test_mediana_movel_por_coluna():
+    matriz = matriz_aleatoria(linhas=20)
+    movel = detectores.mediana_movel(matriz, 3)
+    assert movel.shape == matriz.shape
+    for j in range(matriz.shape[1]):
+        esperado = detectores.mediana(matriz[:, max(0, j - 2):j + 1], 3)
+        np.testing.assert_allclose(movel[:, j], esperado, equal_nan=True)
+
+
+def test_mad_e_escore_z_robusto():
+    matriz = detectores.montar_matriz([[10, 10, 10, 10, 10], [10, 10, 10, 10, 12], [1, 2, 3, 4, 5]])
+    np.testing.assert_allclose(detectores.mad(matriz), [0, 0, detectores.ESCALA_MAD])
+    escore = detectores.escore_z_robusto(matriz)
+    assert escore[0] == 0.0
+    assert escore[1] == np.inf
+    assert escore[2] == pytest.approx(2 / detectores.ESCALA_MAD)
+
+
+def test_ewma_ignora_nan():
+    matriz = np.array([[np.nan, 10.0, np.nan, 20.0]])
+    assert detectores.ewma(matriz, alfa=0.5)[0] == pytest.approx(15.0)
+
+
+def test_tendencia():
+    matriz = detectores.montar_matriz([[1, 3, 5, 7], [4], [2, 2, 2]], 4)
+    inclinacao = detectores.tendencia(matriz)
+    assert inclinacao[0] == pytest.approx(2.0)
+    assert np.isnan(inclinacao[1])
+    assert inclinacao[2] == pytest.approx(0.0)
+
+
+def test_nivel_usa_a_ultima_leitura_com_poucas_medicoes():
+    matriz = detectores.montar_matriz([[20, 40], [20, 21, 40]], 5)
+    np.testing.assert_allclose(detectores.nivel(matriz, "mediana", 5), [40, 21])
+
+
+def test_nivel_com_estimador_registrado():
+    @detectores.estimador("maximo_teste")
+    def _maximo(matriz, janela):
+        return np.nanmax(matriz[:, -janela:], axis=1)
+
+    try:
+        matriz = detectores.montar_matriz([[1, 9, 2]], 3)
+        assert detectores.nivel(matriz, "maximo_teste", 3)[0] == 9
+    finally:
+        del detectores.ESTIMADORES["maximo_teste"]
+
+
+def test_fora_da_faixa():
+    valores = np.array([5.0, 15.0, 35.0, 50.0])
+    minimos = np.array([10.0, 10.0, 10.0, np.nan])
+    maximos = np.array([30.0, 30.0, 30.0, np.nan])
+    np.testing.assert_array_equal(detectores.fora_da_faixa(valores, minimos, maximos), [-5, 0, 5, 0])
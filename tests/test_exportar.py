@@ -0,0 +1,109 @@
+import os
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.dataset as ds
+import exportar
+from exportar import GravadorParticionado, PARTICAO_NULA
+
+# Saída do COPY de medicao (colunas de EXPORTACOES['medicao']), fora de ordem de partição
+CSV_MEDICAO = (
+    "1,2025-11-15 08:00:00,21.5,1,Temperatura,°C,Estufa A,2025-11-15,1\n"
+    "2,2025-11-15 08:00:00,60,2,Umidade,%,Estufa B,2025-11-15,2\n"
+    "3,2025-11-16 09:30:00,22.25,1,Temperatura,°C,Estufa A,2025-11-16,1\n"
+    "4,2025-11-15 10:00:00,,1,Temperatura,°C,Estufa A,2025-11-15,1\n"
+    "5,2025-11-16 11:00:00,7.1,9,pH do Solo,,,2025-11-16,\n"
+)
+
+
+class CursorCopy:
+    def __init__(self, dados, consultas):
+        self.dados = dados
+        self.consultas = consultas
+
+    def copy_expert(self, sql, saida):
+        self.consultas.append(sql)
+        saida.write(self.dados.encode('utf-8'))
+
+    def close(self):
+        pass
+
+
+class ConexaoCopy:
+    def __init__(self, dados):
+        self.dados = dados
+        self.consultas = []
+
+    def cursor(self):
+        return CursorCopy(self.dados, self.consultas)
+
+    def commit(self):
+        pass
+
+
+def ler(pasta):
+    dataset = ds.dataset(str(pasta), format="parquet", partitioning="hive")
+    return sorted(dataset.to_table().to_pylist(), key=lambda linha: linha['id_medicao'])
+
+
+@pytest.mark.parametrize("tamanho_bloco", [128, 8 << 20])
+def test_exportar_tabela_particiona_por_dia_e_estufa(tmp_path, tamanho_bloco):
+    conexao = ConexaoCopy(CSV_MEDICAO)
+    linhas, arquivos = exportar.exportar_tabela(conexao, 'medicao', str(tmp_path), 0, 5,
+                                                tamanho_bloco=tamanho_bloco)
+    assert linhas == 5
+    assert "m.id_medicao > 0 AND m.id_medicao <= 5" in conexao.consultas[0]
+    pastas = {os.path.relpath(os.path.dirname(caminho), tmp_path / "medicao") for caminho in arquivos}
+    assert {"dia=2025-11-15/id_estufa=1", "dia=2025-11-15/id_estufa=2", "dia=2025-11-16/id_estufa=1",
+            f"dia=2025-11-16/id_estufa={PARTICAO_NULA}"} <= pastas
+
+    lidas = ler(tmp_path / 'medicao')
+    assert [linha['id_medicao'] for linha in lidas] == [1, 2, 3, 4, 5]
+    assert lidas[0]['valor_medido'] == 21.5 and lidas[0]['tipo_sensor'] == "Temperatura"
+    assert lidas[3]['valor_medido'] is None
+    assert lidas[4]['unidade_medida'] is None
+
+
+def test_gravador_reabre_particao_em_parte_nova(tmp_path):
+    esquema = pa.schema([('v', pa.int64())])
+    gravador = GravadorParticionado(str(tmp_path), esquema, prefixo="parte-0", max_abertos=1)
+    tabela = pa.table({'v': [1, 2]}, schema=esquema)
+    gravador.escrever("2025-11-15", 1, tabela)
+    gravador.escrever("2025-11-15", 2, tabela)  # fecha a partição (…, 1)
+    gravador.escrever("2025-11-15", 1, tabela)  # que volta como parte-0-1
+    gravador.fechar()
+    nomes = sorted(caminho.split(str(tmp_path))[1] for caminho in gravador.arquivos)
+    assert nomes == ["/dia=2025-11-15/id_estufa=1/parte-0-0.parquet",
+                     "/dia=2025-11-15/id_estufa=1/parte-0-1.parquet",
+                     "/dia=2025-11-15/id_estufa=2/parte-0-0.parquet"]
+    assert gravador.linhas == 6
+    assert ds.dataset(str(tmp_path), format="parquet", partitioning="hive").count_rows() == 6
+
+
+def test_gravador_arrow(tmp_path):
+    esquema = pa.schema([('v', pa.int64())])
+    gravador = GravadorParticionado(str(tmp_path), esquema, prefixo="p", formato="arrow")
+    gravador.escrever(None, None, pa.table({'v': [7]}, schema=esquema))
+    gravador.fechar()
+    [caminho] = gravador.arquivos
+    assert caminho.endswith(f"dia={PARTICAO_NULA}/id_estufa={PARTICAO_NULA}/p-0.arrow")
+    assert pa.ipc.open_file(caminho).read_all().column('v').to_pylist() == [7]
+
+
+def test_marca_dagua(tmp_path):
+    assert exportar.ler_marca_dagua(str(tmp_path)) == {}
+    exportar.gravar_marca_dagua(str(tmp_path), {'medicao': 42})
+    assert exportar.ler_marca_dagua(str(tmp_path)) == {'medicao': 42}
+    assert not (tmp_path / "_marca_dagua.json.tmp").exists()
+
+
+def test_desde_inicio_substitui_a_tabela_e_preserva_as_outras_marcas(tmp_path, monkeypatch):
+    monkeypatch.setattr(exportar, 'marca_segura', lambda connect, nome, espera: 5)
+    destino = str(tmp_path)
+    exportar.exportar(ConexaoCopy(CSV_MEDICAO), destino, tabelas=['medicao'])
+    exportar.gravar_marca_dagua(destino, {**exportar.ler_marca_dagua(destino), 'consumo': 7})
+
+    exportar.exportar(ConexaoCopy(CSV_MEDICAO), destino, tabelas=['medicao'], desde_inicio=True)
+    assert exportar.ler_marca_dagua(destino) == {'medicao': 5, 'consumo': 7}
+    assert [linha['id_medicao'] for linha in ler(tmp_path / 'medicao')] == [1, 2, 3, 4, 5]
+    assert sorted(os.listdir(destino)) == ["_marca_dagua.json", "medicao"]
@@ -0,0 +1,12 @@
+# pip install pytest
+# Orçamento de importação do núcleo (benchmark.ORCAMENTO_IMPORTACAO_MS), medido num interpretador novo
+
+import pytest
+import benchmark
+
+
+@pytest.mark.parametrize("modulo", sorted(benchmark.ORCAMENTO_IMPORTACAO_MS))
+def test_importacao_dentro_do_orcamento(modulo):
+    duracao, pesados = benchmark.medir_importacao(modulo)
+    assert pesados == [], f"import {modulo} carregou {pesados}"
+    assert duracao <= benchmark.ORCAMENTO_IMPORTACAO_MS[modulo], f"import {modulo}: {duracao:.0f} ms"
@@ -0,0 +1,44 @@
+from ai import JanelaMedicoes
+
+
+def test_mediana_impar_e_par():
+    janela = JanelaMedicoes(tamanho=5)
+    assert janela.mediana() is None
+    for valor in (3.0, 1.0, 2.0):
+        janela.adicionar(valor)
+    assert janela.mediana() == 2.0
+    janela.adicionar(10.0)
+    assert janela.mediana() == 2.5
+
+
+def test_buffer_circular_descarta_o_mais_antigo():
+    janela = JanelaMedicoes(tamanho=3)
+    for valor in (1.0, 2.0, 3.0, 100.0):
+        janela.adicionar(valor)
+    assert len(janela) == 3
+    assert list(janela.valores) == [2.0, 3.0, 100.0]
+    assert janela.ordenados == [2.0, 3.0, 100.0]
+    assert janela.mediana() == 3.0
+
+
+def test_valores_repetidos_saem_um_de_cada_vez():
+    janela = JanelaMedicoes(tamanho=2)
+    for valor in (5.0, 5.0, 7.0):
+        janela.adicionar(valor)
+    assert janela.ordenados == [5.0, 7.0]
+
+
+def test_ignora_medicao_ja_vista():
+    janela = JanelaMedicoes(tamanho=5)
+    assert janela.adicionar(1.0, id_medicao=10)
+    assert not janela.adicionar(2.0, id_medicao=10)
+    assert not janela.adicionar(3.0, id_medicao=9)
+    assert janela.adicionar(4.0, id_medicao=11)
+    assert list(janela.valores) == [1.0, 4.0]
+
+
+def test_ultimas_da_mais_recente_para_a_mais_antiga():
+    janela = JanelaMedicoes(tamanho=5)
+    for valor in (1.0, 2.0, 3.0):
+        janela.adicionar(valor)
+    assert janela.ultimas() == [3.0, 2.0, 1.0]
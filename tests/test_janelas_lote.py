@@ -0,0 +1,56 @@
+import db
+from ai import AIGreenhouseMonitor, JanelaMedicoes
+
+
+class CursorFalso:
+    """Devolve o histórico de janelas_lote para os ids pedidos"""
+    def __init__(self, historico):
+        self.historico = historico
+        self.ids = None
+
+    def execute(self, sql, parametros=None):
+        self.ids = parametros['ids']
+
+    def fetchall(self):
+        return [(i, None, None, None, self.historico[i]) for i in self.ids]
+
+
+def monitor(**janelas):
+    m = AIGreenhouseMonitor(None, tamanho_janela=3)
+    for chave, (valores, ultimo_id) in janelas.items():
+        janela = JanelaMedicoes(3)
+        for valor in valores:
+            janela.adicionar(valor)
+        janela.ultimo_id = ultimo_id
+        m.janelas[(1, chave)] = janela
+    return m
+
+
+def test_chave_quente_sai_da_memoria_sem_consulta():
+    m = monitor(Temperatura=([20.0, 21.0, 22.0], 10))
+    results = [(11, 23.0, 'Temperatura', 1), (12, 24.0, 'Temperatura', 1)]
+    assert m.janelas_do_lote(None, results, 3) == [[21.0, 22.0, 23.0], [22.0, 23.0, 24.0]]
+    assert m.janelas[(1, 'Temperatura')].ultimo_id == 12
+
+
+def test_chave_fria_vem_do_banco_e_fica_em_memoria(monkeypatch):
+    monkeypatch.setattr(db.comandos, 'ativo', False)
+    m = monitor(Temperatura=([20.0, 21.0, 22.0], 10))
+    cursor = CursorFalso({11: [60.0, 61.0], 12: [60.0, 61.0, 62.0]})
+    results = [(11, 61.0, 'Umidade', 1), (12, 62.0, 'Umidade', 1), (13, 23.0, 'Temperatura', 1)]
+    assert m.janelas_do_lote(cursor, results, 3) == [[60.0, 61.0], [60.0, 61.0, 62.0], [21.0, 22.0, 23.0]]
+    assert cursor.ids == [11, 12]
+    umidade = m.janelas[(1, 'Umidade')]
+    assert (list(umidade.valores), umidade.ultimo_id) == ([60.0, 61.0, 62.0], 12)
+
+
+def test_medicoes_ja_vistas_ou_outra_janela_vao_ao_banco(monkeypatch):
+    monkeypatch.setattr(db.comandos, 'ativo', False)
+    m = monitor(Temperatura=([20.0, 21.0, 22.0], 10))
+    cursor = CursorFalso({9: [19.0, 20.0]})
+    assert m.janelas_do_lote(cursor, [(9, 20.0, 'Temperatura', 1)], 3) == [[19.0, 20.0]]
+    assert list(m.janelas[(1, 'Temperatura')].valores) == [20.0, 21.0, 22.0]
+
+    cursor = CursorFalso({11: [1.0, 2.0, 3.0, 4.0, 5.0]})
+    assert m.janelas_do_lote(cursor, [(11, 5.0, 'Temperatura', 1)], 5) == [[1.0, 2.0, 3.0, 4.0, 5.0]]
+    assert m.janelas[(1, 'Temperatura')].ultimo_id == 10
@@ -0,0 +1,39 @@
+import math
+from graficos import lttb, reduzir
+
+
+def test_serie_curta_fica_inteira():
+    assert lttb([1.0, 2.0, 3.0], 10) == [0, 1, 2]
+    assert lttb([1.0, 2.0, 3.0, 4.0], 2) == [0, 1, 2, 3]
+
+
+def test_quantidade_extremos_e_ordem():
+    valores = [math.sin(i / 10) for i in range(1000)]
+    indices = lttb(valores, 50)
+    assert len(indices) == 50
+    assert indices[0] == 0 and indices[-1] == 999
+    assert indices == sorted(set(indices))
+
+
+def test_preserva_picos():
+    valores = [0.0] * 500
+    valores[123] = 100.0
+    valores[377] = -80.0
+    indices = lttb(valores, 20)
+    assert 123 in indices
+    assert 377 in indices
+
+
+def test_reduzir_painel():
+    categorias = [f"d{i}" for i in range(200)]
+    valores = list(range(200))
+    titulo, rotulo_x, rotulo_y, cats, vals = reduzir(("Consumo", "dia", "kWh", categorias, valores), 30)
+    assert titulo == "Consumo (30 de 200)"
+    assert (rotulo_x, rotulo_y) == ("dia", "kWh")
+    assert len(cats) == len(vals) == 30
+    assert all(valores[categorias.index(c)] == v for c, v in zip(cats, vals))
+
+
+def test_reduzir_painel_pequeno_nao_muda():
+    painel = ("T", "x", "y", ["a", "b"], [1, 2])
+    assert reduzir(painel, 30) is painel
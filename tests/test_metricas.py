@@ -0,0 +1,87 @@
+import urllib.error
+import urllib.request
+import pytest
+from metricas import Metricas
+
+
+def test_desligado_nao_registra():
+    m = Metricas(ativo=False)
+    m.incrementar("medicoes_total")
+    with m.medir("etapa_segundos", etapa="x"):
+        pass
+    assert m.texto_prometheus() == "\n"
+
+
+def test_contadores_com_ajuda_tipo_e_rotulos_ordenados():
+    m = Metricas(ativo=True)
+    m.descrever("alertas_total", "Alertas criados")
+    m.incrementar("alertas_total", severidade="Alta")
+    m.incrementar("alertas_total", 2, severidade="Alta")
+    m.incrementar("alertas_total", severidade="Baixa")
+    m.incrementar("lotes_total", origem="tcp", fila="a")
+    assert m.texto_prometheus().splitlines() == [
+        "# HELP planteligente_alertas_total Alertas criados",
+        "# TYPE planteligente_alertas_total counter",
+        'planteligente_alertas_total{severidade="Alta"} 3',
+        'planteligente_alertas_total{severidade="Baixa"} 1',
+        "# TYPE planteligente_lotes_total counter",
+        'planteligente_lotes_total{fila="a",origem="tcp"} 1',
+    ]
+
+
+def test_histograma_acumulado():
+    m = Metricas(ativo=True)
+    for segundos in (0.0005, 0.003, 0.003, 40):
+        m.observar("etapa_segundos", segundos, etapa="analisar")
+    linhas = m.texto_prometheus().splitlines()
+    baldes = {linha.split('le="')[1].split('"')[0]: int(linha.rsplit(" ", 1)[1])
+              for linha in linhas if "_bucket" in linha}
+    assert baldes["0.0005"] == 1  # o limite é inclusivo (le)
+    assert baldes["0.0025"] == 1
+    assert baldes["0.005"] == 3
+    assert baldes["30"] == 3
+    assert baldes["+Inf"] == 4
+    assert 'planteligente_etapa_segundos_count{etapa="analisar"} 4' in linhas
+    soma = next(linha for linha in linhas if linha.startswith("planteligente_etapa_segundos_sum"))
+    assert float(soma.rsplit(" ", 1)[1]) == pytest.approx(40.0065)
+
+
+def test_medidor_lido_na_coleta_e_com_erro_omitido():
+    m = Metricas(ativo=True)
+    fila = [1, 2]
+    m.medidor("fila_tamanho", lambda: len(fila), fila="alertas")
+    m.medidor("fila_tamanho", lambda: 1 / 0, fila="quebrada")
+    fila.append(3)
+    assert m.texto_prometheus().splitlines() == [
+        "# TYPE planteligente_fila_tamanho gauge",
+        'planteligente_fila_tamanho{fila="alertas"} 3',
+    ]
+    m.remover_medidor("fila_tamanho", fila="alertas")
+    assert "alertas" not in m.texto_prometheus()
+
+
+def test_rotulos_escapados():
+    m = Metricas(ativo=True)
+    m.incrementar("erros_total", mensagem='valor "x"\\n\nfim')
+    assert 'planteligente_erros_total{mensagem="valor \\"x\\"\\\\n\\nfim"} 1' in m.texto_prometheus()
+
+
+def test_despejar_e_servir(tmp_path):
+    m = Metricas()
+    m.despejar(str(tmp_path / "metricas.prom"))
+    assert (tmp_path / "metricas.prom").read_text(encoding="utf-8") == "\n"
+
+    m.servir(0)
+    try:
+        assert m.ativo
+        m.incrementar("medicoes_total", 5)
+        host, porta = m.servidor.server_address
+        with urllib.request.urlopen(f"http://{host}:{porta}/metrics") as resposta:
+            assert resposta.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert resposta.read().decode("utf-8") == "# TYPE planteligente_medicoes_total counter\n" \
+                                                      "planteligente_medicoes_total 5\n"
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://{host}:{porta}/outro")
+    finally:
+        m.encerrar()
+    assert m.servidor is None
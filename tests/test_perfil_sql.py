@@ -0,0 +1,67 @@
+import db
+from perfil_sql import Perfilador, _expandir_execute, formato_parametros, impressao_digital, normalizar
+
+
+def test_literais_e_parametros_viram_interrogacao():
+    assert normalizar("SELECT * FROM t WHERE a = 'x''y' AND b = -1.5e3 AND c = %s AND d = %(d)s") == \
+        "SELECT * FROM t WHERE a = ? AND b = ? AND c = ? AND d = ?"
+    assert normalizar("UPDATE t SET ativo = TRUE, fim = NULL") == "UPDATE t SET ativo = ?, fim = ?"
+
+
+def test_nomes_com_digitos_ficam():
+    assert normalizar("SELECT m2.valor FROM medicao m2 WHERE $1 > 0") == "SELECT m2.valor FROM medicao m2 WHERE $1 > ?"
+
+
+def test_comentarios_e_espacos():
+    assert normalizar("SELECT 1 -- comentário\n  FROM /* bloco\n */ t") == "SELECT ? FROM t"
+
+
+def test_listas_e_tuplas_repetidas_colapsam():
+    assert normalizar("SELECT * FROM t WHERE id IN (1, 2, 3, 4)") == "SELECT * FROM t WHERE id IN (?, ...)"
+    assert normalizar("INSERT INTO t VALUES (1, 'a', NOW()), (2, 'b', NOW()), (3, 'c', NOW())") == \
+        "INSERT INTO t VALUES (?, ..., NOW()), ..."
+
+
+def test_mesma_impressao_digital_para_valores_diferentes():
+    a = normalizar("SELECT * FROM medicao WHERE id_sensor = 1 AND valor > 20.5")
+    b = normalizar("SELECT  *  FROM medicao WHERE id_sensor = 77 AND valor > 3")
+    assert impressao_digital(a) == impressao_digital(b)
+    assert len(impressao_digital(a)) == 10
+
+
+def test_formato_parametros():
+    assert formato_parametros(None) == "-"
+    assert formato_parametros((1, 2.5, "x", [1, 2, 3])) == "(int, float, str, list[3])"
+    assert formato_parametros({'ids': [1], 'limite': 5}) == "{ids, limite}"
+
+
+def test_perfilador_agrupa_e_marca_lentas():
+    perfilador = Perfilador(ativo=True, limite_lenta=0.1)
+    digital, lenta, primeira = perfilador.registrar("SELECT * FROM t WHERE id = 1", (1,), 0.01, 1)
+    assert not lenta and not primeira
+    _, lenta, primeira = perfilador.registrar("SELECT * FROM t WHERE id = 2", (2,), 0.2, 1)
+    assert lenta and primeira
+    _, lenta, primeira = perfilador.registrar("SELECT * FROM t WHERE id = 3", (3,), 0.3, 0)
+    assert lenta and not primeira
+    perfilador.registrar("SELECT * FROM t WHERE id = 4", None, 0.05, None, erro=True)
+
+    [(chave, estatistica)] = perfilador.top()
+    assert chave == digital
+    assert (estatistica.chamadas, estatistica.lentas, estatistica.erros, estatistica.linhas) == (4, 2, 1, 2)
+    assert estatistica.formatos == {"(int)", "-"}
+    assert estatistica.maximo == 0.3
+
+
+def test_execute_volta_ao_sql_registrado():
+    db.comandos.registrar("teste_posicional", "SELECT * FROM t WHERE a = %s AND b = %s")
+    db.comandos.registrar("teste_nomeado", "SELECT * FROM t WHERE a = ANY(%(ids)s) LIMIT %(n)s")
+    try:
+        assert _expandir_execute("EXECUTE teste_posicional (%s, %s)", [1, 'x']) == \
+            ("SELECT * FROM t WHERE a = %s AND b = %s", [1, 'x'])
+        assert _expandir_execute("EXECUTE teste_nomeado (%s, %s)", [[1, 2], 5]) == \
+            ("SELECT * FROM t WHERE a = ANY(%(ids)s) LIMIT %(n)s", {'ids': [1, 2], 'n': 5})
+        assert _expandir_execute("EXECUTE nao_registrado", None) == (None, None)
+        assert _expandir_execute("SELECT 1", None) == ("SELECT 1", None)
+    finally:
+        del db.comandos.comandos["teste_posicional"]
+        del db.comandos.comandos["teste_nomeado"]
@@ -0,0 +1,60 @@
+# Resumos mantidos por trigger x recálculo a partir das tabelas base (rollups).
+# Precisa de um PostgreSQL com um banco descartável, que é apagado e recriado:
+#   PLANTELIGENTE_TESTE_DB=planteligente_teste python -m pytest tests/test_resumos.py
+import os
+import re
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+import planteligente as p
+
+BANCO = os.getenv('PLANTELIGENTE_TESTE_DB')
+pytestmark = pytest.mark.skipif(not BANCO, reason="defina PLANTELIGENTE_TESTE_DB com um banco descartável")
+
+
+@pytest.fixture
+def connect():
+    conexao = psycopg2.connect(host=os.getenv('DB_HOST', 'localhost'), port=os.getenv('DB_PORT', '5432'),
+                               dbname=BANCO, user=os.getenv('DB_USER', 'postgres'),
+                               password=os.getenv('DB_PASSWORD', 'postgres'))
+    p.drop_all_tables(conexao)
+    p.create_all_tables(conexao, particionado=False)
+    p.insert_test(conexao)
+    yield conexao
+    conexao.rollback()
+    conexao.close()
+
+
+def divergencias(connect, nome, filtro):
+    """Linhas do resumo `nome` (com `filtro`) que não batem com o recálculo de rollups[nome]"""
+    tabela, colunas, recalculo = re.match(r"\s*INSERT INTO (\w+) \(([^)]*)\)\s*(.*)", p.rollups[nome], re.S).groups()
+    cursor = connect.cursor()
+    cursor.execute(f"""
+        (SELECT {colunas} FROM {tabela} WHERE {filtro} EXCEPT ({recalculo}))
+        UNION ALL
+        (({recalculo}) EXCEPT SELECT {colunas} FROM {tabela} WHERE {filtro})""")
+    linhas = cursor.fetchall()
+    cursor.close()
+    return linhas
+
+
+def test_consumo_acompanha_atuador_trocado_de_estufa(connect):
+    cursor = connect.cursor()
+    cursor.execute("""
+        SELECT a.id_atuador, a.id_estufa, (SELECT MIN(id_estufa) FROM estufa WHERE id_estufa <> a.id_estufa)
+        FROM atuador a
+        WHERE EXISTS (SELECT 1 FROM consumo c WHERE c.id_atuador = a.id_atuador)
+        ORDER BY a.id_atuador
+        LIMIT 1""")
+    id_atuador, antiga, nova = cursor.fetchone()
+
+    cursor.execute("UPDATE atuador SET id_estufa = %s WHERE id_atuador = %s", (nova, id_atuador))
+    assert divergencias(connect, 'CONSUMO_HORA', "registros <> 0") == []
+    assert divergencias(connect, 'CONSUMO_DIA', "registros <> 0") == []
+
+    # Troca em lote, de volta, junto com um UPDATE que não muda a estufa
+    cursor.execute("UPDATE atuador SET id_estufa = CASE WHEN id_atuador = %s THEN %s ELSE id_estufa END",
+                   (id_atuador, antiga))
+    assert divergencias(connect, 'CONSUMO_HORA', "registros <> 0") == []
+    assert divergencias(connect, 'CONSUMO_DIA', "registros <> 0") == []
+    cursor.close()
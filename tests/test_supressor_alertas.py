@@ -0,0 +1,82 @@
+from ai import SupressorAlertas
+
+ALTA = ("Temperatura acima do ideal", "Alta")
+MEDIA = ("Temperatura acima do ideal", "Média")
+BAIXA = ("Temperatura abaixo do ideal", "Média")
+
+
+def supressor(**opcoes):
+    s = SupressorAlertas(**opcoes)
+    s.carregado = True  # sem banco: nenhum episódio aberto antes
+    return s
+
+
+def avaliar(s, nivel, diferenca, anomalia, id_medicao, estufa=1):
+    return s.avaliar(None, estufa, 'Temperatura', nivel, diferenca, anomalia, id_medicao)
+
+
+def acoes(resultado):
+    return [acao for acao, _ in resultado]
+
+
+def test_excursao_abre_um_episodio_e_suprime_o_resto():
+    s = supressor(intervalo_gravacao=3600)
+    [(acao, episodio)] = avaliar(s, 40.0, 10.0, MEDIA, 1)
+    assert acao == 'abrir'
+    assert acoes(avaliar(s, 42.0, 12.0, MEDIA, 2)) == ['suprimir']
+    assert acoes(avaliar(s, 41.0, 11.0, MEDIA, 3)) == ['suprimir']
+    assert (episodio.ocorrencias, episodio.pico, episodio.id_ultima_medicao) == (3, 42.0, 3)
+
+
+def test_grava_a_cada_intervalo():
+    s = supressor(intervalo_gravacao=0)
+    avaliar(s, 40.0, 10.0, MEDIA, 1)
+    assert acoes(avaliar(s, 41.0, 11.0, MEDIA, 2)) == ['atualizar']
+
+
+def test_severidade_maior_escala():
+    s = supressor(intervalo_gravacao=3600)
+    [(_, episodio)] = avaliar(s, 40.0, 10.0, MEDIA, 1)
+    assert acoes(avaliar(s, 48.0, 18.0, ALTA, 2)) == ['escalar']
+    assert episodio.severidade == "Alta"
+    # Voltar para Média não rebaixa nem escala de novo
+    assert acoes(avaliar(s, 41.0, 11.0, MEDIA, 3)) == ['suprimir']
+    assert episodio.severidade == "Alta"
+
+
+def test_fecha_depois_de_leituras_normais_seguidas():
+    s = supressor(recuperacao=2)
+    [(_, episodio)] = avaliar(s, 40.0, 10.0, MEDIA, 1)
+    assert avaliar(s, 25.0, 0.0, None, 2) == []
+    avaliar(s, 41.0, 11.0, MEDIA, 3)  # anomalia zera a contagem de normais
+    assert avaliar(s, 25.0, 0.0, None, 4) == []
+    [(acao, fechado)] = avaliar(s, 25.0, 0.0, None, 5)
+    assert acao == 'fechar' and fechado is episodio and episodio.fim is not None
+    assert acoes(avaliar(s, 40.0, 10.0, MEDIA, 6)) == ['abrir']
+
+
+def test_troca_de_lado_fecha_o_episodio_anterior():
+    s = supressor()
+    [(_, acima)] = avaliar(s, 40.0, 10.0, MEDIA, 1)
+    resultado = avaliar(s, 5.0, -10.0, BAIXA, 2)
+    assert acoes(resultado) == ['fechar', 'abrir']
+    assert resultado[0][1] is acima
+    assert resultado[1][1].direcao == -1
+
+
+def test_chaves_independentes_por_estufa():
+    s = supressor()
+    assert acoes(avaliar(s, 40.0, 10.0, MEDIA, 1, estufa=1)) == ['abrir']
+    assert acoes(avaliar(s, 40.0, 10.0, MEDIA, 2, estufa=2)) == ['abrir']
+    assert s.estatisticas() == {'abertos': 2}
+
+
+def test_desligado_ou_sem_tabela_nao_agrupa():
+    s = supressor(ativo=False)
+    assert s.avaliar(None, 1, 'Temperatura', 40.0, 10.0, MEDIA, 1) is None
+
+    s = supressor()
+    s.sem_tabela = True
+    assert s.avaliar(None, 1, 'Temperatura', 40.0, 10.0, MEDIA, 1) is None
+    s.invalidar()
+    assert not s.sem_tabela and not s.carregado